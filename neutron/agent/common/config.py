@@ -70,6 +70,13 @@ PROCESS_MONITOR_OPTS = [
     cfg.IntOpt('check_child_processes_interval', default=60,
                help=_('Interval between checks of child process liveness '
                       '(seconds), use 0 to disable')),
+    cfg.BoolOpt('check_child_processes_on_exit', default=True,
+                help=_('Check a child process as soon as it exits, which is '
+                       'notified by a Linux pidfd, instead of waiting for '
+                       'the next periodic check. The periodic checks are '
+                       'still done for the processes which cannot be '
+                       'watched, or all of them if the kernel does not '
+                       'support pidfds.')),
 ]
 
 
@@ -414,10 +414,13 @@ class OVSBridge(BaseOVS):
         if all_ports:
             port_names = self.get_port_name_list()
         else:
-            port_names = (port.port_name for port in self.get_vif_ports())
+            port_names = [port.port_name for port in self.get_vif_ports()]
 
-        for port_name in port_names:
-            self.delete_port(port_name)
+        # All the ports are deleted by a single transaction
+        if port_names:
+            with self.ovsdb.transaction() as txn:
+                for port_name in port_names:
+                    txn.add(self.ovsdb.del_port(port_name, self.br_name))
 
     def get_local_port_mac(self):
         """Retrieve the mac of the bridge's local port."""
@@ -21,6 +21,7 @@ import eventlet
 from oslo_config import cfg
 from oslo_log import log as logging
 import oslo_messaging
+from oslo_serialization import jsonutils
 from oslo_utils import importutils
 
 from neutron.agent.linux import dhcp
@@ -36,6 +37,7 @@ from neutron.common import utils
 from neutron import context
 from neutron.i18n import _LE, _LI, _LW
 from neutron import manager
+from neutron.notifiers import batch_notifier
 from neutron.openstack.common import loopingcall
 
 LOG = logging.getLogger(__name__)
@@ -69,6 +71,9 @@ class DhcpAgent(manager.Manager):
         self._process_monitor = external_process.ProcessMonitor(
             config=self.conf,
             resource_type='dhcp')
+        self._network_events = batch_notifier.BatchNotifier(
+            self.conf.notification_coalescing_interval,
+            self._process_network_events)
 
     def _populate_networks_cache(self):
         """Populate the networks cache when the DHCP-agent starts."""
@@ -77,10 +82,12 @@ class DhcpAgent(manager.Manager):
                 self.conf
             )
             for net_id in existing_networks:
-                net = dhcp.NetModel(self.conf.use_namespaces,
-                                    {"id": net_id,
-                                     "subnets": [],
-                                     "ports": []})
+                net = self._load_network_snapshot(net_id)
+                if net is None:
+                    net = dhcp.NetModel(self.conf.use_namespaces,
+                                        {"id": net_id,
+                                         "subnets": [],
+                                         "ports": []})
                 self.cache.put(net)
         except NotImplementedError:
             # just go ahead with an empty networks cache
@@ -94,9 +101,46 @@ class DhcpAgent(manager.Manager):
 
     def run(self):
         """Activate the DHCP agent."""
-        self.sync_state()
+        if self._adopt_cached_networks():
+            # DHCP is still served by the adopted processes, the networks
+            # are reconciled with the server without blocking the start.
+            eventlet.spawn_n(self.sync_state)
+        else:
+            self.sync_state()
         self.periodic_resync()
 
+    def _adopt_cached_networks(self):
+        """Monitor the DHCP servers left running by a previous agent.
+
+        Only the networks restored from a snapshot are adopted, the others
+        are configured by the next sync. Returns the number of adopted
+        networks.
+        """
+        adopted = 0
+        for network_id in list(self.cache.get_network_ids()):
+            network = self.cache.get_network_by_id(network_id)
+            if not network.subnets:
+                continue
+            try:
+                driver = self.dhcp_driver_cls(self.conf,
+                                              network,
+                                              self._process_monitor,
+                                              self.dhcp_version,
+                                              self.plugin_rpc)
+                if not driver.adopt():
+                    continue
+                if self.dhcp_driver_cls.should_enable_metadata(self.conf,
+                                                               network):
+                    self.enable_isolated_metadata_proxy(network)
+                adopted += 1
+            except Exception as e:
+                self.schedule_resync(e, network_id)
+                LOG.exception(_LE('Unable to adopt the DHCP server of '
+                                  'network %s.'), network_id)
+        if adopted:
+            LOG.info(_LI('Adopted the DHCP servers of %d networks'), adopted)
+        return adopted
+
     def call_driver(self, action, network, **action_kwargs):
         """Invoke an action on a DHCP driver instance."""
         LOG.debug('Calling driver for network: %(net)s action: %(action)s',
@@ -146,7 +190,8 @@ class DhcpAgent(manager.Manager):
         known_network_ids = set(self.cache.get_network_ids())
 
         try:
-            active_networks = self.plugin_rpc.get_active_networks_info()
+            active_networks = self.plugin_rpc.get_active_networks_info(
+                page_size=self.conf.sync_networks_page_size)
             active_network_ids = set(network.id for network in active_networks)
             for deleted_id in known_network_ids - active_network_ids:
                 try:
@@ -213,6 +258,58 @@ class DhcpAgent(manager.Manager):
             LOG.warn(_LW('Network %s may have been deleted and its resources '
                          'may have already been disposed.'), network.id)
 
+    def _get_snapshot_file_name(self, network_id):
+        return os.path.join(self.conf.dhcp_confs, network_id, 'network')
+
+    def _load_network_snapshot(self, network_id):
+        """Return the last configured state of a network, if it was saved."""
+        data = linux_utils.get_value_from_file(
+            self._get_snapshot_file_name(network_id))
+        if not data:
+            return
+        try:
+            network = dhcp.NetModel(self.conf.use_namespaces,
+                                    jsonutils.loads(data))
+        except (ValueError, TypeError, AttributeError):
+            LOG.warning(_LW('Ignoring the invalid snapshot of network %s'),
+                        network_id)
+            return
+        if network.get('id') != network_id:
+            return
+        return network
+
+    def _save_network_snapshot(self, network):
+        """Save the state of a network to restore it when the agent starts.
+
+        The snapshot is removed with the other files of the network when
+        DHCP is disabled for it.
+        """
+        data = dict((k, v) for k, v in network.items() if k != '_ns_name')
+        try:
+            linux_utils.replace_file(self._get_snapshot_file_name(network.id),
+                                     jsonutils.dumps(data))
+        except (IOError, OSError, TypeError, ValueError):
+            LOG.warning(_LW('Unable to save the snapshot of network %s'),
+                        network.id)
+
+    def _is_network_unchanged(self, network):
+        """Check if the DHCP server of a network is configured and running.
+
+        The revision of the network is compared with the one of the network
+        configured last, which is kept on disk across agent restarts.
+        """
+        cached = self.cache.get_network_by_id(network.id)
+        revision = getattr(network, 'revision', None)
+        if (not revision or not cached or
+                getattr(cached, 'revision', None) != revision):
+            return False
+        driver = self.dhcp_driver_cls(self.conf,
+                                      network,
+                                      self._process_monitor,
+                                      self.dhcp_version,
+                                      self.plugin_rpc)
+        return driver.active
+
     def configure_dhcp_for_network(self, network):
         if not network.admin_state_up:
             return
@@ -220,12 +317,17 @@ class DhcpAgent(manager.Manager):
         enable_metadata = self.dhcp_driver_cls.should_enable_metadata(
                 self.conf, network)
         dhcp_network_enabled = False
+        # Restarting the DHCP server of an unchanged network is not needed,
+        # reloading it only registers it and checks its config files.
+        action = ('reload_allocations' if self._is_network_unchanged(network)
+                  else 'enable')
 
         for subnet in network.subnets:
             if subnet.enable_dhcp:
-                if self.call_driver('enable', network):
+                if self.call_driver(action, network):
                     dhcp_network_enabled = True
                     self.cache.put(network)
+                    self._save_network_snapshot(network)
                 break
 
         if enable_metadata and dhcp_network_enabled:
@@ -265,14 +367,54 @@ class DhcpAgent(manager.Manager):
         new_cidrs = set(s.cidr for s in network.subnets if s.enable_dhcp)
 
         if new_cidrs and old_cidrs == new_cidrs:
-            self.call_driver('reload_allocations', network)
+            if self.call_driver('reload_allocations', network):
+                self._save_network_snapshot(network)
             self.cache.put(network)
         elif new_cidrs:
             if self.call_driver('restart', network):
                 self.cache.put(network)
+                self._save_network_snapshot(network)
         else:
             self.disable_dhcp_helper(network.id)
 
+    def _queue_network_action(self, network_id, action):
+        """Run a driver action, or 'refresh', for a network.
+
+        The actions queued for a network during the coalescing interval are
+        run together, once, when the interval ends.
+        """
+        if self.conf.notification_coalescing_interval > 0:
+            self._network_events.queue_event((network_id, action))
+        else:
+            self._run_network_actions(network_id, set([action]))
+
+    @utils.synchronized('dhcp-agent')
+    def _process_network_events(self, events):
+        actions = collections.defaultdict(set)
+        for network_id, action in events:
+            actions[network_id].add(action)
+        pool = eventlet.GreenPool(self.conf.num_sync_threads)
+        for network_id, network_actions in actions.items():
+            pool.spawn(self._run_network_actions, network_id,
+                       network_actions)
+        pool.waitall()
+
+    @utils.exception_logger()
+    def _run_network_actions(self, network_id, actions):
+        if 'refresh' in actions:
+            self.refresh_dhcp_helper(network_id)
+            # The refresh already reloaded the allocations if needed
+            actions.discard('reload_allocations')
+        # A restart also reloads the allocations
+        for action in ('restart', 'reload_allocations'):
+            if action in actions:
+                network = self.cache.get_network_by_id(network_id)
+                # The snapshot follows the port changes written to the
+                # config files, which are rewritten from it after a restart
+                if network and self.call_driver(action, network):
+                    self._save_network_snapshot(network)
+                break
+
     @utils.synchronized('dhcp-agent')
     def network_create_end(self, context, payload):
         """Handle the network.create.end notification event."""
@@ -297,7 +439,7 @@ class DhcpAgent(manager.Manager):
     def subnet_update_end(self, context, payload):
         """Handle the subnet.update.end notification event."""
         network_id = payload['subnet']['network_id']
-        self.refresh_dhcp_helper(network_id)
+        self._queue_network_action(network_id, 'refresh')
 
     # Use the update handler for the subnet create event.
     subnet_create_end = subnet_update_end
@@ -308,7 +450,7 @@ class DhcpAgent(manager.Manager):
         subnet_id = payload['subnet_id']
         network = self.cache.get_network_by_subnet_id(subnet_id)
         if network:
-            self.refresh_dhcp_helper(network.id)
+            self._queue_network_action(network.id, 'refresh')
 
     @utils.synchronized('dhcp-agent')
     def port_update_end(self, context, payload):
@@ -325,7 +467,7 @@ class DhcpAgent(manager.Manager):
                 if old_ips != new_ips:
                     driver_action = 'restart'
             self.cache.put_port(updated_port)
-            self.call_driver(driver_action, network)
+            self._queue_network_action(network.id, driver_action)
 
     def _is_port_on_this_agent(self, port):
         thishost = utils.get_dhcp_agent_device_id(
@@ -342,7 +484,7 @@ class DhcpAgent(manager.Manager):
         if port:
             network = self.cache.get_network_by_id(port.network_id)
             self.cache.remove_port(port)
-            self.call_driver('reload_allocations', network)
+            self._queue_network_action(network.id, 'reload_allocations')
 
     def enable_isolated_metadata_proxy(self, network):
 
@@ -389,6 +531,7 @@ class DhcpPluginApi(object):
         1.0 - Initial version.
         1.1 - Added get_active_networks_info, create_dhcp_port,
               and update_dhcp_port methods.
+        1.2 - Added limit and marker to get_active_networks_info.
 
     """
 
@@ -401,13 +544,41 @@ class DhcpPluginApi(object):
                 namespace=constants.RPC_NAMESPACE_DHCP_PLUGIN,
                 version='1.0')
         self.client = n_rpc.get_client(target)
+        self._paging_supported = True
 
-    def get_active_networks_info(self):
-        """Make a remote process call to retrieve all network info."""
-        cctxt = self.client.prepare(version='1.1')
-        networks = cctxt.call(self.context, 'get_active_networks_info',
-                              host=self.host)
-        return [dhcp.NetModel(self.use_namespaces, n) for n in networks]
+    def get_active_networks_info(self, page_size=None):
+        """Make a remote process call to retrieve all network info.
+
+        When page_size is given, the networks are retrieved by calls of
+        page_size networks, unless the server does not support it yet.
+        """
+        if not page_size or not self._paging_supported:
+            cctxt = self.client.prepare(version='1.1')
+            networks = cctxt.call(self.context, 'get_active_networks_info',
+                                  host=self.host)
+            return [dhcp.NetModel(self.use_namespaces, n) for n in networks]
+
+        cctxt = self.client.prepare(version='1.2')
+        networks = []
+        marker = None
+        while True:
+            try:
+                page = cctxt.call(self.context, 'get_active_networks_info',
+                                  host=self.host, limit=page_size,
+                                  marker=marker)
+            except oslo_messaging.RemoteError as e:
+                if e.exc_type != 'UnsupportedVersion':
+                    raise
+                LOG.warn(_LW('Paging the networks requires a server '
+                             'upgrade, retrieving all of them in one '
+                             'call.'))
+                self._paging_supported = False
+                return self.get_active_networks_info()
+            networks.extend(dhcp.NetModel(self.use_namespaces, n)
+                            for n in page)
+            if len(page) < page_size:
+                return networks
+            marker = page[-1]['id']
 
     def get_network_info(self, network_id):
         """Make a remote process call to retrieve network info."""
@@ -463,6 +634,8 @@ class NetworkCache(object):
         self.cache = {}
         self.subnet_lookup = {}
         self.port_lookup = {}
+        # Port id to port, to avoid walking the ports of large networks
+        self.port_index = {}
 
     def get_network_ids(self):
         return self.cache.keys()
@@ -487,6 +660,7 @@ class NetworkCache(object):
 
         for port in network.ports:
             self.port_lookup[port.id] = network.id
+            self.port_index[port.id] = port
 
     def remove(self, network):
         del self.cache[network.id]
@@ -496,33 +670,44 @@ class NetworkCache(object):
 
         for port in network.ports:
             del self.port_lookup[port.id]
+            self.port_index.pop(port.id, None)
+
+    @staticmethod
+    def _invalidate_router_port(network, port):
+        # The values derived from a network depend on its router ports
+        if (getattr(port, 'device_owner', None) in
+                constants.ROUTER_INTERFACE_OWNERS and
+                isinstance(network, dhcp.NetModel)):
+            network.invalidate_derived()
 
     def put_port(self, port):
         network = self.get_network_by_id(port.network_id)
-        for index in range(len(network.ports)):
-            if network.ports[index].id == port.id:
+        old_port = self.port_index.get(port.id)
+        self._invalidate_router_port(network, old_port)
+        self._invalidate_router_port(network, port)
+        # The cached port is looked up by identity, comparing the ports as
+        # dicts would be much slower
+        for index, cached_port in enumerate(network.ports):
+            if cached_port is old_port:
                 network.ports[index] = port
                 break
         else:
             network.ports.append(port)
 
         self.port_lookup[port.id] = network.id
+        self.port_index[port.id] = port
 
     def remove_port(self, port):
         network = self.get_network_by_port_id(port.id)
 
-        for index in range(len(network.ports)):
-            if network.ports[index] == port:
-                del network.ports[index]
-                del self.port_lookup[port.id]
-                break
+        if port in network.ports:
+            self._invalidate_router_port(network, port)
+            network.ports.remove(port)
+            del self.port_lookup[port.id]
+            self.port_index.pop(port.id, None)
 
     def get_port_by_id(self, port_id):
-        network = self.get_network_by_port_id(port_id)
-        if network:
-            for port in network.ports:
-                if port.id == port_id:
-                    return port
+        return self.port_index.get(port_id)
 
     def get_state(self):
         net_ids = self.get_network_ids()
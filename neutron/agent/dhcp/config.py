@@ -29,7 +29,15 @@ DHCP_AGENT_OPTS = [
                        "dedicated network. Requires "
                        "enable_isolated_metadata = True")),
     cfg.IntOpt('num_sync_threads', default=4,
-               help=_('Number of threads to use during sync process.'))
+               help=_('Number of threads to use during sync process.')),
+    cfg.IntOpt('sync_networks_page_size', default=100,
+               help=_('Number of networks retrieved per call during the '
+                      'sync process. 0 retrieves all of them in one call.')),
+    cfg.FloatOpt('notification_coalescing_interval', default=0.5,
+                 help=_('Seconds during which the port and subnet '
+                        'notifications are coalesced, so that the DHCP '
+                        'driver of a network is called at most once per '
+                        'interval. 0 disables the coalescing.')),
 ]
 
 DHCP_OPTS = [
@@ -57,4 +65,12 @@ DNSMASQ_OPTS = [
         help=_('Limit number of leases to prevent a denial-of-service.')),
     cfg.BoolOpt('dhcp_broadcast_reply', default=False,
                 help=_("Use broadcast in DHCP replies")),
+    cfg.IntOpt('dnsmasq_reload_interval', default=1,
+               help=_("Minimum number of seconds between two reloads of "
+                      "a dnsmasq process. The changes made in between are "
+                      "applied by a single reload. 0 disables the delay.")),
+    cfg.StrOpt('dnsmasq_shared_namespace', default='qdhcp-shared',
+               help=_("Namespace in which the DHCP ports of all the "
+                      "networks are plugged when the SharedDnsmasq DHCP "
+                      "driver is used.")),
 ]
@@ -301,6 +301,7 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
 
         if router.get('ha'):
             kwargs['state_change_callback'] = self.enqueue_state_change
+            kwargs['state_change_monitor'] = self.ha_state_monitor
             return ha_router.HaRouter(*args, **kwargs)
 
         return legacy_router.LegacyRouter(*args, **kwargs)
@@ -13,6 +13,7 @@
 #    under the License.
 
 import binascii
+import contextlib
 import netaddr
 
 from oslo_log import log as logging
@@ -45,6 +46,8 @@ class DvrRouter(router.RouterInfo):
         self.rtr_fip_subnet = None
         self.dist_fip_count = None
         self.snat_namespace = None
+        # Pending ip rule/route commands, per namespace, while batching
+        self._ip_batches = None
 
     def get_floating_ips(self):
         """Filter Floating IPs to be hosted on this agent."""
@@ -81,6 +84,33 @@ class DvrRouter(router.RouterInfo):
             self.iptables_manager.ipv4['nat'].add_rule(*rule)
         self.iptables_manager.apply()
 
+    @contextlib.contextmanager
+    def _batched_ip_commands(self):
+        """Defer FIP ip rule and route commands to one batch per namespace.
+
+        Nested uses share the batches of the outermost one, which runs them
+        when it exits.
+        """
+        if self._ip_batches is not None:
+            yield
+            return
+
+        self._ip_batches = {}
+        try:
+            yield
+            self._flush_ip_batches()
+        finally:
+            self._ip_batches = None
+
+    def _get_ip_batch(self, namespace):
+        if namespace not in self._ip_batches:
+            self._ip_batches[namespace] = ip_lib.IPBatch(namespace=namespace)
+        return self._ip_batches[namespace]
+
+    def _flush_ip_batches(self):
+        for batch in self._ip_batches.values():
+            batch.execute()
+
     def floating_ip_added_dist(self, fip, fip_cidr):
         """Add floating IP to FIP namespace."""
         floating_ip = fip['floating_ip_address']
@@ -88,13 +118,14 @@ class DvrRouter(router.RouterInfo):
         rule_pr = self.fip_ns.allocate_rule_priority()
         self.floating_ips_dict[floating_ip] = rule_pr
         fip_2_rtr_name = self.fip_ns.get_int_device_name(self.router_id)
-        ip_rule = ip_lib.IPRule(namespace=self.ns_name)
-        ip_rule.rule.add(fixed_ip, dvr_fip_ns.FIP_RT_TBL, rule_pr)
-        #Add routing rule in fip namespace
         fip_ns_name = self.fip_ns.get_name()
         rtr_2_fip, _ = self.rtr_fip_subnet.get_pair()
-        device = ip_lib.IPDevice(fip_2_rtr_name, namespace=fip_ns_name)
-        device.route.add_route(fip_cidr, str(rtr_2_fip.ip))
+        with self._batched_ip_commands():
+            self._get_ip_batch(self.ns_name).add_rule(
+                fixed_ip, dvr_fip_ns.FIP_RT_TBL, rule_pr)
+            #Add routing rule in fip namespace
+            self._get_ip_batch(fip_ns_name).add_route(
+                fip_cidr, str(rtr_2_fip.ip), fip_2_rtr_name)
         interface_name = (
             self.fip_ns.get_ext_device_name(
                 self.fip_ns.agent_gateway_port['id']))
@@ -116,36 +147,41 @@ class DvrRouter(router.RouterInfo):
 
         rtr_2_fip, fip_2_rtr = self.rtr_fip_subnet.get_pair()
         fip_ns_name = self.fip_ns.get_name()
-        if floating_ip in self.floating_ips_dict:
-            rule_pr = self.floating_ips_dict[floating_ip]
-            ip_rule = ip_lib.IPRule(namespace=self.ns_name)
-            ip_rule.rule.delete(floating_ip, dvr_fip_ns.FIP_RT_TBL, rule_pr)
-            self.fip_ns.deallocate_rule_priority(rule_pr)
-            #TODO(rajeev): Handle else case - exception/log?
-
-        device = ip_lib.IPDevice(fip_2_rtr_name, namespace=fip_ns_name)
-
-        device.route.delete_route(fip_cidr, str(rtr_2_fip.ip))
-        # check if this is the last FIP for this router
-        self.dist_fip_count = self.dist_fip_count - 1
-        if self.dist_fip_count == 0:
-            #remove default route entry
-            device = ip_lib.IPDevice(rtr_2_fip_name, namespace=self.ns_name)
-            ns_ip = ip_lib.IPWrapper(namespace=fip_ns_name)
-            device.route.delete_gateway(str(fip_2_rtr.ip),
-                                        table=dvr_fip_ns.FIP_RT_TBL)
-            self.fip_ns.local_subnets.release(self.router_id)
-            self.rtr_fip_subnet = None
-            ns_ip.del_veth(fip_2_rtr_name)
-            is_last = self.fip_ns.unsubscribe(self.router_id)
-            if is_last:
-                # TODO(Carl) I can't help but think that another router could
-                # come in and want to start using this namespace while this is
-                # destroying it.  The two could end up conflicting on
-                # creating/destroying interfaces and such.  I think I'd like a
-                # semaphore to sync creation/deletion of this namespace.
-                self.fip_ns.delete()
-                self.fip_ns = None
+        with self._batched_ip_commands():
+            if floating_ip in self.floating_ips_dict:
+                rule_pr = self.floating_ips_dict[floating_ip]
+                self._get_ip_batch(self.ns_name).delete_rule(
+                    floating_ip, dvr_fip_ns.FIP_RT_TBL, rule_pr)
+                self.fip_ns.deallocate_rule_priority(rule_pr)
+                #TODO(rajeev): Handle else case - exception/log?
+
+            self._get_ip_batch(fip_ns_name).delete_route(
+                fip_cidr, str(rtr_2_fip.ip), fip_2_rtr_name)
+            # check if this is the last FIP for this router
+            self.dist_fip_count = self.dist_fip_count - 1
+            if self.dist_fip_count == 0:
+                # The link is going away, apply what is pending on it first
+                self._flush_ip_batches()
+                self._ip_batches.clear()
+                #remove default route entry
+                device = ip_lib.IPDevice(rtr_2_fip_name,
+                                         namespace=self.ns_name)
+                ns_ip = ip_lib.IPWrapper(namespace=fip_ns_name)
+                device.route.delete_gateway(str(fip_2_rtr.ip),
+                                            table=dvr_fip_ns.FIP_RT_TBL)
+                self.fip_ns.local_subnets.release(self.router_id)
+                self.rtr_fip_subnet = None
+                ns_ip.del_veth(fip_2_rtr_name)
+                is_last = self.fip_ns.unsubscribe(self.router_id)
+                if is_last:
+                    # TODO(Carl) I can't help but think that another router
+                    # could come in and want to start using this namespace
+                    # while this is destroying it.  The two could end up
+                    # conflicting on creating/destroying interfaces and
+                    # such.  I think I'd like a semaphore to sync
+                    # creation/deletion of this namespace.
+                    self.fip_ns.delete()
+                    self.fip_ns = None
 
     def add_floating_ip(self, fip, interface_name, device):
         if not self._add_fip_addr_to_device(fip, device):
@@ -160,6 +196,11 @@ class DvrRouter(router.RouterInfo):
         super(DvrRouter, self).remove_floating_ip(device, ip_cidr)
         self.floating_ip_removed_dist(ip_cidr)
 
+    def process_floating_ip_addresses(self, interface_name):
+        with self._batched_ip_commands():
+            return super(DvrRouter, self).process_floating_ip_addresses(
+                interface_name)
+
     def create_snat_namespace(self):
         # TODO(mlavalle): in the near future, this method should contain the
         # code in the L3 agent that creates a gateway for a dvr. The first step
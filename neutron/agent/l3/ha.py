@@ -14,15 +14,22 @@
 #    under the License.
 
 import os
+import socket
+import struct
 
 import eventlet
+from eventlet.green import select as green_select
+from eventlet.green import socket as green_socket
 from oslo_config import cfg
 from oslo_log import log as logging
+from oslo_utils import excutils
 import webob
 
+from neutron.agent.linux import ip_lib
+from neutron.agent.linux import ip_monitor
 from neutron.agent.linux import keepalived
 from neutron.agent.linux import utils as agent_utils
-from neutron.i18n import _LI
+from neutron.i18n import _LE, _LI
 from neutron.notifiers import batch_notifier
 
 LOG = logging.getLogger(__name__)
@@ -44,6 +51,15 @@ OPTS = [
     cfg.IntOpt('ha_vrrp_advert_int',
                default=2,
                help=_('The advertisement interval in seconds')),
+    cfg.BoolOpt('ha_consolidated_state_monitor',
+                default=False,
+                help=_('Watch the HA interfaces of all routers hosted by '
+                       'the agent from a single monitor inside the agent, '
+                       'instead of spawning one '
+                       'neutron-keepalived-state-change process per '
+                       'router. The agent needs the CAP_SYS_ADMIN '
+                       'capability to enter the router namespaces, the '
+                       'routers it cannot watch get their own process.')),
 ]
 
 
@@ -86,12 +102,164 @@ class L3AgentKeepalivedStateChangeServer(object):
         server.wait()
 
 
+# rtnetlink(7) messages and attributes of the address events
+NETLINK_ROUTE = 0
+RTMGRP_IPV4_IFADDR = 0x10
+RTM_NEWADDR = 20
+RTM_DELADDR = 21
+IFA_ADDRESS = 1
+IFA_LOCAL = 2
+IFA_LABEL = 3
+NLMSGHDR = struct.Struct('=LHHLL')
+IFADDRMSG = struct.Struct('=BBBBL')
+RTATTR = struct.Struct('=HH')
+NETLINK_BUFFER_SIZE = 65536
+# Seconds before the dispatcher looks for the routers watched meanwhile
+DISPATCH_INTERVAL = 1
+
+
+def _nl_align(length):
+    return (length + 3) & ~3
+
+
+def _parse_address_message(payload, added):
+    family, prefixlen = IFADDRMSG.unpack_from(payload)[:2]
+    attrs = {}
+    offset = IFADDRMSG.size
+    while offset + RTATTR.size <= len(payload):
+        length, attr_type = RTATTR.unpack_from(payload, offset)
+        if length < RTATTR.size:
+            break
+        attrs[attr_type] = payload[offset + RTATTR.size:offset + length]
+        offset += _nl_align(length)
+    address = attrs.get(IFA_LOCAL, attrs.get(IFA_ADDRESS))
+    label = attrs.get(IFA_LABEL)
+    if address is None or label is None:
+        return
+    interface = label.rstrip(b'\0').decode('ascii')
+    cidr = '%s/%s' % (socket.inet_ntop(family, address), prefixlen)
+    line = '%s%s inet %s' % ('' if added else 'Deleted ', interface, cidr)
+    return ip_monitor.IPMonitorEvent(line, added, interface, cidr)
+
+
+def parse_address_events(data):
+    """Return the IPMonitorEvents of the rtnetlink address messages."""
+    events = []
+    offset = 0
+    while offset + NLMSGHDR.size <= len(data):
+        length, msg_type = NLMSGHDR.unpack_from(data, offset)[:2]
+        if length < NLMSGHDR.size:
+            break
+        if msg_type in (RTM_NEWADDR, RTM_DELADDR):
+            event = _parse_address_message(
+                data[offset + NLMSGHDR.size:offset + length],
+                msg_type == RTM_NEWADDR)
+            if event is not None:
+                events.append(event)
+        offset += _nl_align(length)
+    return events
+
+
+class HaStateChangeMonitor(object):
+    """Watch keepalived state transitions of all HA routers of an agent.
+
+    A netlink socket listening to the IPv4 address events is opened in the
+    namespace of each router, which requires the agent to be allowed to
+    enter the namespaces, and a single dispatcher greenthread running in the
+    agent reads them all. This replaces a neutron-keepalived-state-change
+    daemon, and its 'ip monitor' process, per router.
+    """
+
+    def __init__(self):
+        self._watched = {}
+        # The sockets of the routers unwatched while the dispatcher waits
+        self._unwatched = []
+        self._dispatcher = None
+
+    def _open_socket(self, namespace):
+        with ip_lib.enter_namespace(namespace):
+            sock = green_socket.socket(socket.AF_NETLINK, socket.SOCK_RAW,
+                                       NETLINK_ROUTE)
+        try:
+            sock.bind((0, RTMGRP_IPV4_IFADDR))
+        except socket.error:
+            with excutils.save_and_reraise_exception():
+                sock.close()
+        return sock
+
+    def watch(self, router_id, namespace, interface, cidr, callback):
+        """Start watching the HA interface of a router.
+
+        :param callback: called with the new state ('master' or 'backup')
+                         whenever cidr is added to or removed from interface.
+        :raises: OSError or socket.error if the namespace of the router
+                 cannot be watched.
+        """
+        self.unwatch(router_id)
+        sock = self._open_socket(namespace)
+        self._watched[router_id] = (sock, interface, cidr, callback)
+        if self._dispatcher is None:
+            self._dispatcher = eventlet.spawn(self._dispatch)
+
+    def unwatch(self, router_id):
+        watched = self._watched.pop(router_id, None)
+        if watched is not None:
+            self._unwatched.append(watched[0])
+
+    def is_watched(self, router_id):
+        return router_id in self._watched
+
+    def _dispatch(self):
+        while True:
+            self.dispatch_events()
+
+    def dispatch_events(self):
+        """Wait for the events of the watched routers, and handle them."""
+        while self._unwatched:
+            self._unwatched.pop().close()
+        routers = dict((watched[0], router_id)
+                       for router_id, watched in self._watched.items())
+        if not routers:
+            eventlet.sleep(DISPATCH_INTERVAL)
+            return
+        readable = green_select.select(list(routers), [], [],
+                                       DISPATCH_INTERVAL)[0]
+        for sock in readable:
+            router_id = routers[sock]
+            try:
+                data = sock.recv(NETLINK_BUFFER_SIZE)
+            except socket.error:
+                # The events which did not fit in the buffer are lost
+                LOG.exception(_LE('Failed to read the address events of '
+                                  'router %s'), router_id)
+                continue
+            for event in parse_address_events(data):
+                self.handle_event(router_id, event)
+
+    def handle_event(self, router_id, event):
+        watched = self._watched.get(router_id)
+        if watched is None:
+            # Event of a router that was unwatched in the meantime
+            return
+        sock, interface, cidr, callback = watched
+        try:
+            if event.interface == interface and event.cidr == cidr:
+                callback('master' if event.added else 'backup')
+        except Exception:
+            LOG.exception(_LE('Failed to handle event %(event)s of router '
+                              '%(router_id)s'),
+                          {'event': event, 'router_id': router_id})
+
+
 class AgentMixin(object):
     def __init__(self, host):
         self._init_ha_conf_path()
         super(AgentMixin, self).__init__(host)
         self.state_change_notifier = batch_notifier.BatchNotifier(
             self._calculate_batch_duration(), self.notify_server)
+        self.ha_state_monitor = None
+        if self.conf.ha_consolidated_state_monitor:
+            self.ha_state_monitor = HaStateChangeMonitor()
         eventlet.spawn(self._start_keepalived_notifications_server)
 
     def _start_keepalived_notifications_server(self):
@@ -14,6 +14,7 @@
 
 import os
 import shutil
+import socket
 
 import netaddr
 from oslo_log import log as logging
@@ -33,11 +34,13 @@ IP_MONITOR_PROCESS_SERVICE = 'ip_monitor'
 
 class HaRouter(router.RouterInfo):
     def __init__(self, state_change_callback, *args, **kwargs):
+        state_change_monitor = kwargs.pop('state_change_monitor', None)
         super(HaRouter, self).__init__(*args, **kwargs)
 
         self.ha_port = None
         self.keepalived_manager = None
         self.state_change_callback = state_change_callback
+        self.state_change_monitor = state_change_monitor
 
     @property
     def is_ha(self):
@@ -301,13 +304,33 @@ class HaRouter(router.RouterInfo):
 
         return callback
 
+    def _handle_state_change(self, state):
+        self.ha_state = state
+        self.state_change_callback(self.router_id, state)
+
     def spawn_state_change_monitor(self, process_monitor):
+        if self.state_change_monitor:
+            try:
+                self.state_change_monitor.watch(
+                    self.router_id, self.ns_name, self.get_ha_device_name(),
+                    self._get_primary_vip(), self._handle_state_change)
+                return
+            except (OSError, socket.error):
+                LOG.exception(_LE('Unable to watch the namespace of router '
+                                  '%s, spawning its own state change '
+                                  'monitor'), self.router_id)
+
         pm = self._get_state_change_monitor_process_manager()
         pm.enable()
         process_monitor.register(
             self.router_id, IP_MONITOR_PROCESS_SERVICE, pm)
 
     def destroy_state_change_monitor(self, process_monitor):
+        if (self.state_change_monitor and
+                self.state_change_monitor.is_watched(self.router_id)):
+            self.state_change_monitor.unwatch(self.router_id)
+            return
+
         pm = self._get_state_change_monitor_process_manager()
         process_monitor.unregister(
             self.router_id, IP_MONITOR_PROCESS_SERVICE)
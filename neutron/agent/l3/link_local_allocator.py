@@ -15,6 +15,12 @@
 import netaddr
 import os
 
+from neutron.agent.linux import utils
+
+# Number of journal records tolerated on top of the live entries before the
+# state file is compacted.
+JOURNAL_COMPACT_THRESHOLD = 100
+
 
 class LinkLocalAddressPair(netaddr.IPNetwork):
     def __init__(self, addr):
@@ -36,6 +42,11 @@ class LinkLocalAllocator(object):
 
     Persisting these in the database is unnecessary and would degrade
     performance.
+
+    The state file is a journal: every allocation appends a "key,cidr" record
+    and every release appends a "key," record, the last record for a key
+    winning. It is compacted to the live entries once enough records have
+    accumulated, instead of being rewritten on every change.
     """
     def __init__(self, state_file, subnet):
         """Read the file with previous allocations recorded.
@@ -48,13 +59,21 @@ class LinkLocalAllocator(object):
         self.allocations = {}
 
         self.remembered = {}
-        for line in self._read():
+        lines = self._read()
+        for line in lines:
             key, cidr = line.strip().split(',')
-            self.remembered[key] = LinkLocalAddressPair(cidr)
+            if cidr:
+                self.remembered[key] = LinkLocalAddressPair(cidr)
+            else:
+                self.remembered.pop(key, None)
 
         self.pool = set(LinkLocalAddressPair(s) for s in subnet.subnet(31))
         self.pool.difference_update(self.remembered.values())
 
+        self._journal_len = len(lines)
+        if self._journal_len > len(self.remembered):
+            self._write_allocations()
+
     def allocate(self, key):
         """Try to allocate a link local address pair.
 
@@ -85,21 +104,34 @@ class LinkLocalAllocator(object):
                 raise RuntimeError(_("Cannot allocate link local address"))
 
         self.allocations[key] = self.pool.pop()
-        self._write_allocations()
+        self._record("%s,%s\n" % (key, self.allocations[key]))
         return self.allocations[key]
 
     def release(self, key):
         self.pool.add(self.allocations.pop(key))
-        self._write_allocations()
+        self._record("%s,\n" % key)
+
+    def _record(self, line):
+        """Append a record to the journal, compacting it when too long."""
+        live = len(self.allocations) + len(self.remembered)
+        if self._journal_len >= live + JOURNAL_COMPACT_THRESHOLD:
+            self._write_allocations()
+        else:
+            self._append([line])
+            self._journal_len += 1
 
     def _write_allocations(self):
         current = ["%s,%s\n" % (k, v) for k, v in self.allocations.items()]
         remembered = ["%s,%s\n" % (k, v) for k, v in self.remembered.items()]
         current.extend(remembered)
         self._write(current)
+        self._journal_len = len(current)
 
     def _write(self, lines):
-        with open(self.state_file, "w") as f:
+        utils.replace_file(self.state_file, ''.join(lines))
+
+    def _append(self, lines):
+        with open(self.state_file, "a") as f:
             f.writelines(lines)
 
     def _read(self):
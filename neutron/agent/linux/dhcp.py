@@ -18,12 +18,15 @@ import collections
 import os
 import re
 import shutil
+import time
 
+import eventlet
 import netaddr
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_utils import importutils
 import six
+from six import moves
 
 from neutron.agent.linux import external_process
 from neutron.agent.linux import ip_lib
@@ -51,11 +54,35 @@ METADATA_PORT = 80
 WIN2k3_STATIC_DNS = 249
 NS_PREFIX = 'qdhcp-'
 DNSMASQ_SERVICE_NAME = 'dnsmasq'
+SHARED_DNSMASQ_ID = 'dnsmasq-shared'
+# Config files of each network read by the shared dnsmasq from directories
+SHARED_FILE_KINDS = ('host', 'addn_hosts', 'opts')
+
+
+# Keys of the values repeated by many ports, fixed IPs or subnets
+_SHARED_VALUE_KEYS = frozenset(['network_id', 'tenant_id', 'subnet_id',
+                                'device_owner', 'ip_version',
+                                'ipv6_address_mode', 'ipv6_ra_mode'])
+
+
+def _intern(value):
+    """Return the single instance in memory of a string value.
+
+    The interned strings are freed once no model uses them anymore. Unicode
+    values are interned as native strings when they are ASCII.
+    """
+    try:
+        return moves.intern(str(value))
+    except UnicodeEncodeError:
+        return value
 
 
 class DictModel(dict):
     """Convert dict into an object that provides attribute access to values."""
 
+    # Attributes are stored as dict items, instances do not need a __dict__
+    __slots__ = ()
+
     def __init__(self, *args, **kwargs):
         """Convert dict values to DictModel values."""
         super(DictModel, self).__init__(*args, **kwargs)
@@ -81,6 +108,9 @@ class DictModel(dict):
             elif needs_upgrade(value):
                 # Change dict instance values to DictModel instance values
                 self[key] = DictModel(value)
+            elif key in _SHARED_VALUE_KEYS and isinstance(value,
+                                                          six.string_types):
+                self[key] = _intern(value)
 
     def __getattr__(self, name):
         try:
@@ -97,16 +127,66 @@ class DictModel(dict):
 
 class NetModel(DictModel):
 
+    # The values derived from the network are not items of the model
+    __slots__ = ('_derived',)
+
     def __init__(self, use_namespaces, d):
         super(NetModel, self).__init__(d)
 
         self._ns_name = (use_namespaces and
                          "%s%s" % (NS_PREFIX, self.id) or None)
+        if isinstance(d, NetModel):
+            # A copy of a network shares the values derived from it
+            object.__setattr__(self, '_derived', d.derived)
+
+    def __getstate__(self):
+        # The derived values are not copied with the network
+        return None
 
     @property
     def namespace(self):
         return self._ns_name
 
+    @property
+    def derived(self):
+        """Values the DHCP drivers derive from the network, like its options.
+
+        They only depend on the subnets and the router ports of the network,
+        and are invalidated when those change.
+        """
+        try:
+            return self._derived
+        except AttributeError:
+            self.invalidate_derived()
+            return self._derived
+
+    def invalidate_derived(self):
+        object.__setattr__(self, '_derived', {})
+
+
+class DnsmasqFilesState(object):
+    """What was last written to the dnsmasq config files of a network."""
+
+    def __init__(self):
+        self.contents = {}
+        self.leases = None
+        self.last_reload = 0
+        self.delayed_reload = None
+
+
+class SharedDnsmasqState(object):
+    """The networks served by the shared dnsmasq of the agent."""
+
+    def __init__(self):
+        self.networks = {}
+        # The CIDRs of the subnets of the networks
+        self.cidrs = {}
+        # The networks served by their own dnsmasq
+        self.dedicated = set()
+        self.ranges = None
+        self.last_update = 0
+        self.delayed_update = None
+
 
 @six.add_metaclass(abc.ABCMeta)
 class DhcpBase(object):
@@ -140,6 +220,13 @@ class DhcpBase(object):
     def reload_allocations(self):
         """Force the DHCP server to reload the assignment database."""
 
+    def adopt(self):
+        """Monitor the DHCP server left running by a previous agent.
+
+        Returns True if the server of the network was adopted.
+        """
+        return False
+
     @classmethod
     def existing_dhcp_networks(cls, conf):
         """Return a list of existing networks ids that we have configs for."""
@@ -225,7 +312,9 @@ class DhcpLocalProcess(DhcpBase):
         except RuntimeError:
             LOG.warning(_LW('Failed trying to delete interface: %s'),
                         self.interface_name)
+        self._destroy_namespace()
 
+    def _destroy_namespace(self):
         if self.conf.dhcp_delete_namespaces and self.network.namespace:
             ns_ip = ip_lib.IPWrapper(namespace=self.network.namespace)
             try:
@@ -281,6 +370,9 @@ class Dnsmasq(DhcpLocalProcess):
 
     _TAG_PREFIX = 'tag%d'
 
+    # DnsmasqFilesState of each network, kept across driver instances
+    _files_states = {}
+
     @classmethod
     def check_version(cls):
         pass
@@ -314,8 +406,29 @@ class Dnsmasq(DhcpLocalProcess):
             '--dhcp-authoritative',
         ]
 
+        ranges, possible_leases = self._get_dhcp_ranges(self.network,
+                                                        self._TAG_PREFIX)
+        cmd.extend(ranges)
+
+        if cfg.CONF.advertise_mtu:
+            mtu = self.network.mtu
+            # Do not advertise unknown mtu
+            if mtu > 0:
+                cmd.append('--dhcp-option-force=option:mtu,%d' % mtu)
+
+        # Cap the limit because creating lots of subnets can inflate
+        # this possible lease cap.
+        cmd.append('--dhcp-lease-max=%d' %
+                   min(possible_leases, self.conf.dnsmasq_lease_max))
+
+        cmd.extend(self._get_server_options())
+        return cmd
+
+    def _get_dhcp_ranges(self, network, tag_prefix):
+        """Return the --dhcp-range options of network and their size."""
+        ranges = []
         possible_leases = 0
-        for i, subnet in enumerate(self.network.subnets):
+        for i, subnet in enumerate(network.subnets):
             mode = None
             # if a subnet is specified to have dhcp disabled
             if not subnet.enable_dhcp:
@@ -342,28 +455,20 @@ class Dnsmasq(DhcpLocalProcess):
             # mode is optional and is not set - skip it
             if mode:
                 if subnet.ip_version == 4:
-                    cmd.append('--dhcp-range=%s%s,%s,%s,%s' %
-                               ('set:', self._TAG_PREFIX % i,
-                                cidr.network, mode, lease))
+                    ranges.append('--dhcp-range=%s%s,%s,%s,%s' %
+                                  ('set:', tag_prefix % i,
+                                   cidr.network, mode, lease))
                 else:
-                    cmd.append('--dhcp-range=%s%s,%s,%s,%d,%s' %
-                               ('set:', self._TAG_PREFIX % i,
-                                cidr.network, mode,
-                                cidr.prefixlen, lease))
+                    ranges.append('--dhcp-range=%s%s,%s,%s,%d,%s' %
+                                  ('set:', tag_prefix % i,
+                                   cidr.network, mode,
+                                   cidr.prefixlen, lease))
                 possible_leases += cidr.size
+        return ranges, possible_leases
 
-        if cfg.CONF.advertise_mtu:
-            mtu = self.network.mtu
-            # Do not advertise unknown mtu
-            if mtu > 0:
-                cmd.append('--dhcp-option-force=option:mtu,%d' % mtu)
-
-        # Cap the limit because creating lots of subnets can inflate
-        # this possible lease cap.
-        cmd.append('--dhcp-lease-max=%d' %
-                   min(possible_leases, self.conf.dnsmasq_lease_max))
-
-        cmd.append('--conf-file=%s' % self.conf.dnsmasq_config_file)
+    def _get_server_options(self):
+        """Return the options which do not depend on the networks."""
+        cmd = ['--conf-file=%s' % self.conf.dnsmasq_config_file]
         if self.conf.dnsmasq_dns_servers:
             cmd.extend(
                 '--server=%s' % server
@@ -379,6 +484,10 @@ class Dnsmasq(DhcpLocalProcess):
 
     def spawn_process(self):
         """Spawn the process, if it's not spawned already."""
+        # The addresses of the DHCP port may have changed since the options
+        # of the network were generated, which are only reused by reloads.
+        if isinstance(self.network, NetModel):
+            self.network.invalidate_derived()
         self._spawn_or_reload_process(reload_with_HUP=False)
 
     def _spawn_or_reload_process(self, reload_with_HUP):
@@ -388,16 +497,86 @@ class Dnsmasq(DhcpLocalProcess):
         or it's reloaded if the process is not running.
         """
 
-        self._output_config_files()
+        changed = self._output_config_files()
 
         pm = self._get_process_manager(
             cmd_callback=self._build_cmdline_callback)
 
-        pm.enable(reload_cfg=reload_with_HUP)
+        if reload_with_HUP and pm.active:
+            if changed:
+                self._reload_process(pm)
+        else:
+            pm.enable(reload_cfg=reload_with_HUP)
+
+        self.process_monitor.register(uuid=self.network.id,
+                                      service_name=DNSMASQ_SERVICE_NAME,
+                                      monitored_process=pm)
 
+    def adopt(self):
+        """Monitor the dnsmasq of the network if it is still running."""
+        pm = self._get_process_manager(
+            cmd_callback=self._build_cmdline_callback)
+        if not pm.active:
+            return False
         self.process_monitor.register(uuid=self.network.id,
                                       service_name=DNSMASQ_SERVICE_NAME,
                                       monitored_process=pm)
+        return True
+
+    def _get_files_state(self):
+        state = self._files_states.get(self.network.id)
+        if state is None:
+            # Start from the files left by a previous run of the agent so
+            # that unchanged networks are neither rewritten nor reloaded.
+            state = DnsmasqFilesState()
+            for kind in ('host', 'addn_hosts', 'opts'):
+                data = self._get_value_from_conf_file(kind)
+                if data is not None:
+                    state.contents[kind] = data
+            self._files_states[self.network.id] = state
+        return state
+
+    def _reload_process(self, pm):
+        """Send SIGHUP to dnsmasq at most once per dnsmasq_reload_interval.
+
+        When dnsmasq was reloaded too recently, a single delayed reload is
+        scheduled, which applies all the changes made in the meantime.
+        """
+        state = self._get_files_state()
+        if state.delayed_reload:
+            return
+        delay = state.last_reload + self.conf.dnsmasq_reload_interval
+        delay -= time.time()
+        if delay <= 0:
+            state.last_reload = time.time()
+            pm.enable(reload_cfg=True)
+        else:
+            LOG.debug('Delaying reload of dnsmasq for network %(net)s by '
+                      '%(delay).1f seconds', {'net': self.network.id,
+                                              'delay': delay})
+            state.delayed_reload = eventlet.spawn_after(
+                delay, self._delayed_reload, pm, state)
+
+    @staticmethod
+    def _delayed_reload(pm, state):
+        state.delayed_reload = None
+        state.last_reload = time.time()
+        pm.enable(reload_cfg=True)
+
+    def disable(self, retain_port=False):
+        state = self._files_states.pop(self.network.id, None)
+        if state and state.delayed_reload:
+            state.delayed_reload.cancel()
+        super(Dnsmasq, self).disable(retain_port)
+
+    def _replace_config_file(self, kind, data):
+        """Write a config file unless it was last written with data."""
+        contents = self._get_files_state().contents
+        filename = self.get_conf_file_name(kind)
+        if contents.get(kind) != data:
+            utils.replace_file(filename, data)
+            contents[kind] = data
+        return filename
 
     def _release_lease(self, mac_address, ip):
         """Release a DHCP lease."""
@@ -406,9 +585,13 @@ class Dnsmasq(DhcpLocalProcess):
         ip_wrapper.netns.execute(cmd, run_as_root=True)
 
     def _output_config_files(self):
+        """Write the config files, return True if any of them changed."""
+        contents = self._get_files_state().contents
+        old_contents = dict(contents)
         self._output_hosts_file()
         self._output_addn_hosts_file()
         self._output_opts_file()
+        return contents != old_contents
 
     def reload_allocations(self):
         """Rebuild the dnsmasq config and signal the dnsmasq to reload."""
@@ -479,6 +662,7 @@ class Dnsmasq(DhcpLocalProcess):
         """
         buf = six.StringIO()
         filename = self.get_conf_file_name('host')
+        leases = set()
 
         LOG.debug('Building host file: %s', filename)
         dhcp_enabled_subnet_ids = [s.id for s in self.network.subnets
@@ -498,6 +682,7 @@ class Dnsmasq(DhcpLocalProcess):
             # it with '[]' to let dnsmasq to distinguish MAC address from
             # IPv6 address.
             ip_address = alloc.ip_address
+            leases.add((ip_address, port.mac_address))
             if netaddr.valid_ipv6(ip_address):
                 ip_address = '[%s]' % ip_address
 
@@ -509,7 +694,8 @@ class Dnsmasq(DhcpLocalProcess):
                 buf.write('%s,%s,%s\n' %
                           (port.mac_address, name, ip_address))
 
-        utils.replace_file(filename, buf.getvalue())
+        self._replace_config_file('host', buf.getvalue())
+        self._get_files_state().leases = leases
         LOG.debug('Done building host file %s with contents:\n%s', filename,
                   buf.getvalue())
         return filename
@@ -524,8 +710,10 @@ class Dnsmasq(DhcpLocalProcess):
         return leases
 
     def _release_unused_leases(self):
-        filename = self.get_conf_file_name('host')
-        old_leases = self._read_hosts_file_leases(filename)
+        old_leases = self._get_files_state().leases
+        if old_leases is None:
+            filename = self.get_conf_file_name('host')
+            old_leases = self._read_hosts_file_leases(filename)
 
         new_leases = set()
         for port in self.network.ports:
@@ -551,20 +739,28 @@ class Dnsmasq(DhcpLocalProcess):
             # order to obtain it in PTR responses.
             if alloc:
                 buf.write('%s\t%s %s\n' % (alloc.ip_address, fqdn, hostname))
-        addn_hosts = self.get_conf_file_name('addn_hosts')
-        utils.replace_file(addn_hosts, buf.getvalue())
-        return addn_hosts
+        return self._replace_config_file('addn_hosts', buf.getvalue())
 
     def _output_opts_file(self):
         """Write a dnsmasq compatible options file."""
         options, subnet_index_map = self._generate_opts_per_subnet()
         options += self._generate_opts_per_port(subnet_index_map)
 
-        name = self.get_conf_file_name('opts')
-        utils.replace_file(name, '\n'.join(options))
-        return name
+        return self._replace_config_file('opts', '\n'.join(options))
 
     def _generate_opts_per_subnet(self):
+        """Return the options of the subnets, memoized on the network."""
+        derived = getattr(self.network, 'derived', None)
+        if derived is None:
+            return self._build_opts_per_subnet()
+        key = ('opts_per_subnet', self._TAG_PREFIX,
+               self.conf.enable_isolated_metadata, self.conf.dhcp_domain)
+        if key not in derived:
+            derived[key] = self._build_opts_per_subnet()
+        options, subnet_index_map = derived[key]
+        return list(options), dict(subnet_index_map)
+
+    def _build_opts_per_subnet(self):
         options = []
         subnet_index_map = {}
         if self.conf.enable_isolated_metadata:
@@ -589,8 +785,9 @@ class Dnsmasq(DhcpLocalProcess):
                 subnet_index_map[subnet.id] = i
 
             if self.conf.dhcp_domain and subnet.ip_version == 6:
-                options.append('tag:tag%s,option6:domain-search,%s' %
-                               (i, ''.join(self.conf.dhcp_domain)))
+                options.append('tag:%s,option6:domain-search,%s' %
+                               (self._TAG_PREFIX % i,
+                                ''.join(self.conf.dhcp_domain)))
 
             gateway = subnet.gateway_ip
             host_routes = []
@@ -738,6 +935,10 @@ class Dnsmasq(DhcpLocalProcess):
         the subnet, and the port's ip address matches that of the subnet's
         gateway. The port must be owned by a nuetron router.
         """
+        derived = getattr(network, 'derived', None)
+        if derived is not None and 'isolated_subnets' in derived:
+            return derived['isolated_subnets']
+
         isolated_subnets = collections.defaultdict(lambda: True)
         subnets = dict((subnet.id, subnet) for subnet in network.subnets)
 
@@ -748,6 +949,8 @@ class Dnsmasq(DhcpLocalProcess):
                 if subnets[alloc.subnet_id].gateway_ip == alloc.ip_address:
                     isolated_subnets[alloc.subnet_id] = False
 
+        if derived is not None:
+            derived['isolated_subnets'] = isolated_subnets
         return isolated_subnets
 
     @classmethod
@@ -778,6 +981,293 @@ class Dnsmasq(DhcpLocalProcess):
         return any(isolated_subnets[subnet.id] for subnet in network.subnets)
 
 
+class SharedDnsmasq(Dnsmasq):
+    """Serve all the networks of the agent from a single dnsmasq process.
+
+    The DHCP ports of the networks are plugged in one namespace where a
+    dnsmasq listens on all of them. The subnets of each network get their
+    own tags, and the hosts and options of each network are written in
+    their own files, in directories read by dnsmasq. Since the networks
+    share a namespace, a network whose subnets overlap those of the shared
+    networks is served by its own dnsmasq, like with the Dnsmasq driver,
+    until it is disabled. Isolated metadata is not supported.
+    """
+
+    # The networks served by the dnsmasq of the agent
+    _state = SharedDnsmasqState()
+
+    def __init__(self, conf, network, process_monitor, version=None,
+                 plugin=None):
+        self._dedicated_args = (conf, network, process_monitor, version,
+                                plugin)
+        # Work on a copy of the network which lives in the shared namespace
+        network = NetModel(False, network)
+        network._ns_name = (conf.dnsmasq_shared_namespace
+                            if conf.use_namespaces else None)
+        super(SharedDnsmasq, self).__init__(conf, network, process_monitor,
+                                            version, plugin)
+        self.device_manager = SharedDeviceManager(conf, plugin)
+        self.shared_conf_dir = os.path.join(self.confs_dir,
+                                            SHARED_DNSMASQ_ID)
+        self._TAG_PREFIX = self._get_tag_prefix(network.id)
+
+    @classmethod
+    def check_version(cls):
+        if cfg.CONF.enable_isolated_metadata:
+            LOG.error(_LE('The SharedDnsmasq DHCP driver does not support '
+                          'enable_isolated_metadata.'))
+            raise SystemExit(1)
+        return super(SharedDnsmasq, cls).check_version()
+
+    @classmethod
+    def should_enable_metadata(cls, conf, network):
+        return False
+
+    @staticmethod
+    def _get_tag_prefix(network_id):
+        return 'tag%%d-%s' % network_id
+
+    def get_conf_file_name(self, kind):
+        if kind in SHARED_FILE_KINDS:
+            return os.path.join(self.shared_conf_dir, kind, self.network.id)
+        return super(SharedDnsmasq, self).get_conf_file_name(kind)
+
+    def _remove_config_files(self):
+        super(SharedDnsmasq, self)._remove_config_files()
+        for kind in SHARED_FILE_KINDS:
+            try:
+                os.remove(self.get_conf_file_name(kind))
+            except OSError:
+                pass
+
+    def _get_process_manager(self, cmd_callback=None):
+        return external_process.ProcessManager(
+            conf=self.conf,
+            uuid=SHARED_DNSMASQ_ID,
+            namespace=self.network.namespace,
+            default_cmd_callback=cmd_callback,
+            pid_file=os.path.join(self.shared_conf_dir, 'pid'),
+            run_as_root=True)
+
+    def _get_dedicated_driver(self):
+        return Dnsmasq(*self._dedicated_args)
+
+    @staticmethod
+    def _get_cidrs(network):
+        return [netaddr.IPNetwork(subnet.cidr) for subnet in network.subnets]
+
+    def _overlaps_shared_networks(self):
+        cidrs = self._get_cidrs(self.network)
+        for network_id, shared_cidrs in six.iteritems(self._state.cidrs):
+            if network_id == self.network.id:
+                continue
+            for cidr in cidrs:
+                for shared_cidr in shared_cidrs:
+                    if (cidr.version == shared_cidr.version and
+                            cidr.first <= shared_cidr.last and
+                            shared_cidr.first <= cidr.last):
+                        return True
+        return False
+
+    def _use_dedicated_driver(self):
+        """Check if the network is served by its own dnsmasq.
+
+        A shared network whose subnets now overlap those of the other shared
+        networks is moved to its own dnsmasq.
+        """
+        state = self._state
+        if self.network.id in state.dedicated:
+            return True
+        if not self._overlaps_shared_networks():
+            return False
+        LOG.info(_LI('Subnets of network %s overlap those of the networks '
+                     'of the shared dnsmasq, serving it from its own '
+                     'dnsmasq.'), self.network.id)
+        if self.network.id in state.networks:
+            self._disable_shared()
+        state.dedicated.add(self.network.id)
+        return True
+
+    def enable(self):
+        if self._use_dedicated_driver():
+            self._get_dedicated_driver().enable()
+        else:
+            super(SharedDnsmasq, self).enable()
+
+    def restart(self):
+        if self.network.id in self._state.dedicated:
+            self._get_dedicated_driver().restart()
+        else:
+            super(SharedDnsmasq, self).restart()
+
+    def reload_allocations(self):
+        if self._use_dedicated_driver():
+            self._get_dedicated_driver().reload_allocations()
+        else:
+            super(SharedDnsmasq, self).reload_allocations()
+
+    @property
+    def active(self):
+        if self.network.id in self._state.dedicated:
+            return self._get_dedicated_driver().active
+        return (self.network.id in self._state.networks and
+                super(SharedDnsmasq, self).active)
+
+    def _build_cmdline_callback(self, pid_file):
+        cmd = [
+            'dnsmasq',
+            '--no-hosts',
+            '--no-resolv',
+            '--strict-order',
+            '--bind-dynamic',
+            '--except-interface=lo',
+            '--pid-file=%s' % pid_file,
+            '--dhcp-hostsfile=%s' % os.path.join(self.shared_conf_dir,
+                                                 'host'),
+            '--addn-hosts=%s' % os.path.join(self.shared_conf_dir,
+                                             'addn_hosts'),
+            '--dhcp-optsfile=%s' % os.path.join(self.shared_conf_dir, 'opts'),
+            '--leasefile-ro',
+            '--dhcp-authoritative',
+        ]
+
+        ranges, possible_leases = self._get_all_dhcp_ranges()
+        self._state.ranges = ranges
+        cmd.extend(ranges)
+        cmd.append('--dhcp-lease-max=%d' %
+                   min(possible_leases, self.conf.dnsmasq_lease_max))
+        cmd.extend(self._get_server_options())
+        return cmd
+
+    def _get_all_dhcp_ranges(self):
+        ranges = []
+        possible_leases = 0
+        for network_id, network in sorted(self._state.networks.items()):
+            network_ranges, network_leases = self._get_dhcp_ranges(
+                network, self._get_tag_prefix(network_id))
+            ranges.extend(network_ranges)
+            possible_leases += network_leases
+        return ranges, possible_leases
+
+    def _generate_opts_per_subnet(self):
+        options, subnet_index_map = super(
+            SharedDnsmasq, self)._generate_opts_per_subnet()
+        # The mtu of each network is sent by options, not on the command line
+        if cfg.CONF.advertise_mtu and self.network.mtu > 0:
+            for i, subnet in enumerate(self.network.subnets):
+                if subnet.enable_dhcp and subnet.ip_version == 4:
+                    options.append(self._format_option(4, i, 'mtu',
+                                                       self.network.mtu))
+        return options, subnet_index_map
+
+    def _spawn_or_reload_process(self, reload_with_HUP):
+        """Register the network and update the shared dnsmasq if needed."""
+        for kind in SHARED_FILE_KINDS:
+            utils.ensure_dir(os.path.join(self.shared_conf_dir, kind))
+        changed = self._output_config_files()
+        registered = self.network.id in self._state.networks
+        self._register_network()
+        if changed or not registered or not reload_with_HUP:
+            self._schedule_update()
+
+    def _register_network(self):
+        self._state.networks[self.network.id] = self.network
+        self._state.cidrs[self.network.id] = self._get_cidrs(self.network)
+
+    def _unregister_network(self):
+        self._state.networks.pop(self.network.id, None)
+        self._state.cidrs.pop(self.network.id, None)
+
+    def adopt(self):
+        """Register the network if the shared dnsmasq is still running.
+
+        The running dnsmasq is assumed to serve the ranges of the adopted
+        networks, so that it is only restarted if they change. The networks
+        which had their own dnsmasq, and so its pid file, adopt it.
+        """
+        if os.path.exists(self.get_conf_file_name('pid')):
+            if not self._get_dedicated_driver().adopt():
+                return False
+            self._state.dedicated.add(self.network.id)
+            return True
+        pm = self._get_process_manager(
+            cmd_callback=self._build_cmdline_callback)
+        if not pm.active:
+            return False
+        self._register_network()
+        self._state.ranges = self._get_all_dhcp_ranges()[0]
+        self.process_monitor.register(uuid=SHARED_DNSMASQ_ID,
+                                      service_name=DNSMASQ_SERVICE_NAME,
+                                      monitored_process=pm)
+        return True
+
+    def _schedule_update(self):
+        """Update the shared dnsmasq at most once per dnsmasq_reload_interval.
+
+        The changes made to the networks in the meantime, like the ones of
+        the initial sync of the agent, are applied by a single update.
+        """
+        state = self._state
+        if state.delayed_update:
+            return
+        delay = state.last_update + self.conf.dnsmasq_reload_interval
+        delay = max(0, delay - time.time())
+        state.delayed_update = eventlet.spawn_after(delay,
+                                                    self._update_process)
+
+    def _update_process(self):
+        """Restart or reload the shared dnsmasq for the served networks.
+
+        dnsmasq only reads its DHCP ranges when it starts, so it is restarted
+        when ranges were added and sent a HUP otherwise. The ranges of the
+        removed networks are left to dnsmasq until it restarts: it is static
+        and their hosts are removed by the HUP, so they serve no address.
+        """
+        state = self._state
+        state.delayed_update = None
+        state.last_update = time.time()
+        pm = self._get_process_manager(
+            cmd_callback=self._build_cmdline_callback)
+
+        ranges = self._get_all_dhcp_ranges()[0]
+        if pm.active and state.networks and set(ranges).issubset(
+                state.ranges or ()):
+            pm.enable(reload_cfg=True)
+            return
+
+        self.process_monitor.unregister(SHARED_DNSMASQ_ID,
+                                        DNSMASQ_SERVICE_NAME)
+        pm.disable()
+        if not state.networks:
+            state.ranges = None
+            return
+        pm.enable()
+        self.process_monitor.register(uuid=SHARED_DNSMASQ_ID,
+                                      service_name=DNSMASQ_SERVICE_NAME,
+                                      monitored_process=pm)
+
+    def disable(self, retain_port=False):
+        if self.network.id in self._state.dedicated:
+            self._state.dedicated.discard(self.network.id)
+            self._get_dedicated_driver().disable(retain_port)
+        else:
+            self._disable_shared(retain_port)
+
+    def _disable_shared(self, retain_port=False):
+        """Stop serving the network from the shared dnsmasq."""
+        self._files_states.pop(self.network.id, None)
+        self._unregister_network()
+        if not retain_port:
+            self._destroy_namespace_and_port()
+        self._remove_config_files()
+        self._schedule_update()
+
+    def _destroy_namespace(self):
+        # The namespace is only deleted with the port of the last network
+        if not self._state.networks:
+            super(SharedDnsmasq, self)._destroy_namespace()
+
+
 class DeviceManager(object):
 
     def __init__(self, conf, plugin):
@@ -983,3 +1473,12 @@ class DeviceManager(object):
                      % constants.DHCP_RESPONSE_PORT)
         iptables_mgr.ipv4['mangle'].add_rule('POSTROUTING', ipv4_rule)
         iptables_mgr.apply()
+
+
+class SharedDeviceManager(DeviceManager):
+    """Manage the DHCP ports plugged in the namespace shared by networks."""
+
+    def _set_default_route(self, network, device_name):
+        # The gateway of a network cannot be the default route of the
+        # namespace shared with the other networks
+        pass
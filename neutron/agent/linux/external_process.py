@@ -14,10 +14,13 @@
 
 import abc
 import collections
+import ctypes
 import os.path
 import six
+import time
 
 import eventlet
+from eventlet import hubs
 from oslo_concurrency import lockutils
 from oslo_config import cfg
 from oslo_log import log as logging
@@ -25,7 +28,7 @@ from oslo_log import log as logging
 from neutron.agent.common import config as agent_cfg
 from neutron.agent.linux import ip_lib
 from neutron.agent.linux import utils
-from neutron.i18n import _LE
+from neutron.i18n import _LE, _LW
 from neutron.openstack.common import fileutils
 
 LOG = logging.getLogger(__name__)
@@ -41,6 +44,22 @@ OPTS = [
 cfg.CONF.register_opts(OPTS)
 agent_cfg.register_process_monitor_opts(cfg.CONF)
 
+# pidfd_open system call number, the same on all architectures
+PIDFD_OPEN_SYSCALL = 434
+# The respawns of a process dying repeatedly are delayed by 1, 3, 7...
+# seconds, up to this number of seconds
+MAX_RESPAWN_DELAY = 60
+
+
+def pidfd_open(pid):
+    """Return a file descriptor which becomes readable when pid exits."""
+    libc = ctypes.CDLL('libc.so.6', use_errno=True)
+    fd = libc.syscall(PIDFD_OPEN_SYSCALL, pid, 0)
+    if fd < 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+    return fd
+
 
 @six.add_metaclass(abc.ABCMeta)
 class MonitoredProcess(object):
@@ -156,10 +175,20 @@ class ProcessMonitor(object):
         self._resource_type = resource_type
 
         self._monitored_processes = {}
+        # Greenthreads waiting for the exit of monitored processes
+        self._watchers = {}
+        # Number and time of the last respawns of each service
+        self._respawns = {}
+        self._watch_exits = False
 
         if self._config.AGENT.check_child_processes_interval:
+            self._watch_exits = self._can_watch_exits()
             self._spawn_checking_thread()
 
+    @property
+    def resource_type(self):
+        return self._resource_type
+
     def register(self, uuid, service_name, monitored_process):
         """Start monitoring a process.
 
@@ -180,6 +209,7 @@ class ProcessMonitor(object):
 
         service_id = ServiceId(uuid, service_name)
         self._monitored_processes[service_id] = monitored_process
+        self._start_watcher(service_id)
 
     def unregister(self, uuid, service_name):
         """Stop monitoring a process.
@@ -199,6 +229,10 @@ class ProcessMonitor(object):
 
         service_id = ServiceId(uuid, service_name)
         self._monitored_processes.pop(service_id, None)
+        self._respawns.pop(service_id, None)
+        watcher = self._watchers.pop(service_id, None)
+        if watcher:
+            watcher.kill()
 
     def stop(self):
         """Stop the process monitoring.
@@ -207,6 +241,56 @@ class ProcessMonitor(object):
         process will be stopped.
         """
         self._monitor_processes = False
+        for service_id in list(self._watchers):
+            self._watchers.pop(service_id).kill()
+
+    def _can_watch_exits(self):
+        if not self._config.AGENT.check_child_processes_on_exit:
+            return False
+        try:
+            os.close(pidfd_open(os.getpid()))
+        except OSError:
+            LOG.warning(_LW("pidfds are not supported, child processes "
+                            "will only be checked every "
+                            "check_child_processes_interval seconds"))
+            return False
+        return True
+
+    def _start_watcher(self, service_id):
+        if self._watch_exits and service_id not in self._watchers:
+            self._watchers[service_id] = eventlet.spawn(self._watch_process,
+                                                        service_id)
+
+    def _watch_process(self, service_id):
+        """Check a monitored process as soon as it exits.
+
+        The process is only watched while it is running. When it is not, for
+        instance because a daemon has not written its pid file yet or the
+        process exited before being watched, it is left to the periodic
+        check, which watches it again once it runs.
+        """
+        try:
+            while service_id in self._monitored_processes:
+                pm = self._monitored_processes[service_id]
+                if not pm.active:
+                    return
+                try:
+                    fd = pidfd_open(pm.pid)
+                except OSError:
+                    # The process exited in the meantime
+                    return
+                try:
+                    hubs.trampoline(fd, read=True)
+                finally:
+                    os.close(fd)
+                # Retry the respawns delayed by the backoff until it is done
+                delay = self._check_child_process(service_id)
+                while delay and service_id in self._monitored_processes:
+                    eventlet.sleep(delay)
+                    delay = self._check_child_process(service_id)
+        finally:
+            if self._watchers.get(service_id) is eventlet.getcurrent():
+                del self._watchers[service_id]
 
     def _spawn_checking_thread(self):
         self._monitor_processes = True
@@ -218,18 +302,30 @@ class ProcessMonitor(object):
         # the case where other threads add or remove items from the
         # dictionary which otherwise will cause a RuntimeError
         for service_id in list(self._monitored_processes):
-            pm = self._monitored_processes.get(service_id)
-
-            if pm and not pm.active:
-                LOG.error(_LE("%(service)s for %(resource_type)s "
-                              "with uuid %(uuid)s not found. "
-                              "The process should not have died"),
-                          {'service': pm.service,
-                           'resource_type': self._resource_type,
-                           'uuid': service_id.uuid})
-                self._execute_action(service_id)
+            # The processes watched by a greenthread are checked when they
+            # exit
+            if service_id not in self._watchers:
+                self._check_child_process(service_id)
+                self._start_watcher(service_id)
             eventlet.sleep(0)
 
+    def _check_child_process(self, service_id):
+        """Execute the configured action if a process is not running.
+
+        Return the number of seconds after which a delayed respawn of the
+        process should be retried, if any.
+        """
+        pm = self._monitored_processes.get(service_id)
+
+        if pm and not pm.active:
+            LOG.error(_LE("%(service)s for %(resource_type)s "
+                          "with uuid %(uuid)s not found. "
+                          "The process should not have died"),
+                      {'service': pm.service,
+                       'resource_type': self._resource_type,
+                       'uuid': service_id.uuid})
+            return self._execute_action(service_id)
+
     def _periodic_checking_thread(self):
         while self._monitor_processes:
             eventlet.sleep(self._config.AGENT.check_child_processes_interval)
@@ -238,12 +334,26 @@ class ProcessMonitor(object):
     def _execute_action(self, service_id):
         action = self._config.AGENT.check_child_processes_action
         action_function = getattr(self, "_%s_action" % action)
-        action_function(service_id)
+        return action_function(service_id)
 
     def _respawn_action(self, service_id):
+        now = time.time()
+        count, last_respawn = self._respawns.get(service_id, (0, 0))
+        if now - last_respawn > MAX_RESPAWN_DELAY:
+            # The process ran long enough since it was last respawned
+            count = 0
+        delay = last_respawn + min(2 ** count - 1, MAX_RESPAWN_DELAY) - now
+        if delay > 0:
+            LOG.debug("Delaying respawn of %(service)s for uuid %(uuid)s by "
+                      "%(delay).1f seconds", {'service': service_id.service,
+                                              'uuid': service_id.uuid,
+                                              'delay': delay})
+            return delay
+
         LOG.error(_LE("respawning %(service)s for uuid %(uuid)s"),
                   {'service': service_id.service,
                    'uuid': service_id.uuid})
+        self._respawns[service_id] = (count + 1, now)
         self._monitored_processes[service_id].enable()
 
     def _exit_action(self, service_id):
@@ -28,6 +28,8 @@ import threading
 import eventlet
 from eventlet.green import subprocess
 from eventlet import greenthread
+from eventlet import pools
+import httplib2
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_log import loggers
@@ -369,6 +371,30 @@ class UnixDomainHTTPConnection(httplib.HTTPConnection):
         self.sock.connect(self.socket_path)
 
 
+class HttpConnectionPool(pools.Pool):
+    """Pool of httplib2.Http objects keeping their connections alive.
+
+    An httplib2.Http object reuses its connection to a server as long as the
+    server keeps it alive, but it must not be used by concurrent greenthreads.
+    The pool hands out one object per request, so up to max_size connections
+    are kept open and shared by the greenthreads of a process.
+    """
+
+    def __init__(self, max_size, **http_kwargs):
+        self._http_kwargs = http_kwargs
+        self._certificates = []
+        super(HttpConnectionPool, self).__init__(max_size=max_size)
+
+    def add_certificate(self, key, cert, domain):
+        self._certificates.append((key, cert, domain))
+
+    def create(self):
+        h = httplib2.Http(**self._http_kwargs)
+        for key, cert, domain in self._certificates:
+            h.add_certificate(key, cert, domain)
+        return h
+
+
 class UnixDomainHttpProtocol(eventlet.wsgi.HttpProtocol):
     def __init__(self, request, client_address, server):
         if client_address == '':
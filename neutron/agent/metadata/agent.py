@@ -14,8 +14,8 @@
 
 import hashlib
 import hmac
+import os
 
-import httplib2
 from neutronclient.v2_0 import client
 from oslo_config import cfg
 from oslo_log import log as logging
@@ -82,8 +82,26 @@ class MetadataProxyHandler(object):
 
         self.plugin_rpc = MetadataPluginAPI(topics.PLUGIN)
         self.context = context.get_admin_context_without_session()
+        self._http_pool = self._create_http_pool()
         # Use RPC by default
         self.use_rpc = True
+        # Process in which port delete notifications are consumed, the
+        # handler is shared by all the forked metadata workers.
+        self._invalidation_pid = None
+        self._invalidation_conn = None
+
+    def _create_http_pool(self):
+        pool = agent_utils.HttpConnectionPool(
+            self.conf.nova_metadata_pool_size,
+            ca_certs=self.conf.auth_ca_cert,
+            disable_ssl_certificate_validation=self.conf.nova_metadata_insecure
+        )
+        if self.conf.nova_client_cert and self.conf.nova_client_priv_key:
+            pool.add_certificate(self.conf.nova_client_priv_key,
+                                 self.conf.nova_client_cert,
+                                 '%s:%s' % (self.conf.nova_metadata_ip,
+                                            self.conf.nova_metadata_port))
+        return pool
 
     def _get_neutron_client(self):
         qclient = client.Client(
@@ -101,10 +119,35 @@ class MetadataProxyHandler(object):
         )
         return qclient
 
+    def _consume_port_deletes(self):
+        """Invalidate cached lookups on port delete notifications.
+
+        The consumer is created lazily so that each metadata worker process
+        gets its own fanout queue.
+        """
+        if (not self.conf.cache_invalidate_on_port_delete or
+                not hasattr(self._cache, 'invalidate') or
+                self._invalidation_pid == os.getpid()):
+            return
+        self._invalidation_pid = os.getpid()
+        self._invalidation_conn = agent_rpc.create_consumers(
+            [self], topics.AGENT, [[topics.PORT, topics.DELETE]])
+
+    def port_delete(self, context, **kwargs):
+        port_id = kwargs.get('port_id')
+        LOG.debug("Invalidating cached lookups of deleted port %s", port_id)
+
+        def _returned_port(ports):
+            return any(isinstance(port, dict) and port.get('id') == port_id
+                       for port in ports)
+
+        self._cache.invalidate(_returned_port)
+
     @webob.dec.wsgify(RequestClass=webob.Request)
     def __call__(self, req):
         try:
             LOG.debug("Request: %s", req)
+            self._consume_port_deletes()
 
             instance_id, tenant_id = self._get_instance_and_tenant_id(req)
             if instance_id:
@@ -224,16 +267,9 @@ class MetadataProxyHandler(object):
             req.query_string,
             ''))
 
-        h = httplib2.Http(
-            ca_certs=self.conf.auth_ca_cert,
-            disable_ssl_certificate_validation=self.conf.nova_metadata_insecure
-        )
-        if self.conf.nova_client_cert and self.conf.nova_client_priv_key:
-            h.add_certificate(self.conf.nova_client_priv_key,
-                              self.conf.nova_client_cert,
-                              nova_ip_port)
-        resp, content = h.request(url, method=req.method, headers=headers,
-                                  body=req.body)
+        with self._http_pool.item() as h:
+            resp, content = h.request(url, method=req.method,
+                                      headers=headers, body=req.body)
 
         if resp.status == 200:
             LOG.debug(str(resp))
@@ -271,6 +307,7 @@ class UnixDomainMetadataProxy(object):
 
     def __init__(self, conf):
         self.conf = conf
+        self.handler = None
         agent_utils.ensure_directory_exists_without_file(
             cfg.CONF.metadata_proxy_socket)
         self._init_state_reporting()
@@ -296,6 +333,9 @@ class UnixDomainMetadataProxy(object):
             self.heartbeat.start(interval=report_interval)
 
     def _report_state(self):
+        if self.handler and hasattr(self.handler._cache, 'get_stats'):
+            self.agent_state['configurations']['cache'] = (
+                self.handler._cache.get_stats())
         try:
             self.state_rpc.report_state(
                 self.context,
@@ -332,7 +372,8 @@ class UnixDomainMetadataProxy(object):
 
     def run(self):
         server = agent_utils.UnixDomainWSGIServer('neutron-metadata-agent')
-        server.start(MetadataProxyHandler(self.conf),
+        self.handler = MetadataProxyHandler(self.conf)
+        server.start(self.handler,
                      self.conf.metadata_proxy_socket,
                      workers=self.conf.metadata_workers,
                      backlog=self.conf.metadata_backlog,
@@ -46,6 +46,12 @@ DRIVER_OPTS = [
                        "metadata_proxy_user: watch log is enabled if "
                        "metadata_proxy_user is agent effective user "
                        "id/name.")),
+    cfg.BoolOpt('metadata_proxy_multiplexed',
+                default=False,
+                help=_("Serve the metadata proxy of all the namespaces of "
+                       "an agent from a single process instead of one "
+                       "process per namespace. The process runs as root, "
+                       "metadata_proxy_user/group are ignored.")),
 ]
 
 
@@ -95,7 +101,16 @@ METADATA_PROXY_HANDLER_OPTS = [
                 help=_("Client certificate for nova metadata api server.")),
      cfg.StrOpt('nova_client_priv_key',
                 default='',
-                help=_("Private key of client certificate."))
+                help=_("Private key of client certificate.")),
+     cfg.IntOpt('nova_metadata_pool_size',
+                default=100,
+                help=_("Maximum number of connections to the Nova metadata "
+                       "server kept open by each metadata worker.")),
+     cfg.BoolOpt('cache_invalidate_on_port_delete',
+                 default=False,
+                 help=_("Drop cached port lookups when a port delete "
+                        "notification is received. Requires an 'lru' "
+                        "cache_url."))
 ]
 
 DEDUCE_MODE = 'deduce'
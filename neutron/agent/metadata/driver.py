@@ -15,12 +15,14 @@
 
 import os
 
+from oslo_concurrency import lockutils
 from oslo_log import log as logging
 
 from neutron.agent.common import config
 from neutron.agent.l3 import namespaces
 from neutron.agent.linux import external_process
 from neutron.agent.linux import utils
+from neutron.agent.metadata import namespace_proxy
 from neutron.callbacks import events
 from neutron.callbacks import registry
 from neutron.callbacks import resources
@@ -110,10 +112,64 @@ class MetadataDriver(object):
 
         return callback
 
+    @classmethod
+    def _get_multiplexed_proxy_callback(cls, uuid, namespaces_file, conf):
+
+        def callback(pid_file):
+            proxy_cmd = ['neutron-ns-metadata-proxy',
+                         '--pid_file=%s' % pid_file,
+                         '--metadata_proxy_socket=%s' %
+                         conf.metadata_proxy_socket,
+                         '--namespaces_file=%s' % namespaces_file,
+                         '--state_path=%s' % conf.state_path]
+            proxy_cmd.extend(config.get_log_args(
+                conf, 'neutron-ns-metadata-proxy-%s.log' % uuid))
+            return proxy_cmd
+
+        return callback
+
+    @classmethod
+    @lockutils.synchronized('metadata-proxy-namespaces')
+    def _update_multiplexed_proxy(cls, monitor, conf, ns_name, entry=None):
+        """Add (or remove if entry is None) a namespace to the single proxy.
+
+        The proxy of all the namespaces of an agent is a single process, which
+        is told to read its namespaces file again with SIGHUP.
+        """
+        uuid = 'metadata-proxy-%s' % monitor.resource_type
+        namespaces_file = utils.get_conf_file_name(
+            os.path.join(conf.state_path, 'metadata-proxy'), uuid,
+            'namespaces', ensure_conf_dir=True)
+        namespaces = namespace_proxy.read_namespaces_file(namespaces_file)
+        if entry:
+            namespaces[ns_name] = entry
+        else:
+            namespaces.pop(ns_name, None)
+        namespace_proxy.write_namespaces_file(namespaces_file, namespaces)
+
+        pm = external_process.ProcessManager(
+            conf=conf,
+            uuid=uuid,
+            default_cmd_callback=cls._get_multiplexed_proxy_callback(
+                uuid, namespaces_file, conf),
+            run_as_root=True)
+        if namespaces:
+            pm.enable(reload_cfg=True)
+            monitor.register(uuid, METADATA_SERVICE_NAME, pm)
+        else:
+            monitor.unregister(uuid, METADATA_SERVICE_NAME)
+            pm.disable()
+
     @classmethod
     def spawn_monitored_metadata_proxy(cls, monitor, ns_name, port, conf,
                                        network_id=None, router_id=None):
         uuid = network_id or router_id
+        if conf.metadata_proxy_multiplexed:
+            if uuid is None:
+                raise exceptions.NetworkIdOrRouterIdRequiredError()
+            cls._update_multiplexed_proxy(
+                monitor, conf, ns_name, (port, network_id, router_id))
+            return
         callback = cls._get_metadata_proxy_callback(
             port, conf, network_id=network_id, router_id=router_id)
         pm = cls._get_metadata_proxy_process_manager(uuid, ns_name, conf,
@@ -123,6 +179,9 @@ class MetadataDriver(object):
 
     @classmethod
     def destroy_monitored_metadata_proxy(cls, monitor, uuid, ns_name, conf):
+        if conf.metadata_proxy_multiplexed:
+            cls._update_multiplexed_proxy(monitor, conf, ns_name)
+            return
         monitor.unregister(uuid, METADATA_SERVICE_NAME)
         pm = cls._get_metadata_proxy_process_manager(uuid, ns_name, conf)
         pm.disable()
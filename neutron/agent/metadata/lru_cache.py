@@ -0,0 +1,89 @@
+# Copyright 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import multiprocessing
+
+from oslo_concurrency import lockutils
+
+from neutron.openstack.common.cache._backends import memory
+
+DEFAULT_MAX_SIZE = 10000
+
+_MISSING = object()
+
+# The statistics, counted in memory shared with the forked processes
+STATS = ('hits', 'misses', 'evictions')
+
+
+class LRUMemoryBackend(memory.MemoryBackend):
+    """In-process cache with both a TTL and a bounded number of entries.
+
+    It is selected with a cache_url like 'lru://?default_ttl=5&max_size=1000'.
+    When max_size entries are stored, the least recently used one is evicted
+    so that the cache cannot grow without bounds when keys are not reused,
+    like the memory backend does. Hits, misses and evictions are counted.
+
+    The entries are private to each process, but the statistics are shared
+    with the processes forked after the cache is created, like the metadata
+    workers, so that the parent process reports those of all of them.
+    """
+
+    def __init__(self, parsed_url, options=None):
+        super(LRUMemoryBackend, self).__init__(parsed_url, options)
+        self._max_size = int(self._options.get('max_size', DEFAULT_MAX_SIZE))
+        self._stats = multiprocessing.Array('L', len(STATS))
+
+    def _count(self, stat):
+        with self._stats.get_lock():
+            self._stats[STATS.index(stat)] += 1
+
+    def _clear(self):
+        super(LRUMemoryBackend, self)._clear()
+        self._cache = collections.OrderedDict()
+
+    def _set_unlocked(self, key, value, ttl=0):
+        # Re-inserting the key makes it the most recently used one
+        self._discard(key)
+        super(LRUMemoryBackend, self)._set_unlocked(key, value, ttl)
+        while self._max_size and len(self._cache) > self._max_size:
+            self._discard(next(iter(self._cache)))
+            self._count('evictions')
+
+    def _discard(self, key):
+        entry = self._cache.pop(key, None)
+        if entry and entry[0]:
+            self._keys_expires[entry[0]].discard(key)
+
+    def _get(self, key, default=None):
+        with lockutils.lock(key):
+            value = self._get_unlocked(key, _MISSING)[1]
+            if value is _MISSING:
+                self._count('misses')
+                return default
+            self._count('hits')
+            self._cache[key] = self._cache.pop(key)
+            return value
+
+    def invalidate(self, predicate):
+        """Remove the entries whose value matches predicate."""
+        for key, (timeout, value) in list(self._cache.items()):
+            if predicate(value):
+                with lockutils.lock(key):
+                    self._discard(key)
+
+    def get_stats(self):
+        """Return the statistics of all the processes using the cache."""
+        with self._stats.get_lock():
+            return dict(zip(STATS, self._stats))
@@ -12,13 +12,19 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-import httplib2
+import signal
+import socket
+
+import eventlet
+import eventlet.wsgi
 from oslo_config import cfg
 from oslo_log import log as logging
+from oslo_log import loggers
 import six.moves.urllib.parse as urlparse
 import webob
 
 from neutron.agent.linux import daemon
+from neutron.agent.linux import ip_lib
 from neutron.agent.linux import utils as agent_utils
 from neutron.common import config
 from neutron.common import exceptions
@@ -28,6 +34,12 @@ from neutron import wsgi
 
 LOG = logging.getLogger(__name__)
 
+# Maximum number of connections to the metadata agent kept open
+UNIX_DOMAIN_POOL_SIZE = 100
+
+# Seconds between two checks for a reload of the namespaces file
+RELOAD_POLL_INTERVAL = 1
+
 
 class NetworkMetadataProxyHandler(object):
     """Proxy AF_INET metadata request through Unix Domain socket.
@@ -36,9 +48,11 @@ class NetworkMetadataProxyHandler(object):
     accessible within the isolated tenant context.
     """
 
-    def __init__(self, network_id=None, router_id=None):
+    def __init__(self, network_id=None, router_id=None, http_pool=None):
         self.network_id = network_id
         self.router_id = router_id
+        self._http_pool = http_pool or agent_utils.HttpConnectionPool(
+            UNIX_DOMAIN_POOL_SIZE)
 
         if network_id is None and router_id is None:
             raise exceptions.NetworkIdOrRouterIdRequiredError()
@@ -76,13 +90,13 @@ class NetworkMetadataProxyHandler(object):
             query_string,
             ''))
 
-        h = httplib2.Http()
-        resp, content = h.request(
-            url,
-            method=method,
-            headers=headers,
-            body=body,
-            connection_type=agent_utils.UnixDomainHTTPConnection)
+        with self._http_pool.item() as h:
+            resp, content = h.request(
+                url,
+                method=method,
+                headers=headers,
+                body=body,
+                connection_type=agent_utils.UnixDomainHTTPConnection)
 
         if resp.status == 200:
             LOG.debug(resp)
@@ -131,6 +145,107 @@ class ProxyDaemon(daemon.Daemon):
         proxy.wait()
 
 
+def read_namespaces_file(path):
+    """Return the namespaces served by a multiplexed proxy.
+
+    Each line of the file is 'namespace,port,network_id,router_id', where
+    only one of network_id and router_id is set. The result maps namespace
+    names to (port, network_id, router_id) tuples.
+    """
+    namespaces = {}
+    try:
+        with open(path) as f:
+            for line in f:
+                fields = line.strip().split(',')
+                if len(fields) != 4:
+                    continue
+                namespace, port, network_id, router_id = fields
+                namespaces[namespace] = (int(port), network_id or None,
+                                         router_id or None)
+    except IOError:
+        LOG.debug('Unable to access %s', path)
+    return namespaces
+
+
+def write_namespaces_file(path, namespaces):
+    lines = ['%s,%s,%s,%s\n' % (namespace, port, network_id or '',
+                                router_id or '')
+             for namespace, (port, network_id, router_id)
+             in sorted(namespaces.items())]
+    agent_utils.replace_file(path, ''.join(lines))
+
+
+def listen_in_namespace(namespace, port):
+    """Return a socket listening on port inside a network namespace.
+
+    The process only enters the namespace while the socket is created, the
+    socket keeps belonging to the namespace afterwards.
+    """
+    with ip_lib.enter_namespace(namespace):
+        return eventlet.listen(('0.0.0.0', port))
+
+
+class MultiplexedProxyDaemon(daemon.Daemon):
+    """Serve the metadata proxy of many namespaces from a single process.
+
+    The namespaces are listed in namespaces_file, which is read again when
+    the process receives SIGHUP. Requests are tagged with the network or
+    router of the namespace they were received in.
+    """
+
+    def __init__(self, pidfile, namespaces_file, watch_log=True):
+        super(MultiplexedProxyDaemon, self).__init__(
+            pidfile, uuid=namespaces_file, watch_log=watch_log)
+        self.namespaces_file = namespaces_file
+        self._http_pool = agent_utils.HttpConnectionPool(
+            UNIX_DOMAIN_POOL_SIZE)
+        self._servers = {}
+        self._reload = False
+
+    def _handle_sighup(self, signum, frame):
+        self._reload = True
+
+    def _start_server(self, namespace, entry):
+        port, network_id, router_id = entry
+        handler = NetworkMetadataProxyHandler(network_id, router_id,
+                                              http_pool=self._http_pool)
+        sock = listen_in_namespace(namespace, port)
+        logger = logging.getLogger('eventlet.wsgi.server')
+        thread = eventlet.spawn(eventlet.wsgi.server, sock, handler,
+                                log=loggers.WritableLogger(logger))
+        self._servers[namespace] = (entry, thread, sock)
+
+    def _stop_server(self, namespace):
+        entry, thread, sock = self._servers.pop(namespace)
+        thread.kill()
+        sock.close()
+
+    def update_servers(self):
+        namespaces = read_namespaces_file(self.namespaces_file)
+        for namespace in list(self._servers):
+            if self._servers[namespace][0] != namespaces.get(namespace):
+                self._stop_server(namespace)
+        for namespace, entry in namespaces.items():
+            if namespace in self._servers:
+                continue
+            try:
+                self._start_server(namespace, entry)
+            except (IOError, OSError, socket.error):
+                LOG.exception(_LE("Unable to serve metadata requests in "
+                                  "namespace %s"), namespace)
+
+    def run(self):
+        # NOTE: privileges are kept, they are needed to enter the namespaces
+        # added after the start of the process.
+        signal.signal(signal.SIGHUP, self._handle_sighup)
+        self.update_servers()
+        while True:
+            eventlet.sleep(RELOAD_POLL_INTERVAL)
+            if self._reload:
+                self._reload = False
+                self.update_servers()
+
+
 def main():
     opts = [
         cfg.StrOpt('network_id',
@@ -141,6 +256,10 @@ def main():
                           'metadata proxied.')),
         cfg.StrOpt('pid_file',
                    help=_('Location of pid file of this process.')),
+        cfg.StrOpt('namespaces_file',
+                   help=_('File listing the namespaces served by a single '
+                          'multiplexed proxy, instead of the network_id or '
+                          'router_id one.')),
         cfg.BoolOpt('daemonize',
                     default=True,
                     help=_('Run as daemon.')),
@@ -173,13 +292,19 @@ def main():
     config.setup_logging()
     utils.log_opt_values(LOG)
 
-    proxy = ProxyDaemon(cfg.CONF.pid_file,
-                        cfg.CONF.metadata_port,
-                        network_id=cfg.CONF.network_id,
-                        router_id=cfg.CONF.router_id,
-                        user=cfg.CONF.metadata_proxy_user,
-                        group=cfg.CONF.metadata_proxy_group,
-                        watch_log=cfg.CONF.metadata_proxy_watch_log)
+    if cfg.CONF.namespaces_file:
+        proxy = MultiplexedProxyDaemon(
+            cfg.CONF.pid_file,
+            cfg.CONF.namespaces_file,
+            watch_log=cfg.CONF.metadata_proxy_watch_log)
+    else:
+        proxy = ProxyDaemon(cfg.CONF.pid_file,
+                            cfg.CONF.metadata_port,
+                            network_id=cfg.CONF.network_id,
+                            router_id=cfg.CONF.router_id,
+                            user=cfg.CONF.metadata_proxy_user,
+                            group=cfg.CONF.metadata_proxy_group,
+                            watch_log=cfg.CONF.metadata_proxy_watch_log)
 
     if cfg.CONF.daemonize:
         proxy.start()
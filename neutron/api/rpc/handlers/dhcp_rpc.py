@@ -13,6 +13,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import hashlib
 import itertools
 import operator
 
@@ -20,6 +21,7 @@ from oslo_config import cfg
 from oslo_db import exception as db_exc
 from oslo_log import log as logging
 import oslo_messaging
+from oslo_serialization import jsonutils
 from oslo_utils import excutils
 
 from neutron.api.v2 import attributes
@@ -47,23 +49,42 @@ class DhcpRpcCallback(object):
     #     1.0 - Initial version.
     #     1.1 - Added get_active_networks_info, create_dhcp_port,
     #           and update_dhcp_port methods.
+    #     1.2 - Added limit and marker to get_active_networks_info, and
+    #           revision to the networks it and get_network_info return.
     target = oslo_messaging.Target(
         namespace=constants.RPC_NAMESPACE_DHCP_PLUGIN,
-        version='1.1')
+        version='1.2')
 
-    def _get_active_networks(self, context, **kwargs):
-        """Retrieve and return a list of the active networks."""
+    def _get_active_networks(self, context, limit=None, marker=None,
+                             **kwargs):
+        """Retrieve and return a list of the active networks.
+
+        When limit is given, at most limit networks are returned, ordered by
+        id and starting after the network id given as marker.
+        """
         host = kwargs.get('host')
         plugin = manager.NeutronManager.get_plugin()
         if utils.is_extension_supported(
             plugin, constants.DHCP_AGENT_SCHEDULER_EXT_ALIAS):
-            if cfg.CONF.network_auto_schedule:
+            # Networks are only scheduled once per sync, with its first page
+            if cfg.CONF.network_auto_schedule and not marker:
                 plugin.auto_schedule_networks(context, host)
-            nets = plugin.list_active_networks_on_active_dhcp_agent(
-                context, host)
+            if limit:
+                nets = plugin.list_active_networks_on_active_dhcp_agent(
+                    context, host, limit=limit, marker=marker)
+            else:
+                nets = plugin.list_active_networks_on_active_dhcp_agent(
+                    context, host)
         else:
             filters = dict(admin_state_up=[True])
             nets = plugin.get_networks(context, filters=filters)
+            if limit:
+                # Plugins without DHCP agent scheduling do not have many
+                # DHCP agents to page for
+                nets = sorted(nets, key=operator.itemgetter('id'))
+                if marker:
+                    nets = [n for n in nets if n['id'] > marker]
+                nets = nets[:limit]
         return nets
 
     def _port_action(self, plugin, context, port, action):
@@ -113,8 +134,22 @@ class DhcpRpcCallback(object):
             grouped[net_id] = list(values)
         return grouped
 
+    @staticmethod
+    def _set_revision(network):
+        """Stamp a network with a digest of its subnets and ports.
+
+        Agents compare it with the revision of the network they configured
+        last to know whether the network changed.
+        """
+        network['revision'] = hashlib.sha1(
+            jsonutils.dumps(network, sort_keys=True)).hexdigest()
+
     def get_active_networks_info(self, context, **kwargs):
-        """Returns all the networks/subnets/ports in system."""
+        """Returns all the networks/subnets/ports in system.
+
+        When limit is given, at most limit networks are returned, ordered by
+        id and starting after the network id given as marker.
+        """
         host = kwargs.get('host')
         LOG.debug('get_active_networks_info from %s', host)
         networks = self._get_active_networks(context, **kwargs)
@@ -129,6 +164,7 @@ class DhcpRpcCallback(object):
         for network in networks:
             network['subnets'] = grouped_subnets.get(network['id'], [])
             network['ports'] = grouped_ports.get(network['id'], [])
+            self._set_revision(network)
 
         return networks
 
@@ -149,6 +185,7 @@ class DhcpRpcCallback(object):
         filters = dict(network_id=[network_id])
         network['subnets'] = plugin.get_subnets(context, filters=filters)
         network['ports'] = plugin.get_ports(context, filters=filters)
+        self._set_revision(network)
         return network
 
     def get_dhcp_port(self, context, **kwargs):
@@ -13,9 +13,13 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+# eventlet is not the neutron.cmd.eventlet package
+from __future__ import absolute_import
+
 import re
 import time
 
+import eventlet
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_utils import importutils
@@ -32,7 +36,7 @@ from neutron.agent.linux import interface
 from neutron.agent.linux import ip_lib
 from neutron.api.v2 import attributes
 from neutron.common import config
-from neutron.i18n import _LE
+from neutron.i18n import _LE, _LI
 
 
 LOG = logging.getLogger(__name__)
@@ -62,6 +66,14 @@ def setup_conf():
         cfg.BoolOpt('force',
                     default=False,
                     help=_('Delete the namespace by removing all devices.')),
+        cfg.IntOpt('concurrency',
+                   default=1,
+                   help=_('Number of namespaces checked and deleted at the '
+                          'same time.')),
+        cfg.BoolOpt('dry-run',
+                    default=False,
+                    help=_('Only report the namespaces which would be '
+                           'deleted, with their devices.')),
     ]
 
     conf = cfg.CONF
@@ -147,17 +159,54 @@ def destroy_namespace(conf, namespace, force=False):
         LOG.exception(_LE('Error unable to destroy namespace: %s'), namespace)
 
 
+def get_namespace_devices(namespace):
+    """Return the names of the devices of a namespace, but lo."""
+    ip = ip_lib.IPWrapper(namespace=namespace)
+    return [device.name for device in ip.get_devices(exclude_loopback=True)]
+
+
+def report_namespaces(pool, candidates):
+    """Log the namespaces which would be deleted with their devices."""
+    for namespace, devices in zip(candidates,
+                                  pool.imap(get_namespace_devices,
+                                            candidates)):
+        LOG.info(_LI('Namespace %(namespace)s would be deleted, devices: '
+                     '%(devices)s'),
+                 {'namespace': namespace, 'devices': ', '.join(devices)})
+
+
 def cleanup_network_namespaces(conf):
+    start = time.time()
+    # Each namespace is handled by its own ip commands, which run in
+    # parallel in up to concurrency greenthreads.
+    pool = eventlet.GreenPool(max(conf.concurrency, 1))
+
     # Identify namespaces that are candidates for deletion.
-    candidates = [ns for ns in
-                  ip_lib.IPWrapper.get_namespaces()
-                  if eligible_for_deletion(conf, ns, conf.force)]
+    namespaces = ip_lib.IPWrapper.get_namespaces()
+    eligibles = pool.imap(
+        lambda ns: eligible_for_deletion(conf, ns, conf.force), namespaces)
+    candidates = [ns for ns, eligible in zip(namespaces, eligibles)
+                  if eligible]
+
+    if conf.dry_run:
+        report_namespaces(pool, candidates)
+        LOG.info(_LI('Found %(candidates)d namespaces to delete out of '
+                     '%(total)d in %(time).2f seconds'),
+                 {'candidates': len(candidates), 'total': len(namespaces),
+                  'time': time.time() - start})
+        return
 
     if candidates:
         time.sleep(2)
 
         for namespace in candidates:
-            destroy_namespace(conf, namespace, conf.force)
+            pool.spawn_n(destroy_namespace, conf, namespace, conf.force)
+        pool.waitall()
+
+    LOG.info(_LI('Cleaned up %(candidates)d namespaces out of %(total)d in '
+                 '%(time).2f seconds'),
+             {'candidates': len(candidates), 'total': len(namespaces),
+              'time': time.time() - start})
 
 
 def main():
@@ -176,6 +225,10 @@ def main():
     The --force flag should only be used as part of the cleanup of a devstack
     installation as it will blindly purge namespaces and their devices. This
     option also kills any lingering DHCP instances.
+
+    The --concurrency option sets how many namespaces are handled at the
+    same time, and --dry-run only reports the namespaces which would be
+    deleted.
     """
     conf = setup_conf()
     conf()
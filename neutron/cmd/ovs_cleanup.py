@@ -13,6 +13,10 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+# eventlet is not the neutron.cmd.eventlet package
+from __future__ import absolute_import
+
+import eventlet
 from oslo_config import cfg
 from oslo_log import log as logging
 
@@ -40,7 +44,10 @@ def setup_conf():
                     help=_('True to delete all ports on all the OpenvSwitch '
                            'bridges. False to delete ports created by '
                            'Neutron on integration and external network '
-                           'bridges.'))
+                           'bridges.')),
+        cfg.IntOpt('concurrency',
+                   default=1,
+                   help=_('Number of devices deleted at the same time.')),
     ]
 
     conf = cfg.CONF
@@ -61,16 +68,23 @@ def collect_neutron_ports(bridges):
     return ports
 
 
-def delete_neutron_ports(ports):
+def delete_neutron_port(port):
+    if ip_lib.device_exists(port):
+        device = ip_lib.IPDevice(port)
+        device.link.delete()
+        LOG.info(_LI("Deleting port: %s"), port)
+
+
+def delete_neutron_ports(ports, concurrency=1):
     """Delete non-internal ports created by Neutron
 
-    Non-internal OVS ports need to be removed manually.
+    Non-internal OVS ports need to be removed manually. Up to concurrency
+    ports are deleted at the same time.
     """
+    pool = eventlet.GreenPool(max(concurrency, 1))
     for port in ports:
-        if ip_lib.device_exists(port):
-            device = ip_lib.IPDevice(port)
-            device.link.delete()
-            LOG.info(_LI("Deleting port: %s"), port)
+        pool.spawn_n(delete_neutron_port, port)
+    pool.waitall()
 
 
 def main():
@@ -105,6 +119,6 @@ def main():
         ovs.delete_ports(all_ports=conf.ovs_all_ports)
 
     # Remove remaining ports created by Neutron (usually veth pair)
-    delete_neutron_ports(ports)
+    delete_neutron_ports(ports, conf.concurrency)
 
     LOG.info(_LI("OVS cleanup completed successfully"))
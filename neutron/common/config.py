@@ -55,11 +55,22 @@ core_opts = [
                help=_("The base MAC address Neutron will use for VIFs")),
     cfg.IntOpt('mac_generation_retries', default=16,
                help=_("How many times Neutron will retry MAC generation")),
+    cfg.StrOpt('mac_allocation', default='random',
+               choices=['random', 'blocks'],
+               help=_("How MAC addresses are generated for ports. 'random' "
+                      "generates random addresses of the base MAC address, "
+                      "and retries on conflicts. 'blocks' hands out the "
+                      "addresses of blocks of consecutive addresses, which "
+                      "each server process reserves in the database, so "
+                      "that processes do not generate the same addresses.")),
+    cfg.IntOpt('mac_block_size', default=256,
+               help=_("How many MAC addresses a server process reserves at "
+                      "once when mac_allocation is 'blocks'")),
     cfg.BoolOpt('allow_bulk', default=True,
                 help=_("Allow the usage of the bulk API")),
-    cfg.BoolOpt('allow_pagination', default=False,
+    cfg.BoolOpt('allow_pagination', default=True,
                 help=_("Allow the usage of the pagination")),
-    cfg.BoolOpt('allow_sorting', default=False,
+    cfg.BoolOpt('allow_sorting', default=True,
                 help=_("Allow the usage of the sorting")),
     cfg.StrOpt('pagination_max_limit', default="-1",
                help=_("The maximum number of items returned in a single "
@@ -71,6 +82,19 @@ core_opts = [
                help=_("Maximum number of host routes per subnet")),
     cfg.IntOpt('max_fixed_ips_per_port', default=5,
                help=_("Maximum number of fixed ips per port")),
+    cfg.StrOpt('ip_allocation', default='ranges',
+               choices=['ranges', 'random', 'bitmap'],
+               help=_("How IP addresses are allocated to ports. 'ranges' "
+                      "allocates the lowest address of the first "
+                      "availability range of the subnet, and locks that "
+                      "range. 'random' tries random addresses of the "
+                      "allocation pools without locking, and retries on "
+                      "conflicts. It drops the availability ranges of the "
+                      "subnets, which are rebuilt when switching back to "
+                      "'ranges'. 'bitmap' allocates the next free address "
+                      "of a bitmap of the used addresses kept by each "
+                      "server process, and also retries on conflicts "
+                      "without locking.")),
     cfg.StrOpt('default_ipv4_subnet_pool', default=None,
                help=_("Default IPv4 subnet-pool to be used for automatic "
                       "subnet CIDR allocation")),
@@ -166,6 +166,11 @@ class InvalidIpForSubnet(BadRequest):
                 "for the specified subnet.")
 
 
+class InvalidAddressRequest(BadRequest):
+    message = _("The address allocation request could not be satisfied "
+                "because: %(reason)s")
+
+
 class IpAddressInUse(InUse):
     message = _("Unable to complete operation for network %(net_id)s. "
                 "The IP address %(ip_address)s is in use.")
@@ -29,6 +29,7 @@ from neutron.common import utils
 from neutron import context as ncontext
 from neutron.db import agents_db
 from neutron.db import model_base
+from neutron.db import models_v2
 from neutron.extensions import agent as ext_agent
 from neutron.extensions import dhcpagentscheduler
 from neutron.i18n import _LE, _LI, _LW
@@ -397,7 +398,13 @@ class DhcpAgentSchedulerDbMixin(dhcpagentscheduler
             self._get_agent(context, id)
             return {'networks': []}
 
-    def list_active_networks_on_active_dhcp_agent(self, context, host):
+    def list_active_networks_on_active_dhcp_agent(self, context, host,
+                                                  limit=None, marker=None):
+        """List the active networks of the DHCP agent of a host.
+
+        When limit is given, at most limit networks are returned, ordered by
+        id and starting after the network id given as marker.
+        """
         try:
             agent = self._get_agent_by_type_and_host(
                 context, constants.AGENT_TYPE_DHCP, host)
@@ -409,13 +416,28 @@ class DhcpAgentSchedulerDbMixin(dhcpagentscheduler
             return []
         query = context.session.query(NetworkDhcpAgentBinding.network_id)
         query = query.filter(NetworkDhcpAgentBinding.dhcp_agent_id == agent.id)
+        if limit:
+            # The admin state is filtered here so that only the last page
+            # has less than limit networks
+            query = query.join(
+                models_v2.Network,
+                models_v2.Network.id == NetworkDhcpAgentBinding.network_id)
+            query = query.filter(models_v2.Network.admin_state_up == sa.true())
+            if marker:
+                query = query.filter(
+                    NetworkDhcpAgentBinding.network_id > marker)
+            query = query.order_by(NetworkDhcpAgentBinding.network_id)
+            query = query.limit(limit)
 
         net_ids = [item[0] for item in query]
         if net_ids:
-            return self.get_networks(
+            networks = self.get_networks(
                 context,
                 filters={'id': net_ids, 'admin_state_up': [True]}
             )
+            if limit:
+                networks.sort(key=lambda network: network['id'])
+            return networks
         else:
             return []
 
@@ -13,16 +13,37 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
 import contextlib
+import copy
+import functools
+import random
+import sys
+import time
 
 from oslo_config import cfg
+from oslo_db import exception as db_exc
 from oslo_db.sqlalchemy import session
+from oslo_log import log as logging
+import six
 from sqlalchemy import exc
 
+from neutron.api.v2 import attributes
+from neutron.i18n import _LE
+
+LOG = logging.getLogger(__name__)
 
 _FACADE = None
 
 MAX_RETRIES = 10
+# The first retry waits up to RETRY_INTERVAL seconds, and the maximum wait
+# doubles on each retry up to MAX_RETRY_INTERVAL seconds
+RETRY_INTERVAL = 0.1
+MAX_RETRY_INTERVAL = 2
+
+# The numbers of calls, retries and failures after the last retry of the
+# functions decorated with retry_db_errors, by function name
+retry_stats = collections.defaultdict(collections.Counter)
 
 
 def _create_facade_lazily():
@@ -57,3 +78,62 @@ def autonested_transaction(sess):
     finally:
         with session_context as tx:
             yield tx
+
+
+def _copy_arg(arg):
+    if isinstance(arg, (dict, list)):
+        # The marker of the attributes not specified is compared by identity
+        return copy.deepcopy(arg, {id(attributes.ATTR_NOT_SPECIFIED):
+                                   attributes.ATTR_NOT_SPECIFIED})
+    return arg
+
+
+def retry_db_errors(f):
+    """Retry a unit of work which failed on a deadlock or a retry request.
+
+    Decorates the plugin methods taking a context as first argument. They
+    are only retried when called outside of a transaction: the error rolled
+    back the enclosing transaction, which is retried by the unit of work
+    which began it instead. The retries start from copies of the arguments
+    of the call, and wait for a random time bounded by an exponential
+    backoff, so that the transactions which deadlocked do not collide again.
+    """
+    name = '%s.%s' % (f.__module__, f.__name__)
+
+    @functools.wraps(f)
+    def wrapper(*args, **kwargs):
+        context = kwargs['context'] if 'context' in kwargs else args[1]
+        if context.session.is_active:
+            return f(*args, **kwargs)
+        stats = retry_stats[name]
+        stats['calls'] += 1
+        orig_args = [_copy_arg(arg) for arg in args]
+        orig_kwargs = dict((key, _copy_arg(arg))
+                           for key, arg in six.iteritems(kwargs))
+        interval = RETRY_INTERVAL
+        for attempt in range(MAX_RETRIES + 1):
+            if attempt:
+                args = [_copy_arg(arg) for arg in orig_args]
+                kwargs = dict((key, _copy_arg(arg))
+                              for key, arg in six.iteritems(orig_kwargs))
+            try:
+                return f(*args, **kwargs)
+            except (db_exc.DBDeadlock, db_exc.RetryRequest) as e:
+                if attempt == MAX_RETRIES:
+                    stats['failures'] += 1
+                    LOG.error(_LE("%(name)s failed after %(retries)s "
+                                  "retries"),
+                              {'name': name, 'retries': MAX_RETRIES})
+                    if isinstance(e, db_exc.RetryRequest):
+                        six.reraise(type(e.inner_exc), e.inner_exc,
+                                    sys.exc_info()[2])
+                    raise
+                stats['retries'] += 1
+                LOG.debug("Retrying %(name)s after %(error)r",
+                          {'name': name, 'error': e})
+                # NOTE: time is patched by eventlet, so that sleeping yields
+                # to the other green threads
+                time.sleep(random.uniform(0, interval))
+                interval = min(interval * 2, MAX_RETRY_INTERVAL)
+
+    return wrapper
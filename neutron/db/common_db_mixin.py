@@ -15,6 +15,7 @@
 
 import weakref
 
+from sqlalchemy.orm import properties
 from sqlalchemy import sql
 
 from neutron.common import exceptions as n_exc
@@ -35,9 +36,14 @@ class CommonDbMixin(object):
     # TODO(salvatore-orlando): Avoid using class-level variables
     _dict_extend_functions = {}
 
+    # The fields of the dicts of the resources of each model which are
+    # copies of the columns of the same name. Collections requesting only
+    # such fields select their columns rather than loading the objects.
+    _column_fields = {}
+
     @classmethod
     def register_model_query_hook(cls, model, name, query_hook, filter_hook,
-                                  result_filters=None):
+                                  result_filters=None, eager_loads=None):
         """Register a hook to be invoked when a query is executed.
 
         Add the hooks to the _model_query_hooks dict. Models are the keys
@@ -51,10 +57,15 @@ class CommonDbMixin(object):
 
         Filter hooks take as input the filter expression being built and return
         a transformed filter expression
+
+        Eager loads are the loader options, such as orm.subqueryload, of the
+        relationships which the dict extend functions of the mixin read. They
+        are applied to the queries retrieving collections, so that the
+        relationships of all the objects are loaded by one query each.
         """
         cls._model_query_hooks.setdefault(model, {})[name] = {
             'query': query_hook, 'filter': filter_hook,
-            'result_filters': result_filters}
+            'result_filters': result_filters, 'eager_loads': eager_loads}
 
     @classmethod
     def register_dict_extend_funcs(cls, resource, funcs):
@@ -148,6 +159,14 @@ class CommonDbMixin(object):
                     query = result_filter(query, filters)
         return query
 
+    def _apply_eager_loads(self, query, model):
+        for _name, hooks in self._model_query_hooks.get(model,
+                                                        {}).iteritems():
+            eager_loads = hooks.get('eager_loads')
+            if eager_loads:
+                query = query.options(*eager_loads)
+        return query
+
     def _apply_dict_extend_functions(self, resource_type,
                                      response, db_object):
         for func in self._dict_extend_functions.get(
@@ -161,13 +180,37 @@ class CommonDbMixin(object):
             if func:
                 func(*args)
 
+    def _get_column_projection(self, model, fields):
+        """Return the columns to select for the fields, or None.
+
+        The columns are only returned when all the fields are copies of
+        columns: the relationships of the objects and the dict extend
+        functions can not change them.
+        """
+        column_fields = self._column_fields.get(model)
+        if not fields or not column_fields:
+            return None
+        if not column_fields.issuperset(fields):
+            return None
+        fields = sorted(set(fields))
+        return [getattr(model, field) for field in fields]
+
+    def _make_dict_from_columns(self, columns, row):
+        return dict((column.key, value) for column, value in zip(columns, row))
+
     def _get_collection_query(self, context, model, filters=None,
                               sorts=None, limit=None, marker_obj=None,
-                              page_reverse=False):
+                              page_reverse=False, columns=None):
         collection = self._model_query(context, model)
         collection = self._apply_filters_to_query(collection, model, filters)
+        if columns:
+            collection = collection.with_entities(*columns)
+        else:
+            collection = self._apply_eager_loads(collection, model)
         if limit and page_reverse and sorts:
             sorts = [(s[0], not s[1]) for s in sorts]
+        marker_obj = self._get_marker_values(context, model, marker_obj,
+                                             sorts)
         collection = sqlalchemyutils.paginate_query(collection, model, limit,
                                                     sorts,
                                                     marker_obj=marker_obj)
@@ -176,12 +219,18 @@ class CommonDbMixin(object):
     def _get_collection(self, context, model, dict_func, filters=None,
                         fields=None, sorts=None, limit=None, marker_obj=None,
                         page_reverse=False):
+        columns = self._get_column_projection(model, fields)
         query = self._get_collection_query(context, model, filters=filters,
                                            sorts=sorts,
                                            limit=limit,
                                            marker_obj=marker_obj,
-                                           page_reverse=page_reverse)
-        items = [dict_func(c, fields) for c in query]
+                                           page_reverse=page_reverse,
+                                           columns=columns)
+        if columns:
+            items = [self._make_dict_from_columns(columns, row)
+                     for row in query]
+        else:
+            items = [dict_func(c, fields) for c in query]
         if limit and page_reverse:
             items.reverse()
         return items
@@ -191,9 +240,31 @@ class CommonDbMixin(object):
 
     def _get_marker_obj(self, context, resource, limit, marker):
         if limit and marker:
-            return getattr(self, '_get_%s' % resource)(context, marker)
+            return sqlalchemyutils.Marker(resource, marker)
         return None
 
+    def _get_marker_values(self, context, model, marker_obj, sorts):
+        """Return the values of the sort keys of a marker.
+
+        Only the sort key columns of the marker are selected, with the same
+        visibility as the objects of the page. The marker object is loaded
+        when the marker is not found, to raise the not found error of the
+        resource, or when a sort key is not a column.
+        """
+        if not isinstance(marker_obj, sqlalchemyutils.Marker):
+            return marker_obj
+        keys = [sort[0] for sort in sorts or []]
+        attrs = [getattr(model, key, None) for key in keys]
+        if (keys and hasattr(model, 'id') and
+                all(isinstance(getattr(attr, 'property', None),
+                               properties.ColumnProperty) for attr in attrs)):
+            values = self._model_query(context, model).with_entities(
+                *attrs).filter(model.id == marker_obj.id).first()
+            if values is not None:
+                return dict(zip(keys, values))
+        return getattr(self, '_get_%s' % marker_obj.resource)(context,
+                                                              marker_obj.id)
+
     def _filter_non_model_columns(self, data, model):
         """Remove all the attributes from data which are not columns of
         the model passed as second parameter.
@@ -13,9 +13,11 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+import random
+
 import netaddr
 from oslo_config import cfg
-from oslo_db import api as oslo_db_api
 from oslo_db import exception as db_exc
 from oslo_log import log as logging
 from oslo_utils import excutils
@@ -32,12 +34,15 @@ from neutron.common import utils
 from neutron import context as ctx
 from neutron.db import api as db_api
 from neutron.db import common_db_mixin
+from neutron.db import mac_blocks_db
 from neutron.db import models_v2
 from neutron.db import sqlalchemyutils
 from neutron.extensions import l3
 from neutron.i18n import _LE, _LI
 from neutron import ipam
+from neutron.ipam import bitmap
 from neutron.ipam import subnet_alloc
+from neutron.ipam import utils as ipam_utils
 from neutron import manager
 from neutron import neutron_plugin_base_v2
 from neutron.openstack.common import uuidutils
@@ -55,6 +60,14 @@ LOG = logging.getLogger(__name__)
 # IP allocations being cleaned up by cascade.
 AUTO_DELETE_PORT_OWNERS = [constants.DEVICE_OWNER_DHCP]
 
+# The number of random addresses tried in the allocation pools of a subnet
+# before trying the addresses known to be free, and then among those
+RANDOM_IP_ATTEMPTS = 10
+
+# The key of the MAC address generated for a port of a bulk request, which
+# is tried first when the port is created, unlike a requested MAC address
+GENERATED_MAC = '_generated_mac'
+
 
 class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                         common_db_mixin.CommonDbMixin):
@@ -73,6 +86,17 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
     __native_pagination_support = True
     __native_sorting_support = True
 
+    _column_fields = {
+        models_v2.Network: frozenset(['id', 'name', 'tenant_id',
+                                      'admin_state_up', 'status', 'shared']),
+        models_v2.Subnet: frozenset(['id', 'name', 'tenant_id', 'network_id',
+                                     'ip_version', 'cidr', 'gateway_ip',
+                                     'enable_dhcp', 'ipv6_ra_mode',
+                                     'ipv6_address_mode', 'shared']),
+        models_v2.Port: frozenset(['id', 'name', 'network_id', 'tenant_id',
+                                   'mac_address', 'admin_state_up', 'status',
+                                   'device_id', 'device_owner'])}
+
     def __init__(self):
         if cfg.CONF.notify_nova_on_port_status_changes:
             from neutron.notifiers import nova
@@ -145,6 +169,8 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
 
     @staticmethod
     def _generate_mac():
+        if cfg.CONF.mac_allocation == 'blocks':
+            return mac_blocks_db.generate_mac()
         return utils.get_random_mac(cfg.CONF.base_mac.split(':'))
 
     @staticmethod
@@ -156,6 +182,10 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                   {'ip_address': ip_address,
                    'network_id': network_id,
                    'subnet_id': subnet_id})
+        if cfg.CONF.ip_allocation == 'bitmap':
+            ipam_pool = bitmap.BitmapPool(context.session)
+            ipam_pool.get_subnet(subnet_id).deallocate(ip_address)
+            return
         context.session.query(models_v2.IPAllocation).filter_by(
             network_id=network_id,
             ip_address=ip_address,
@@ -170,6 +200,13 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                    'network_id': network_id,
                    'subnet_id': subnet_id,
                    'port_id': port_id})
+        if cfg.CONF.ip_allocation != 'ranges':
+            # Generated addresses are reserved until they are stored
+            allocated = context.session.query(models_v2.IPAllocation).get(
+                (ip_address, subnet_id, network_id))
+            if allocated is not None and allocated['port_id'] is None:
+                allocated['port_id'] = port_id
+                return
         allocated = models_v2.IPAllocation(
             network_id=network_id,
             port_id=port_id,
@@ -180,6 +217,10 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
 
     @staticmethod
     def _generate_ip(context, subnets):
+        if cfg.CONF.ip_allocation == 'random':
+            return NeutronDbPluginV2._generate_random_ip(context, subnets)
+        if cfg.CONF.ip_allocation == 'bitmap':
+            return NeutronDbPluginV2._generate_bitmap_ip(context, subnets)
         try:
             return NeutronDbPluginV2._try_generate_ip(context, subnets)
         except n_exc.IpAddressGenerationFailure:
@@ -224,6 +265,106 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                     'subnet_id': subnet['id']}
         raise n_exc.IpAddressGenerationFailure(net_id=subnets[0]['network_id'])
 
+    @staticmethod
+    def _generate_random_ip(context, subnets):
+        """Generate an IP address without locking the availability ranges.
+
+        Random addresses of the allocation pools of the subnets are reserved
+        until one is free: the primary key of the IP allocations ensures that
+        concurrent requests never reserve the same address. When the random
+        attempts fail, the subnet is likely nearly full and the attempts are
+        made among the addresses which are not allocated.
+        """
+        pool_qry = context.session.query(models_v2.IPAllocationPool)
+        ip_qry = context.session.query(models_v2.IPAllocation)
+        for subnet in subnets:
+            NeutronDbPluginV2._drop_availability_ranges(context, subnet['id'])
+            candidates = netaddr.IPSet()
+            for pool in pool_qry.filter_by(subnet_id=subnet['id']):
+                candidates.update(netaddr.IPRange(pool['first_ip'],
+                                                  pool['last_ip']))
+            for attempt in range(2 * RANDOM_IP_ATTEMPTS):
+                if attempt == RANDOM_IP_ATTEMPTS:
+                    allocations = ip_qry.filter_by(subnet_id=subnet['id'])
+                    candidates -= netaddr.IPSet(
+                        [allocation['ip_address']
+                         for allocation in allocations])
+                if not candidates:
+                    break
+                ip_address = NeutronDbPluginV2._get_random_ip(candidates)
+                if NeutronDbPluginV2._reserve_ip(context, subnet['network_id'],
+                                                 subnet['id'], ip_address):
+                    LOG.debug("Allocated random IP - %(ip_address)s "
+                              "(%(subnet_id)s) in %(attempts)d attempts",
+                              {'ip_address': ip_address,
+                               'subnet_id': subnet['id'],
+                               'attempts': attempt + 1})
+                    return {'ip_address': ip_address,
+                            'subnet_id': subnet['id']}
+                candidates.remove(ip_address)
+            LOG.debug("No free IP found in subnet %(subnet_id)s (%(cidr)s)",
+                      {'subnet_id': subnet['id'],
+                       'cidr': subnet['cidr']})
+        raise n_exc.IpAddressGenerationFailure(net_id=subnets[0]['network_id'])
+
+    @staticmethod
+    def _generate_bitmap_ip(context, subnets):
+        """Generate an IP address with the bitmap IPAM driver."""
+        ipam_pool = bitmap.BitmapPool(context.session)
+        for subnet in subnets:
+            NeutronDbPluginV2._drop_availability_ranges(context, subnet['id'])
+            ipam_subnet = ipam_pool.get_subnet(subnet['id'])
+            try:
+                ip_address = ipam_subnet.allocate(ipam.AnyAddressRequest())
+            except n_exc.IpAddressGenerationFailure:
+                LOG.debug("No free IP found in subnet %(subnet_id)s "
+                          "(%(cidr)s)",
+                          {'subnet_id': subnet['id'],
+                           'cidr': subnet['cidr']})
+                continue
+            return {'ip_address': str(ip_address),
+                    'subnet_id': subnet['id']}
+        raise n_exc.IpAddressGenerationFailure(net_id=subnets[0]['network_id'])
+
+    @staticmethod
+    def _get_random_ip(ip_set):
+        index = random.randrange(ip_set.size)
+        for cidr in ip_set.iter_cidrs():
+            if index < cidr.size:
+                return str(netaddr.IPAddress(cidr.first + index, cidr.version))
+            index -= cidr.size
+
+    @staticmethod
+    def _reserve_ip(context, network_id, subnet_id, ip_address):
+        """Reserve an IP address, return False if it is already allocated.
+
+        The reservation is an IP allocation without port, which is set when
+        the allocation is stored.
+        """
+        allocation = models_v2.IPAllocation(network_id=network_id,
+                                            subnet_id=subnet_id,
+                                            ip_address=ip_address)
+        try:
+            # Only the reservation is rolled back on conflict
+            with context.session.begin_nested():
+                context.session.add(allocation)
+        except db_exc.DBDuplicateEntry:
+            return False
+        return True
+
+    @staticmethod
+    def _drop_availability_ranges(context, subnet_id):
+        """Drop the availability ranges, random allocations ignore them.
+
+        The ranges of a subnet are rebuilt when it has none left, so that
+        allocating from the ranges again does not allocate addresses in use.
+        """
+        range_qry = context.session.query(
+            models_v2.IPAvailabilityRange).join(
+                models_v2.IPAllocationPool)
+        for ip_range in range_qry.filter_by(subnet_id=subnet_id):
+            context.session.delete(ip_range)
+
     @staticmethod
     def _rebuild_availability_ranges(context, subnets):
         """Rebuild availability ranges.
@@ -245,41 +386,39 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
             LOG.debug("Rebuilding availability ranges for subnet %s",
                       subnet)
 
-            # Create a set of all currently allocated addresses
+            # Sort the allocated addresses once to sweep all the pools
             ip_qry_results = ip_qry.filter_by(subnet_id=subnet['id'])
-            allocations = netaddr.IPSet([netaddr.IPAddress(i['ip_address'])
-                                        for i in ip_qry_results])
+            allocated = sorted(ipam_utils.ip_to_int(i['ip_address'])
+                               for i in ip_qry_results)
 
             for pool in pool_qry.filter_by(subnet_id=subnet['id']):
-                # Create a set of all addresses in the pool
-                poolset = netaddr.IPSet(netaddr.IPRange(pool['first_ip'],
-                                                        pool['last_ip']))
-
-                # Use set difference to find free addresses in the pool
-                available = poolset - allocations
-
-                # Generator compacts an ip set into contiguous ranges
-                def ipset_to_ranges(ipset):
-                    first, last = None, None
-                    for cidr in ipset.iter_cidrs():
-                        if last and last + 1 != cidr.first:
-                            yield netaddr.IPRange(first, last)
-                            first = None
-                        first, last = first if first else cidr.first, cidr.last
-                    if first:
-                        yield netaddr.IPRange(first, last)
+                first_ip = netaddr.IPAddress(pool['first_ip'])
+                free_ranges = ipam_utils.get_free_ranges(
+                    int(first_ip), int(netaddr.IPAddress(pool['last_ip'])),
+                    allocated)
 
                 # Write the ranges to the db
-                for ip_range in ipset_to_ranges(available):
+                for first, last in free_ranges:
                     available_range = models_v2.IPAvailabilityRange(
                         allocation_pool_id=pool['id'],
-                        first_ip=str(netaddr.IPAddress(ip_range.first)),
-                        last_ip=str(netaddr.IPAddress(ip_range.last)))
+                        first_ip=str(netaddr.IPAddress(first,
+                                                       first_ip.version)),
+                        last_ip=str(netaddr.IPAddress(last,
+                                                      first_ip.version)))
                     context.session.add(available_range)
 
     @staticmethod
     def _allocate_specific_ip(context, subnet_id, ip_address):
         """Allocate a specific IP address on the subnet."""
+        if cfg.CONF.ip_allocation == 'random':
+            NeutronDbPluginV2._drop_availability_ranges(context, subnet_id)
+            return
+        if cfg.CONF.ip_allocation == 'bitmap':
+            NeutronDbPluginV2._drop_availability_ranges(context, subnet_id)
+            ipam_pool = bitmap.BitmapPool(context.session)
+            ipam_pool.get_subnet(subnet_id).allocate(
+                ipam.SpecificAddressRequest(ip_address))
+            return
         ip = int(netaddr.IPAddress(ip_address))
         range_qry = context.session.query(
             models_v2.IPAvailabilityRange).join(
@@ -654,7 +793,7 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
         subnet_last_ip = netaddr.IPAddress(subnet.last - 1)
 
         LOG.debug("Performing IP validity checks on allocation pools")
-        ip_sets = []
+        int_ranges = []
         for ip_pool in ip_pools:
             try:
                 start_ip = netaddr.IPAddress(ip_pool['start'])
@@ -684,29 +823,21 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                     pool=ip_pool,
                     subnet_cidr=subnet_cidr)
             # Valid allocation pool
-            # Create an IPSet for it for easily verifying overlaps
-            ip_sets.append(netaddr.IPSet(netaddr.IPRange(
-                ip_pool['start'],
-                ip_pool['end']).cidrs()))
+            int_ranges.append((int(start_ip), int(end_ip)))
 
         LOG.debug("Checking for overlaps among allocation pools "
                   "and gateway ip")
-        ip_ranges = ip_pools[:]
-
-        # Use integer cursors as an efficient way for implementing
-        # comparison and avoiding comparing the same pair twice
-        for l_cursor in range(len(ip_sets)):
-            for r_cursor in range(l_cursor + 1, len(ip_sets)):
-                if ip_sets[l_cursor] & ip_sets[r_cursor]:
-                    l_range = ip_ranges[l_cursor]
-                    r_range = ip_ranges[r_cursor]
-                    LOG.info(_LI("Found overlapping ranges: %(l_range)s and "
-                                 "%(r_range)s"),
-                             {'l_range': l_range, 'r_range': r_range})
-                    raise n_exc.OverlappingAllocationPools(
-                        pool_1=l_range,
-                        pool_2=r_range,
-                        subnet_cidr=subnet_cidr)
+        overlap = ipam_utils.find_overlapping_ranges(int_ranges)
+        if overlap:
+            l_range = ip_pools[overlap[0]]
+            r_range = ip_pools[overlap[1]]
+            LOG.info(_LI("Found overlapping ranges: %(l_range)s and "
+                         "%(r_range)s"),
+                     {'l_range': l_range, 'r_range': r_range})
+            raise n_exc.OverlappingAllocationPools(
+                pool_1=l_range,
+                pool_2=r_range,
+                subnet_cidr=subnet_cidr)
 
     def _validate_host_route(self, route, ip_version):
         try:
@@ -1228,9 +1359,7 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                 return str(cidr_net.network + 1)
         return subnet.get('gateway_ip')
 
-    @oslo_db_api.wrap_db_retry(max_retries=db_api.MAX_RETRIES,
-                               retry_on_request=True,
-                               retry_on_deadlock=True)
+    @db_api.retry_db_errors
     def _create_subnet_from_pool(self, context, subnet, subnetpool_id):
         s = subnet['subnet']
         tenant_id = self._get_tenant_id_for_create(context, s)
@@ -1573,6 +1702,13 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                     raise n_exc.SubnetInUse(subnet_id=id)
 
             context.session.delete(subnet)
+            self._remove_ipam_subnet(context, id)
+
+    @staticmethod
+    def _remove_ipam_subnet(context, subnet_id):
+        """Forget the state kept by the IP allocation for a deleted subnet."""
+        if cfg.CONF.ip_allocation == 'bitmap':
+            bitmap.BitmapPool(context.session).remove_subnet(subnet_id)
 
     def get_subnet(self, context, id, fields=None):
         subnet = self._get_subnet(context, id)
@@ -1720,8 +1856,64 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                 device_owner=device_owner)
 
     def create_port_bulk(self, context, ports):
+        self._generate_macs_for_ports(context, ports['ports'])
         return self._create_bulk('port', context, ports)
 
+    @classmethod
+    def _generate_macs(cls, context, network_id, count, used=()):
+        """Generate MAC addresses which are not used on a network.
+
+        The candidates of an attempt are checked with one query, instead
+        of one insert in a savepoint per address.
+
+        :param used: MAC addresses to avoid, which are not in the database.
+        """
+        macs = set()
+        max_retries = cfg.CONF.mac_generation_retries
+        for i in range(max_retries):
+            candidates = set(cls._generate_mac()
+                             for i in range(count - len(macs)))
+            candidates -= macs
+            candidates.difference_update(used)
+            if candidates:
+                in_use = context.session.query(
+                    models_v2.Port.mac_address).filter(
+                        models_v2.Port.network_id == network_id,
+                        models_v2.Port.mac_address.in_(candidates))
+                candidates.difference_update(mac for mac, in in_use)
+            macs |= candidates
+            if len(macs) == count:
+                return list(macs)
+            LOG.debug('Generated mac addresses exist on network '
+                      '%(network_id)s, %(count)s are missing',
+                      {'network_id': network_id, 'count': count - len(macs)})
+
+        LOG.error(_LE("Unable to generate mac address after %s attempts"),
+                  max_retries)
+        raise n_exc.MacAddressGenerationFailure(net_id=network_id)
+
+    @classmethod
+    def _generate_macs_for_ports(cls, context, ports):
+        """Generate the MAC addresses of the ports of a bulk request.
+
+        The MAC addresses of the ports of a network are generated together,
+        and each port tries its own first, see _create_port.
+        """
+        ports_by_network = collections.defaultdict(list)
+        requested_macs = collections.defaultdict(set)
+        for item in ports:
+            p = item['port']
+            if p['mac_address'] is attributes.ATTR_NOT_SPECIFIED:
+                ports_by_network[p['network_id']].append(p)
+            else:
+                requested_macs[p['network_id']].add(p['mac_address'])
+        for network_id, network_ports in ports_by_network.items():
+            macs = cls._generate_macs(context, network_id,
+                                      len(network_ports),
+                                      requested_macs[network_id])
+            for p, mac in zip(network_ports, macs):
+                p[GENERATED_MAC] = mac
+
     def _create_port_with_mac(self, context, network_id, port_data,
                               mac_address, nested=False):
         try:
@@ -1732,10 +1924,15 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
         except db_exc.DBDuplicateEntry:
             raise n_exc.MacAddressInUse(net_id=network_id, mac=mac_address)
 
-    def _create_port(self, context, network_id, port_data):
+    def _create_port(self, context, network_id, port_data, mac=None):
+        """Create a port with a generated MAC address.
+
+        :param mac: a MAC address generated beforehand, which is tried first
+            and taken again by another port when the insert fails.
+        """
         max_retries = cfg.CONF.mac_generation_retries
         for i in range(max_retries):
-            mac = self._generate_mac()
+            mac = mac or self._generate_mac()
             try:
                 # nested = True frames an operation that may potentially fail
                 # within a transaction, so that it can be rolled back to the
@@ -1747,11 +1944,13 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                 LOG.debug('Generated mac %(mac_address)s exists on '
                           'network %(network_id)s',
                           {'mac_address': mac, 'network_id': network_id})
+                mac = None
 
         LOG.error(_LE("Unable to generate mac address after %s attempts"),
                   max_retries)
         raise n_exc.MacAddressGenerationFailure(net_id=network_id)
 
+    @db_api.retry_db_errors
     def create_port(self, context, port):
         p = port['port']
         port_id = p.get('id') or uuidutils.generate_uuid()
@@ -1778,7 +1977,8 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
 
             # Create the port
             if p['mac_address'] is attributes.ATTR_NOT_SPECIFIED:
-                db_port = self._create_port(context, network_id, port_data)
+                db_port = self._create_port(context, network_id, port_data,
+                                            p.pop(GENERATED_MAC, None))
                 p['mac_address'] = db_port['mac_address']
             else:
                 db_port = self._create_port_with_mac(
@@ -1877,7 +2077,7 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
         return self._make_port_dict(port, fields)
 
     def _get_ports_query(self, context, filters=None, sorts=None, limit=None,
-                         marker_obj=None, page_reverse=False):
+                         marker_obj=None, page_reverse=False, columns=None):
         Port = models_v2.Port
         IPAllocation = models_v2.IPAllocation
 
@@ -1897,8 +2097,14 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                 query = query.filter(IPAllocation.subnet_id.in_(subnet_ids))
 
         query = self._apply_filters_to_query(query, Port, filters)
+        if columns:
+            query = query.with_entities(*columns)
+        else:
+            query = self._apply_eager_loads(query, Port)
         if limit and page_reverse and sorts:
             sorts = [(s[0], not s[1]) for s in sorts]
+        marker_obj = self._get_marker_values(context, Port, marker_obj,
+                                             sorts)
         query = sqlalchemyutils.paginate_query(query, Port, limit,
                                                sorts, marker_obj)
         return query
@@ -1907,11 +2113,20 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                   sorts=None, limit=None, marker=None,
                   page_reverse=False):
         marker_obj = self._get_marker_obj(context, 'port', limit, marker)
+        columns = None
+        # Ports matching several fixed IPs are only returned once as objects
+        if not filters or 'fixed_ips' not in filters:
+            columns = self._get_column_projection(models_v2.Port, fields)
         query = self._get_ports_query(context, filters=filters,
                                       sorts=sorts, limit=limit,
                                       marker_obj=marker_obj,
-                                      page_reverse=page_reverse)
-        items = [self._make_port_dict(c, fields) for c in query]
+                                      page_reverse=page_reverse,
+                                      columns=columns)
+        if columns:
+            items = [self._make_dict_from_columns(columns, row)
+                     for row in query]
+        else:
+            items = [self._make_port_dict(c, fields) for c in query]
         if limit and page_reverse:
             items.reverse()
         return items
@@ -25,6 +25,7 @@ from neutron.api.v2 import attributes
 from neutron.common import constants
 from neutron.common import utils as n_utils
 from neutron.db import agents_db
+from neutron.db import api as db_api
 from neutron.db import l3_dvr_db
 from neutron.db import model_base
 from neutron.db import models_v2
@@ -200,6 +201,7 @@ class L3_HA_NAT_db_mixin(l3_dvr_db.L3_NAT_with_dvr_db_mixin):
                 network_id=ha_network.network_id,
                 vr_id=vr_id).delete()
 
+    @db_api.retry_db_errors
     def _set_vr_id(self, context, router, ha_network):
         with context.session.begin(subtransactions=True):
             router.extra_attributes.ha_vr_id = self._allocate_vr_id(
@@ -0,0 +1,107 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+
+from oslo_config import cfg
+from oslo_db import exception as db_exc
+from oslo_log import log as logging
+import sqlalchemy as sa
+
+from neutron.db import api as db_api
+from neutron.db import model_base
+
+LOG = logging.getLogger(__name__)
+
+
+class MacAddressRange(model_base.BASEV2):
+    """The offset of the next block of MAC addresses of a base MAC address."""
+
+    __tablename__ = 'macaddressranges'
+
+    base_mac = sa.Column(sa.String(32), primary_key=True)
+    next_offset = sa.Column(sa.Integer, nullable=False)
+
+
+class MacAddressAllocator(object):
+    """Hand out the MAC addresses of blocks reserved in the database.
+
+    Each server process reserves blocks of consecutive MAC addresses of the
+    base MAC address, by moving the next offset of its range with a compare
+    and swap, and hands out their addresses without database access. The
+    processes do not generate the same MAC addresses until the whole range
+    has been reserved, and the reservations wrap around to its start.
+    """
+
+    def __init__(self, base_mac, block_size):
+        self.base_mac = base_mac
+        self.block_size = block_size
+        octets = base_mac.split(':')
+        # The random octets of the base MAC address, like get_random_mac
+        fixed = 4 if octets[3] != '00' else 3
+        self.size = 1 << 8 * (6 - fixed)
+        self._base = int(''.join(octets[:fixed]), 16) * self.size
+        self._pid = None
+        self._next = self._end = 0
+
+    def _reserve_block(self):
+        session = db_api.get_session()
+        query = session.query(MacAddressRange).filter_by(
+            base_mac=self.base_mac)
+        # The next loop only iterates when another process reserved a block
+        while True:
+            start = query.with_entities(MacAddressRange.next_offset).scalar()
+            end = min((start or 0) + self.block_size, self.size)
+            try:
+                with session.begin():
+                    if start is None:
+                        start = 0
+                        session.add(MacAddressRange(base_mac=self.base_mac,
+                                                    next_offset=end))
+                        updated = 1
+                    else:
+                        updated = query.filter_by(next_offset=start).update(
+                            {'next_offset': end % self.size},
+                            synchronize_session=False)
+            except db_exc.DBDuplicateEntry:
+                continue
+            if updated:
+                LOG.debug("Reserved the MAC addresses %(start)s to %(end)s "
+                          "of base MAC address %(base_mac)s",
+                          {'start': start, 'end': end,
+                           'base_mac': self.base_mac})
+                return start, end
+
+    def get_mac(self):
+        """Return the next MAC address of the block of the process."""
+        if self._pid != os.getpid():
+            # The blocks of a parent process are not reused by its workers
+            self._pid = os.getpid()
+            self._next = self._end = 0
+        if self._next >= self._end:
+            self._next, self._end = self._reserve_block()
+        value = self._base + self._next
+        self._next += 1
+        return ':'.join('%02x' % (value >> shift & 0xff)
+                        for shift in range(40, -8, -8))
+
+
+_allocators = {}
+
+
+def generate_mac():
+    """Return a MAC address of the base MAC address, from reserved blocks."""
+    key = cfg.CONF.base_mac, cfg.CONF.mac_block_size
+    allocator = _allocators.get(key)
+    if allocator is None:
+        allocator = _allocators[key] = MacAddressAllocator(*key)
+    return allocator.get_mac()
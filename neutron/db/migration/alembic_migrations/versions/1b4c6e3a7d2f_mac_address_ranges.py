@@ -0,0 +1,37 @@
+# Copyright 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""mac address ranges
+
+Revision ID: 1b4c6e3a7d2f
+Revises: 20c469a5f920
+Create Date: 2015-06-02 10:21:37.214503
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '1b4c6e3a7d2f'
+down_revision = '20c469a5f920'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+        'macaddressranges',
+        sa.Column('base_mac', sa.String(length=32), nullable=False),
+        sa.Column('next_offset', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('base_mac'))
@@ -34,6 +34,7 @@ from neutron.db import l3_db  # noqa
 from neutron.db import l3_dvrscheduler_db  # noqa
 from neutron.db import l3_gwmode_db  # noqa
 from neutron.db import l3_hamode_db  # noqa
+from neutron.db import mac_blocks_db  # noqa
 from neutron.db.metering import metering_db  # noqa
 from neutron.db import model_base
 from neutron.db import models_v2  # noqa
@@ -500,8 +500,8 @@ class SecurityGroupDbMixin(ext_sg.SecurityGroupPluginBase):
 
     def _extend_port_dict_security_group(self, port_res, port_db):
         # Security group bindings will be retrieved from the sqlalchemy
-        # model. As they're loaded eagerly with ports because of the
-        # joined load they will not cause an extra query.
+        # model. As they're loaded eagerly with ports they will not cause
+        # an extra query.
         security_group_ids = [sec_group_mapping['security_group_id'] for
                               sec_group_mapping in port_db.security_groups]
         port_res[ext_sg.SECURITYGROUPS] = security_group_ids
@@ -511,6 +511,15 @@ class SecurityGroupDbMixin(ext_sg.SecurityGroupPluginBase):
     db_base_plugin_v2.NeutronDbPluginV2.register_dict_extend_funcs(
         attributes.PORTS, ['_extend_port_dict_security_group'])
 
+    # Load the bindings of port collections in a separate query rather than
+    # joining them with the other collections of the ports
+    db_base_plugin_v2.NeutronDbPluginV2.register_model_query_hook(
+        models_v2.Port,
+        "security_groups_port",
+        None,
+        None,
+        eager_loads=[orm.subqueryload('security_groups')])
+
     def _process_port_create_security_group(self, context, port,
                                             security_group_ids):
         if attributes.is_attr_set(security_group_ids):
@@ -23,6 +23,56 @@ from neutron.common import exceptions as n_exc
 
 LOG = logging.getLogger(__name__)
 
+# The dialects comparing row values, such as (k1, k2) > (X1, X2), with the
+# index on the columns
+ROW_VALUE_DIALECTS = ('mysql', 'postgresql')
+
+
+class Marker(object):
+    """The id of the last item of the previous page of a resource.
+
+    The values of the sort keys of the marker are loaded with the page,
+    rather than loading the marker object with its relationships.
+    """
+
+    def __init__(self, resource, id):
+        self.resource = resource
+        self.id = id
+
+
+def _get_marker_criteria(query, model, sorts, marker_values):
+    sort_attrs = [getattr(model, sort[0]) for sort in sorts]
+    directions = set(sort[1] for sort in sorts)
+    if (len(sorts) > 1 and len(directions) == 1 and
+            query.session.get_bind().dialect.name in ROW_VALUE_DIALECTS):
+        row = sqlalchemy.tuple_(*sort_attrs)
+        marker_row = sqlalchemy.tuple_(*marker_values)
+        return row > marker_row if sorts[0][1] else row < marker_row
+
+    # Build up an array of sort criteria as in the docstring
+    criteria_list = []
+    for i, sort in enumerate(sorts):
+        crit_attrs = [(sort_attrs[j] == marker_values[j])
+                      for j in moves.xrange(i)]
+        if sort[1]:
+            crit_attrs.append((sort_attrs[i] > marker_values[i]))
+        else:
+            crit_attrs.append((sort_attrs[i] < marker_values[i]))
+
+        criteria = sqlalchemy.sql.and_(*crit_attrs)
+        criteria_list.append(criteria)
+
+    criteria = sqlalchemy.sql.or_(*criteria_list)
+    if len(sorts) > 1:
+        # Bound the first sort key, so that its index limits the scan
+        if sorts[0][1]:
+            criteria = sqlalchemy.sql.and_(sort_attrs[0] >= marker_values[0],
+                                           criteria)
+        else:
+            criteria = sqlalchemy.sql.and_(sort_attrs[0] <= marker_values[0],
+                                           criteria)
+    return criteria
+
 
 def paginate_query(query, model, limit, sorts, marker_obj=None):
     """Returns a query with sorting / pagination criteria added.
@@ -35,6 +85,9 @@ def paginate_query(query, model, limit, sorts, marker_obj=None):
     With a compound-values sort key, (k1, k2, k3) we must do this to repeat
     the lexicographical ordering:
     (k1 > X1) or (k1 == X1 && k2 > X2) or (k1 == X1 && k2 == X2 && k3 > X3)
+    which is bounded by k1 >= X1, or compared as (k1, k2, k3) > (X1, X2, X3)
+    when all the sort directions are the same and the database compares row
+    values with the indexes.
     The reason of didn't use OFFSET clause was it don't scale, please refer
     discussion at https://lists.launchpad.net/openstack/msg02547.html
 
@@ -49,8 +102,9 @@ def paginate_query(query, model, limit, sorts, marker_obj=None):
     :param limit: maximum number of items to return
     :param sorts: array of attributes and direction by which results should
                  be sorted
-    :param marker: the last item of the previous page; we returns the next
-                    results after this value.
+    :param marker_obj: the last item of the previous page, or a dict of the
+                       values of its sort keys; we returns the next results
+                       after this value.
     :rtype: sqlalchemy.orm.query.Query
     :return: The query with sorting/pagination added.
     """
@@ -82,24 +136,12 @@ def paginate_query(query, model, limit, sorts, marker_obj=None):
 
     # Add pagination
     if marker_obj:
-        marker_values = [getattr(marker_obj, sort[0]) for sort in sorts]
-
-        # Build up an array of sort criteria as in the docstring
-        criteria_list = []
-        for i, sort in enumerate(sorts):
-            crit_attrs = [(getattr(model, sorts[j][0]) == marker_values[j])
-                          for j in moves.xrange(i)]
-            model_attr = getattr(model, sort[0])
-            if sort[1]:
-                crit_attrs.append((model_attr > marker_values[i]))
-            else:
-                crit_attrs.append((model_attr < marker_values[i]))
-
-            criteria = sqlalchemy.sql.and_(*crit_attrs)
-            criteria_list.append(criteria)
-
-        f = sqlalchemy.sql.or_(*criteria_list)
-        query = query.filter(f)
+        if isinstance(marker_obj, dict):
+            marker_values = [marker_obj[sort[0]] for sort in sorts]
+        else:
+            marker_values = [getattr(marker_obj, sort[0]) for sort in sorts]
+        query = query.filter(
+            _get_marker_criteria(query, model, sorts, marker_values))
 
     if limit:
         query = query.limit(limit)
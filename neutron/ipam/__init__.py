@@ -16,6 +16,7 @@ import netaddr
 import six
 
 from neutron.common import constants
+from neutron.ipam import utils as ipam_utils
 
 
 @six.add_metaclass(abc.ABCMeta)
@@ -57,13 +58,12 @@ class SubnetRequest(object):
 
         if allocation_pools is not None:
             allocation_pools = sorted(allocation_pools)
-            previous = None
             for pool in allocation_pools:
                 if not isinstance(pool, netaddr.ip.IPRange):
                     raise TypeError("Ranges must be netaddr.IPRange")
-                if previous and pool.first <= previous.last:
-                    raise ValueError("Ranges must not overlap")
-                previous = pool
+            if ipam_utils.find_overlapping_ranges(
+                    [(pool.first, pool.last) for pool in allocation_pools]):
+                raise ValueError("Ranges must not overlap")
             if 1 < len(allocation_pools):
                 # Checks that all the ranges are in the same IP version.
                 # IPRange sorts first by ip version so we can get by with just
@@ -0,0 +1,279 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import netaddr
+from oslo_db import exception as db_exc
+from oslo_log import log as logging
+
+from neutron.common import exceptions as n_exc
+from neutron.db import models_v2
+import neutron.ipam as ipam
+from neutron.ipam import driver
+from neutron.ipam import subnet_alloc
+from neutron.ipam import utils as ipam_utils
+
+LOG = logging.getLogger(__name__)
+
+
+class AddressBitmap(object):
+    """The used addresses of a range of addresses.
+
+    The bitmap is split in chunks which are only created when one of their
+    addresses is used, so that large IPv6 ranges are cheap. Free addresses
+    are searched from the last one found, which makes finding one O(1)
+    amortized; the freed addresses are found again once the search wraps
+    around the range.
+    """
+
+    CHUNK_BITS = 4096
+
+    def __init__(self, first, last):
+        self.first = first
+        self.last = last
+        self._size = last - first + 1
+        self._chunks = {}
+        self._counts = {}
+        self._cursor = 0
+
+    def _chunk_size(self, index):
+        return min(self.CHUNK_BITS, self._size - index * self.CHUNK_BITS)
+
+    def __contains__(self, value):
+        offset = value - self.first
+        if not 0 <= offset < self._size:
+            return False
+        chunk = self._chunks.get(offset // self.CHUNK_BITS)
+        bit = offset % self.CHUNK_BITS
+        return bool(chunk and chunk[bit // 8] & (1 << bit % 8))
+
+    def add(self, value):
+        """Mark an address of the range as used."""
+        offset = value - self.first
+        index, bit = divmod(offset, self.CHUNK_BITS)
+        chunk = self._chunks.get(index)
+        if chunk is None:
+            chunk = self._chunks[index] = bytearray(self.CHUNK_BITS // 8)
+            self._counts[index] = 0
+        if not chunk[bit // 8] & (1 << bit % 8):
+            chunk[bit // 8] |= 1 << bit % 8
+            self._counts[index] += 1
+
+    def discard(self, value):
+        """Mark an address of the range as free."""
+        offset = value - self.first
+        index, bit = divmod(offset, self.CHUNK_BITS)
+        chunk = self._chunks.get(index)
+        if chunk is not None and chunk[bit // 8] & (1 << bit % 8):
+            chunk[bit // 8] &= ~(1 << bit % 8) & 0xff
+            self._counts[index] -= 1
+
+    def _find_free_in_chunk(self, index, bit):
+        chunk = self._chunks.get(index)
+        if chunk is None:
+            return bit
+        end_bit = self._chunk_size(index)
+        if self._counts[index] == end_bit:
+            return None
+        while bit < end_bit:
+            byte = chunk[bit // 8]
+            if byte == 0xff:
+                # Skip the remaining bits of a full byte
+                bit = (bit // 8 + 1) * 8
+            elif byte & (1 << bit % 8):
+                bit += 1
+            else:
+                return bit
+
+    def _find_free_between(self, start, end):
+        index, bit = divmod(start, self.CHUNK_BITS)
+        while index * self.CHUNK_BITS < end:
+            found = self._find_free_in_chunk(index, bit)
+            if found is not None:
+                offset = index * self.CHUNK_BITS + found
+                return offset if offset < end else None
+            index += 1
+            bit = 0
+
+    def find_free(self):
+        """Return a free address, or None if they are all used."""
+        # Search from the cursor to the end of the range, then from its start
+        for start, end in ((self._cursor, self._size), (0, self._cursor)):
+            offset = self._find_free_between(start, end)
+            if offset is not None:
+                self._cursor = offset + 1
+                return self.first + offset
+
+
+class SubnetBitmaps(object):
+    """The bitmaps of the allocation pools of a subnet."""
+
+    def __init__(self, pools):
+        self.pools = pools
+        self.bitmaps = [AddressBitmap(first, last) for first, last in pools]
+
+    def get_bitmap(self, value):
+        for bitmap in self.bitmaps:
+            if bitmap.first <= value <= bitmap.last:
+                return bitmap
+
+
+class BitmapPool(driver.Pool):
+    """Allocate the addresses of subnets from in-memory bitmaps.
+
+    The bitmaps of the used addresses of the subnets are built from their IP
+    allocations, and kept by the process. Allocations are written to the
+    database optimistically: an address allocated by another process makes
+    the write fail on the primary key of the allocations, and another address
+    is tried. The bitmaps are only hints: the addresses freed by other
+    processes, by port deletions or by rolled back transactions are still
+    marked, so specific addresses are always written, and the bitmaps are
+    rebuilt when their subnet looks full.
+    """
+
+    # The bitmaps of the subnets, shared by the instances of the process
+    _subnet_bitmaps = {}
+
+    def __init__(self, session, subnet_pool_id=None):
+        super(BitmapPool, self).__init__(subnet_pool_id)
+        self._session = session
+
+    def allocate_subnet(self, request):
+        """Allocate a subnet from the prefixes of the subnet pool."""
+        if not self._subnet_pool_id:
+            raise n_exc.SubnetAllocationError(
+                reason=_("Subnets are only allocated from subnet pools"))
+        subnetpool = self._session.query(models_v2.SubnetPool).filter_by(
+            id=self._subnet_pool_id).first()
+        if not subnetpool:
+            raise n_exc.SubnetPoolNotFound(subnetpool_id=self._subnet_pool_id)
+        allocator = subnet_alloc.SubnetAllocator(subnetpool)
+        return allocator.allocate_subnet(self._session, request)
+
+    def get_subnet(self, subnet_id):
+        subnet = self._session.query(models_v2.Subnet).filter_by(
+            id=subnet_id).first()
+        if not subnet:
+            raise n_exc.SubnetNotFound(subnet_id=subnet_id)
+        return BitmapSubnet(self._session, subnet)
+
+    def update_subnet(self, request):
+        self.remove_subnet(request.subnet_id)
+        return self.get_subnet(request.subnet_id)
+
+    def remove_subnet(self, subnet_id):
+        self._subnet_bitmaps.pop(subnet_id, None)
+
+
+class BitmapSubnet(driver.Subnet):
+
+    def __init__(self, session, subnet):
+        self._session = session
+        self._subnet = subnet
+
+    def _get_bitmaps(self, rebuild=False):
+        subnet_id = self._subnet['id']
+        pools = sorted((ipam_utils.ip_to_int(pool['first_ip']),
+                        ipam_utils.ip_to_int(pool['last_ip']))
+                       for pool in self._session.query(
+                           models_v2.IPAllocationPool).filter_by(
+                               subnet_id=subnet_id))
+        bitmaps = BitmapPool._subnet_bitmaps.get(subnet_id)
+        if bitmaps is None or bitmaps.pools != pools or rebuild:
+            LOG.debug("Building the address bitmaps of subnet %s", subnet_id)
+            bitmaps = SubnetBitmaps(pools)
+            allocations = self._session.query(
+                models_v2.IPAllocation).filter_by(subnet_id=subnet_id)
+            for allocation in allocations:
+                value = ipam_utils.ip_to_int(allocation['ip_address'])
+                bitmap = bitmaps.get_bitmap(value)
+                if bitmap:
+                    bitmap.add(value)
+            BitmapPool._subnet_bitmaps[subnet_id] = bitmaps
+        return bitmaps
+
+    def _to_ip(self, value):
+        return str(netaddr.IPAddress(value, self._subnet['ip_version']))
+
+    def _reserve(self, ip_address):
+        """Write the allocation of an address, without port.
+
+        :returns: False if the address was allocated in the meantime.
+        """
+        allocation = models_v2.IPAllocation(
+            network_id=self._subnet['network_id'],
+            subnet_id=self._subnet['id'],
+            ip_address=ip_address)
+        try:
+            with self._session.begin_nested():
+                self._session.add(allocation)
+        except db_exc.DBDuplicateEntry:
+            return False
+        return True
+
+    def _allocate_specific(self, address):
+        ip_address = str(address)
+        if address not in netaddr.IPNetwork(self._subnet['cidr']):
+            raise n_exc.InvalidIpForSubnet(ip_address=ip_address)
+        value = int(address)
+        bitmap = self._get_bitmaps().get_bitmap(value)
+        # The bitmap misses the addresses freed by other processes, by the
+        # deletion of ports and by rolled back transactions, so only the
+        # database tells whether the address is used
+        reserved = self._reserve(ip_address)
+        if bitmap is not None:
+            bitmap.add(value)
+        if not reserved:
+            raise n_exc.IpAddressInUse(net_id=self._subnet['network_id'],
+                                       ip_address=ip_address)
+        return address
+
+    def _allocate_any(self):
+        for rebuild in (False, True):
+            for bitmap in self._get_bitmaps(rebuild).bitmaps:
+                value = bitmap.find_free()
+                while value is not None:
+                    # Mark the address before writing it, so that concurrent
+                    # requests of the process do not try it too
+                    bitmap.add(value)
+                    if self._reserve(self._to_ip(value)):
+                        return netaddr.IPAddress(value,
+                                                 self._subnet['ip_version'])
+                    value = bitmap.find_free()
+        raise n_exc.IpAddressGenerationFailure(
+            net_id=self._subnet['network_id'])
+
+    def allocate(self, address_request):
+        if isinstance(address_request, ipam.SpecificAddressRequest):
+            return self._allocate_specific(address_request.address)
+        elif isinstance(address_request, ipam.AnyAddressRequest):
+            return self._allocate_any()
+        raise n_exc.InvalidAddressRequest(
+            reason=_("Unsupported request type %s") %
+            type(address_request).__name__)
+
+    def deallocate(self, address):
+        address = netaddr.IPAddress(address)
+        self._session.query(models_v2.IPAllocation).filter_by(
+            network_id=self._subnet['network_id'],
+            subnet_id=self._subnet['id'],
+            ip_address=str(address)).delete()
+        bitmaps = BitmapPool._subnet_bitmaps.get(self._subnet['id'])
+        bitmap = bitmaps and bitmaps.get_bitmap(int(address))
+        if bitmap:
+            bitmap.discard(int(address))
+
+    def get_details(self):
+        return ipam.SpecificSubnetRequest(
+            self._subnet['tenant_id'],
+            self._subnet['id'],
+            self._subnet['cidr'],
+            gateway_ip=self._subnet['gateway_ip'])
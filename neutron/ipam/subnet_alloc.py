@@ -13,8 +13,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
 import math
-import operator
 
 import netaddr
 from neutron.api.v2 import attributes
@@ -23,6 +23,7 @@ from neutron.common import exceptions as n_exc
 from neutron.db import models_v2
 import neutron.ipam as ipam
 from neutron.ipam import driver
+from neutron.ipam import utils as ipam_utils
 from neutron.openstack.common import uuidutils
 
 
@@ -36,41 +37,56 @@ class SubnetAllocator(driver.Pool):
     def __init__(self, subnetpool):
         self._subnetpool = subnetpool
         self._sp_helper = SubnetPoolHelper()
+        # The number of prefixes of each length allocated to each tenant
+        self._tenant_usage = None
 
-    def _get_allocated_cidrs(self, session):
+    def _get_free_prefixes(self, session):
+        """Return the free prefixes of the pool, counting the allocations.
+
+        The allocated prefixes are read once, and locked, to build both the
+        free prefixes and the usage of the tenants.
+        """
+        self._tenant_usage = collections.defaultdict(collections.Counter)
         query = session.query(
-            models_v2.Subnet).with_lockmode('update')
-        subnets = query.filter_by(subnetpool_id=self._subnetpool['id'])
-        return (x.cidr for x in subnets)
-
-    def _get_available_prefix_list(self, session):
-        prefixes = (x.cidr for x in self._subnetpool.prefixes)
-        allocations = self._get_allocated_cidrs(session)
-        prefix_set = netaddr.IPSet(iterable=prefixes)
-        allocation_set = netaddr.IPSet(iterable=allocations)
-        available_set = prefix_set.difference(allocation_set)
-        available_set.compact()
-        return sorted(available_set.iter_cidrs(),
-                      key=operator.attrgetter('prefixlen'),
-                      reverse=True)
+            models_v2.Subnet.cidr,
+            models_v2.Subnet.tenant_id).with_lockmode('update')
+        allocations = []
+        for cidr, tenant_id in query.filter_by(
+                subnetpool_id=self._subnetpool['id']):
+            allocations.append(ipam_utils.prefix_to_range(cidr))
+            prefixlen = int(cidr.split('/')[1])
+            self._tenant_usage[tenant_id][prefixlen] += 1
+        allocations.sort()
+
+        bits = self._sp_helper.default_max_prefixlen(
+            self._subnetpool['ip_version'])
+        free_prefixes = ipam_utils.FreePrefixes(bits)
+        for prefix in self._subnetpool['prefixes']:
+            # The prefixes of a subnet pool dict are CIDRs, not models
+            cidr = getattr(prefix, 'cidr', prefix)
+            first, last = ipam_utils.prefix_to_range(cidr)
+            for free_range in ipam_utils.subtract_ranges(first, last,
+                                                         allocations):
+                free_prefixes.add_range(*free_range)
+        return free_prefixes
 
     def _num_quota_units_in_prefixlen(self, prefixlen, quota_unit):
         return math.pow(2, quota_unit - prefixlen)
 
     def _allocations_used_by_tenant(self, session, quota_unit):
-        subnetpool_id = self._subnetpool['id']
         tenant_id = self._subnetpool['tenant_id']
-        with session.begin(subtransactions=True):
-            qry = session.query(
-                 models_v2.Subnet).with_lockmode('update')
-            allocations = qry.filter_by(subnetpool_id=subnetpool_id,
-                                        tenant_id=tenant_id)
-            value = 0
-            for allocation in allocations:
-                prefixlen = netaddr.IPNetwork(allocation.cidr).prefixlen
-                value += self._num_quota_units_in_prefixlen(prefixlen,
-                                                            quota_unit)
-            return value
+        if self._tenant_usage is not None:
+            usage = self._tenant_usage[tenant_id]
+        else:
+            # Only count the prefixes of the tenant, without locking them
+            usage = collections.Counter()
+            query = session.query(models_v2.Subnet.cidr).filter_by(
+                subnetpool_id=self._subnetpool['id'], tenant_id=tenant_id)
+            for cidr, in query:
+                usage[int(cidr.split('/')[1])] += 1
+        return sum(count * self._num_quota_units_in_prefixlen(prefixlen,
+                                                              quota_unit)
+                   for prefixlen, count in usage.items())
 
     def _check_subnetpool_tenant_quota(self, session, tenant_id, prefixlen):
         quota_unit = self._sp_helper.ip_version_subnetpool_quota_unit(
@@ -87,35 +103,37 @@ class SubnetAllocator(driver.Pool):
 
     def _allocate_any_subnet(self, session, request):
         with session.begin(subtransactions=True):
+            free_prefixes = self._get_free_prefixes(session)
             self._check_subnetpool_tenant_quota(session,
                                                 request.tenant_id,
                                                 request.prefixlen)
-            prefix_pool = self._get_available_prefix_list(session)
-            for prefix in prefix_pool:
-                if request.prefixlen >= prefix.prefixlen:
-                    subnet = prefix.subnet(request.prefixlen).next()
-                    gateway_ip = request.gateway_ip
-                    if not gateway_ip:
-                        gateway_ip = subnet.network + 1
-
-                    return IpamSubnet(request.tenant_id,
-                                      request.subnet_id,
-                                      subnet.cidr,
-                                      gateway_ip=gateway_ip,
-                                      allocation_pools=None)
+            first = free_prefixes.allocate(request.prefixlen)
+            if first is not None:
+                subnet = netaddr.IPNetwork('%s/%s' % (
+                    netaddr.IPAddress(first, self._subnetpool['ip_version']),
+                    request.prefixlen))
+                gateway_ip = request.gateway_ip
+                if not gateway_ip:
+                    gateway_ip = subnet.network + 1
+
+                return IpamSubnet(request.tenant_id,
+                                  request.subnet_id,
+                                  subnet.cidr,
+                                  gateway_ip=gateway_ip,
+                                  allocation_pools=None)
             msg = _("Insufficient prefix space to allocate subnet size /%s")
             raise n_exc.SubnetAllocationError(reason=msg %
                                               str(request.prefixlen))
 
     def _allocate_specific_subnet(self, session, request):
         with session.begin(subtransactions=True):
+            free_prefixes = self._get_free_prefixes(session)
             self._check_subnetpool_tenant_quota(session,
                                                 request.tenant_id,
                                                 request.prefixlen)
             subnet = request.subnet
-            available = self._get_available_prefix_list(session)
-            matched = netaddr.all_matching_cidrs(subnet, available)
-            if len(matched) is 1 and matched[0].prefixlen <= subnet.prefixlen:
+            if free_prefixes.allocate_specific(subnet.first,
+                                               subnet.prefixlen):
                 return IpamSubnet(request.tenant_id,
                                   request.subnet_id,
                                   subnet.cidr,
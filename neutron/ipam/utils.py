@@ -0,0 +1,184 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Arithmetic on ranges of IP addresses represented by integers.
+
+Sorting integers and sweeping ranges is much cheaper than building
+netaddr.IPSet objects, whose size grows with the number of addresses.
+"""
+
+import binascii
+import bisect
+import heapq
+import itertools
+import socket
+
+
+def ip_to_int(ip_address):
+    """Return the integer value of an IPv4 or IPv6 address string."""
+    family = socket.AF_INET6 if ':' in ip_address else socket.AF_INET
+    return int(binascii.hexlify(socket.inet_pton(family, ip_address)), 16)
+
+
+def prefix_to_range(cidr):
+    """Return the (first, last) integer range of a CIDR string."""
+    ip_address, prefixlen = cidr.split('/')
+    bits = 128 if ':' in ip_address else 32
+    first = ip_to_int(ip_address)
+    return first, first + (1 << bits - int(prefixlen)) - 1
+
+
+def range_to_prefixes(first, last, bits):
+    """Yield the (first, prefixlen) prefixes which cover a range exactly.
+
+    :param bits: the number of bits of the addresses, 32 or 128.
+    """
+    while first <= last:
+        # The largest prefix aligned on first which fits in the range
+        size = first & -first if first else 1 << bits
+        while size > last - first + 1:
+            size >>= 1
+        yield first, bits + 1 - size.bit_length()
+        first += size
+
+
+def subtract_ranges(first, last, ranges):
+    """Yield the (first, last) ranges of a range not covered by others.
+
+    :param ranges: (first, last) ranges which do not overlap, sorted.
+    """
+    for range_first, range_last in ranges:
+        if range_last < first:
+            continue
+        if range_first > last:
+            break
+        if range_first > first:
+            yield first, range_first - 1
+        first = max(first, range_last + 1)
+    if first <= last:
+        yield first, last
+
+
+def get_free_ranges(first, last, allocated):
+    """Yield the (first, last) ranges of addresses which are not allocated.
+
+    :param first: the integer value of the first address of the range.
+    :param last: the integer value of the last address of the range.
+    :param allocated: the sorted integer values of the allocated addresses,
+        which may lie outside of the range.
+    """
+    start = bisect.bisect_left(allocated, first)
+    end = bisect.bisect_right(allocated, last, start)
+    for ip in itertools.islice(allocated, start, end):
+        if ip > first:
+            yield first, ip - 1
+        first = ip + 1
+    if first <= last:
+        yield first, last
+
+
+def find_overlapping_ranges(ranges):
+    """Return the indexes of two overlapping ranges, or None.
+
+    :param ranges: a sequence of (first, last) integer ranges.
+    :returns: a sorted (index, index) tuple of the first overlap found when
+        sweeping the ranges by first address.
+    """
+    widest = None
+    for index in sorted(range(len(ranges)), key=lambda i: ranges[i]):
+        if widest is not None and ranges[index][0] <= ranges[widest][1]:
+            return tuple(sorted((widest, index)))
+        if widest is None or ranges[index][1] > ranges[widest][1]:
+            widest = index
+
+
+class FreePrefixes(object):
+    """The free prefixes of an address space, as a buddy allocator.
+
+    The free space is kept as the largest free prefixes, indexed by prefix
+    length, which are the free nodes of the binary tree of the prefixes of
+    the address space. Allocating a prefix splits the smallest free prefix
+    containing it, and releasing a prefix merges it with its free buddies,
+    both in O(prefix length).
+    """
+
+    def __init__(self, bits):
+        self.bits = bits
+        self._free = [set() for prefixlen in range(bits + 1)]
+        # The lowest free prefixes are allocated first, the heaps may hold
+        # prefixes which are no longer free
+        self._heaps = [[] for prefixlen in range(bits + 1)]
+
+    def _size(self, prefixlen):
+        return 1 << self.bits - prefixlen
+
+    def _add(self, first, prefixlen):
+        self._free[prefixlen].add(first)
+        heapq.heappush(self._heaps[prefixlen], first)
+
+    def _pop_lowest(self, prefixlen):
+        free = self._free[prefixlen]
+        heap = self._heaps[prefixlen]
+        while heap:
+            first = heapq.heappop(heap)
+            if first in free:
+                free.remove(first)
+                return first
+
+    def _split(self, first, prefixlen, target):
+        """Free the halves of a prefix which do not contain target."""
+        while prefixlen < target[1]:
+            prefixlen += 1
+            size = self._size(prefixlen)
+            if target[0] & size:
+                self._add(first, prefixlen)
+                first += size
+            else:
+                self._add(first + size, prefixlen)
+
+    def add_range(self, first, last):
+        """Release a range of addresses."""
+        for prefix in range_to_prefixes(first, last, self.bits):
+            self.release(*prefix)
+
+    def release(self, first, prefixlen):
+        """Release a prefix, merging it with its free buddies."""
+        while prefixlen > 0:
+            buddy = first ^ self._size(prefixlen)
+            if buddy not in self._free[prefixlen]:
+                break
+            self._free[prefixlen].remove(buddy)
+            first = min(first, buddy)
+            prefixlen -= 1
+        self._add(first, prefixlen)
+
+    def allocate(self, prefixlen):
+        """Allocate the lowest prefix of the smallest free prefix fitting it.
+
+        :returns: the first address of the prefix, or None if no free prefix
+            is large enough.
+        """
+        for free_prefixlen in range(prefixlen, -1, -1):
+            first = self._pop_lowest(free_prefixlen)
+            if first is not None:
+                self._split(first, free_prefixlen, (first, prefixlen))
+                return first
+
+    def allocate_specific(self, first, prefixlen):
+        """Allocate a prefix, return False if it is not entirely free."""
+        for free_prefixlen in range(prefixlen, -1, -1):
+            free_first = first & ~(self._size(free_prefixlen) - 1)
+            if free_first in self._free[free_prefixlen]:
+                self._free[free_prefixlen].remove(free_first)
+                self._split(free_first, free_prefixlen, (first, prefixlen))
+                return True
+        return False
@@ -18,7 +18,6 @@ import contextlib
 from eventlet import greenthread
 from oslo_concurrency import lockutils
 from oslo_config import cfg
-from oslo_db import api as oslo_db_api
 from oslo_db import exception as os_db_exception
 from oslo_log import log
 from oslo_serialization import jsonutils
@@ -544,12 +543,17 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
         objects = []
         collection = "%ss" % resource
         items = request_items[collection]
+        # The ports of a request share the lookups of their networks
+        creator_kwargs = {}
+        if resource == attributes.PORT:
+            creator_kwargs['networks'] = {}
         try:
             with context.session.begin(subtransactions=True):
                 obj_creator = getattr(self, '_create_%s_db' % resource)
                 for item in items:
                     attrs = item[resource]
-                    result, mech_context = obj_creator(context, item)
+                    result, mech_context = obj_creator(context, item,
+                                                       **creator_kwargs)
                     objects.append({'mech_context': mech_context,
                                     'result': result,
                                     'attributes': attrs})
@@ -603,8 +607,7 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
 
         return result, mech_context
 
-    @oslo_db_api.wrap_db_retry(max_retries=db_api.MAX_RETRIES,
-                               retry_on_request=True)
+    @db_api.retry_db_errors
     def _create_network_with_retries(self, context, network):
         return self._create_network_db(context, network)
 
@@ -783,6 +786,7 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
                           " failed"))
         self.notifier.network_delete(context, id)
 
+    @db_api.retry_db_errors
     def _create_subnet_db(self, context, subnet):
         session = context.session
         with session.begin(subtransactions=True):
@@ -828,8 +832,7 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
         self.mechanism_manager.update_subnet_postcommit(mech_context)
         return updated_subnet
 
-    @oslo_db_api.wrap_db_retry(max_retries=db_api.MAX_RETRIES,
-                               retry_on_request=True)
+    @db_api.retry_db_errors
     def delete_subnet(self, context, id):
         # REVISIT(rkukura) The super(Ml2Plugin, self).delete_subnet()
         # function is not used because it deallocates the subnet's addresses
@@ -904,6 +907,7 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
 
                     LOG.debug("Deleting subnet record")
                     session.delete(record)
+                    self._remove_ipam_subnet(context, id)
 
                     LOG.debug("Committing transaction")
                     break
@@ -952,7 +956,13 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
         elif attributes.is_attr_set(attrs.get(ext_sg.SECURITYGROUPS)):
             raise psec.PortSecurityAndIPRequiredForSecurityGroups()
 
-    def _create_port_db(self, context, port):
+    @db_api.retry_db_errors
+    def _create_port_db(self, context, port, networks=None):
+        """Create a port in the database.
+
+        :param networks: the network dicts by id, shared by the ports of a
+            bulk request.
+        """
         attrs = port[attributes.PORT]
         if not attrs.get('status'):
             attrs['status'] = const.PORT_STATUS_DOWN
@@ -967,7 +977,13 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
             # sgids must be got after portsec checked with security group
             sgids = self._get_security_groups_on_port(context, port)
             self._process_port_create_security_group(context, result, sgids)
-            network = self.get_network(context, result['network_id'])
+            if networks is None:
+                network = self.get_network(context, result['network_id'])
+            else:
+                network = networks.get(result['network_id'])
+                if network is None:
+                    network = self.get_network(context, result['network_id'])
+                    networks[result['network_id']] = network
             binding = db.add_port_binding(session, result['id'])
             mech_context = driver_context.PortContext(self, context, result,
                                                       network, binding, None)
@@ -1013,6 +1029,7 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
         return bound_context._port
 
     def create_port_bulk(self, context, ports):
+        self._generate_macs_for_ports(context, ports[attributes.PORTS])
         objects = self._create_bulk_ml2(attributes.PORT, context, ports)
 
         # REVISIT(rkukura): Is there any point in calling this before
@@ -1360,6 +1377,7 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
 
         return self._bind_port_if_needed(port_context)
 
+    @db_api.retry_db_errors
     def update_port_status(self, context, port_id, status, host=None):
         """
         Returns port_id (non-truncated uuid) if the port exists.
@@ -264,6 +264,10 @@ class BaseTestCase(DietTestCase):
             'neutron.common.exceptions.NeutronException.use_fatal_exceptions',
             fake_use_fatal_exceptions))
 
+        # Retry the DB errors without waiting
+        self.useFixture(fixtures.MonkeyPatch(
+            'neutron.db.api.RETRY_INTERVAL', 0))
+
         self.setup_rpc_mocks()
         self.setup_config()
 
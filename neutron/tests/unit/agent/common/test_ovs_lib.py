@@ -652,10 +652,16 @@ class OVS_Lib_Test(base.BaseTestCase):
     def test_delete_all_ports(self):
         with mock.patch.object(self.br, 'get_port_name_list',
                                return_value=['port1']) as get_port:
-            with mock.patch.object(self.br, 'delete_port') as delete_port:
-                self.br.delete_ports(all_ports=True)
+            self.br.delete_ports(all_ports=True)
         get_port.assert_called_once_with()
-        delete_port.assert_called_once_with('port1')
+        self._verify_vsctl_mock('--if-exists', 'del-port', self.BR_NAME,
+                                'port1')
+
+    def test_delete_all_ports_no_port(self):
+        with mock.patch.object(self.br, 'get_port_name_list',
+                               return_value=[]):
+            self.br.delete_ports(all_ports=True)
+        self.assertFalse(self.execute.called)
 
     def test_delete_neutron_ports(self):
         port1 = ovs_lib.VifPort('tap1234', 1, uuidutils.generate_uuid(),
@@ -664,13 +670,12 @@ class OVS_Lib_Test(base.BaseTestCase):
                                 'ca:ee:de:ad:be:ef', 'br')
         with mock.patch.object(self.br, 'get_vif_ports',
                                return_value=[port1, port2]) as get_ports:
-            with mock.patch.object(self.br, 'delete_port') as delete_port:
-                self.br.delete_ports(all_ports=False)
+            self.br.delete_ports(all_ports=False)
         get_ports.assert_called_once_with()
-        delete_port.assert_has_calls([
-            mock.call('tap1234'),
-            mock.call('tap5678')
-        ])
+        # Both ports are deleted by a single ovs-vsctl call
+        self._verify_vsctl_mock('--if-exists', 'del-port', self.BR_NAME,
+                                'tap1234', '--', '--if-exists', 'del-port',
+                                self.BR_NAME, 'tap5678')
 
     def test_delete_neutron_ports_list_error(self):
         expected_calls_and_values = [
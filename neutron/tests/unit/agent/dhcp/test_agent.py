@@ -15,6 +15,7 @@
 
 import contextlib
 import copy
+import os
 import sys
 import uuid
 
@@ -22,6 +23,7 @@ import eventlet
 import mock
 from oslo_config import cfg
 import oslo_messaging
+from oslo_serialization import jsonutils
 import testtools
 
 from neutron.agent.common import config
@@ -271,6 +273,44 @@ class TestDhcpAgent(base.BaseTestCase):
                 mocks['sync_state'].assert_called_once_with()
                 mocks['periodic_resync'].assert_called_once_with()
 
+    def test_run_syncs_in_background_after_adoption(self):
+        with mock.patch(DEVICE_MANAGER):
+            dhcp = dhcp_agent.DhcpAgent(HOSTNAME)
+            attrs_to_mock = dict(
+                [(a, mock.DEFAULT) for a in
+                 ['sync_state', 'periodic_resync', '_adopt_cached_networks']])
+            with contextlib.nested(
+                mock.patch.multiple(dhcp, **attrs_to_mock),
+                mock.patch.object(dhcp_agent.eventlet, 'spawn_n')
+            ) as (mocks, spawn_n):
+                mocks['_adopt_cached_networks'].return_value = 1
+                dhcp.run()
+                spawn_n.assert_called_once_with(mocks['sync_state'])
+                self.assertFalse(mocks['sync_state'].called)
+                mocks['periodic_resync'].assert_called_once_with()
+
+    def test_adopt_cached_networks(self):
+        dhcp = dhcp_agent.DhcpAgent(HOSTNAME)
+        dhcp.cache.put(fake_network)
+        # Networks without a snapshot are left to the sync
+        dhcp.cache.put(dhcp_agent.dhcp.NetModel(True, {'id': 'bbb',
+                                                       'subnets': [],
+                                                       'ports': []}))
+        self.driver.should_enable_metadata.return_value = False
+        self.driver.return_value.adopt.return_value = True
+        self.assertEqual(1, dhcp._adopt_cached_networks())
+        self.driver.assert_called_once_with(cfg.CONF, fake_network,
+                                            mock.ANY, mock.ANY, mock.ANY)
+
+    def test_adopt_cached_networks_not_running(self):
+        dhcp = dhcp_agent.DhcpAgent(HOSTNAME)
+        dhcp.cache.put(fake_network)
+        self.driver.return_value.adopt.return_value = False
+        with mock.patch.object(dhcp,
+                               'enable_isolated_metadata_proxy') as enable:
+            self.assertEqual(0, dhcp._adopt_cached_networks())
+            self.assertFalse(enable.called)
+
     def test_call_driver(self):
         network = mock.Mock()
         network.id = '1'
@@ -429,6 +469,26 @@ class TestDhcpAgent(base.BaseTestCase):
 
         self.assertEqual(set(networks), set(dhcp.cache.get_network_ids()))
 
+    def test_populate_cache_on_start_from_snapshot(self):
+        self.driver.existing_dhcp_networks.return_value = [
+            fake_network.id, 'bbb']
+        snapshots = {fake_network.id: jsonutils.dumps(fake_network),
+                     'bbb': 'not json'}
+
+        def get_value_from_file(filename):
+            return snapshots[os.path.basename(os.path.dirname(filename))]
+
+        with mock.patch.object(dhcp_agent.linux_utils, 'get_value_from_file',
+                               side_effect=get_value_from_file):
+            dhcp = dhcp_agent.DhcpAgent(HOSTNAME)
+
+        network = dhcp.cache.get_network_by_id(fake_network.id)
+        self.assertEqual(fake_network, network)
+        self.assertEqual(fake_network.namespace, network.namespace)
+        self.assertEqual(network,
+                         dhcp.cache.get_network_by_port_id(fake_port1.id))
+        self.assertEqual([], dhcp.cache.get_network_by_id('bbb').subnets)
+
     def test_none_interface_driver(self):
         cfg.CONF.set_override('interface_driver', None)
         with mock.patch.object(dhcp, 'LOG') as log:
@@ -532,6 +592,7 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
                               'neutron.agent.linux.interface.NullDriver')
         cfg.CONF.register_opts(dhcp_config.DHCP_AGENT_OPTS)
         cfg.CONF.register_opts(dhcp_config.DHCP_OPTS)
+        cfg.CONF.set_override('notification_coalescing_interval', 0)
 
         self.plugin_p = mock.patch(DHCP_PLUGIN)
         plugin_cls = self.plugin_p.start()
@@ -646,6 +707,38 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
     def test_enable_dhcp_helper(self):
         self._enable_dhcp_helper(fake_network)
 
+    def _configure_network_with_revision(self, cached_revision, active):
+        network = copy.deepcopy(fake_network)
+        network.revision = 'rev1'
+        self.cache.get_network_by_id.return_value = dhcp.NetModel(
+            True, {'id': network.id, 'revision': cached_revision})
+        self.dhcp.dhcp_driver_cls = mock.Mock()
+        self.dhcp.dhcp_driver_cls.return_value.active = active
+        self.dhcp.dhcp_driver_cls.should_enable_metadata.return_value = False
+        with mock.patch.object(dhcp_agent.linux_utils,
+                               'replace_file') as replace_file:
+            self.dhcp.configure_dhcp_for_network(network)
+            replace_file.assert_called_once_with(
+                os.path.join(cfg.CONF.dhcp_confs, network.id, 'network'),
+                mock.ANY)
+            snapshot = jsonutils.loads(replace_file.call_args[0][1])
+            self.assertEqual('rev1', snapshot['revision'])
+            self.assertNotIn('_ns_name', snapshot)
+        return network
+
+    def test_configure_dhcp_for_network_unchanged_revision(self):
+        network = self._configure_network_with_revision('rev1', True)
+        self.call_driver.assert_called_once_with('reload_allocations',
+                                                 network)
+
+    def test_configure_dhcp_for_network_changed_revision(self):
+        network = self._configure_network_with_revision('rev0', True)
+        self.call_driver.assert_called_once_with('enable', network)
+
+    def test_configure_dhcp_for_network_inactive_driver(self):
+        network = self._configure_network_with_revision('rev1', False)
+        self.call_driver.assert_called_once_with('enable', network)
+
     def test_enable_dhcp_helper_ipv6_network(self):
         self._enable_dhcp_helper(fake_network_ipv6)
 
@@ -953,6 +1046,49 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
         self.call_driver.assert_has_calls(
             [mock.call.call_driver('reload_allocations', fake_network)])
 
+    def test_port_events_save_snapshot(self):
+        self.cache.get_network_by_id.return_value = fake_network
+        self.cache.get_port_by_id.return_value = fake_port2
+        with mock.patch.object(self.dhcp,
+                               '_save_network_snapshot') as save_snapshot:
+            self.dhcp.port_update_end(None, dict(port=fake_port2))
+            self.dhcp.port_delete_end(None, dict(port_id=fake_port2.id))
+            self.assertEqual([mock.call(fake_network)] * 2,
+                             save_snapshot.call_args_list)
+
+            save_snapshot.reset_mock()
+            self.call_driver.return_value = False
+            self.dhcp.port_delete_end(None, dict(port_id=fake_port2.id))
+            self.assertFalse(save_snapshot.called)
+
+    def test_port_events_coalesced(self):
+        cfg.CONF.set_override('notification_coalescing_interval', 1)
+        self.cache.get_network_by_id.return_value = fake_network
+        self.cache.get_port_by_id.return_value = fake_port2
+        with mock.patch.object(self.dhcp._network_events,
+                               'queue_event') as queue_event:
+            self.dhcp.port_update_end(None, dict(port=fake_port2))
+            self.dhcp.port_delete_end(None, dict(port_id=fake_port2.id))
+            self.assertFalse(self.call_driver.called)
+            self.dhcp._process_network_events(
+                [c[0][0] for c in queue_event.call_args_list])
+        self.call_driver.assert_called_once_with('reload_allocations',
+                                                 fake_network)
+
+    def test_process_network_events(self):
+        other_network_id = 'other-network'
+        self.cache.get_network_by_id.return_value = fake_network
+        with mock.patch.object(self.dhcp,
+                               'refresh_dhcp_helper') as refresh:
+            self.dhcp._process_network_events([
+                (fake_network.id, 'reload_allocations'),
+                (fake_network.id, 'restart'),
+                (fake_network.id, 'reload_allocations'),
+                (other_network_id, 'reload_allocations'),
+                (other_network_id, 'refresh')])
+        refresh.assert_called_once_with(other_network_id)
+        self.call_driver.assert_called_once_with('restart', fake_network)
+
     def test_port_delete_end_unknown_port(self):
         payload = dict(port_id='unknown')
         self.cache.get_port_by_id.return_value = None
@@ -992,6 +1128,51 @@ class TestDhcpPluginApiProxy(base.BaseTestCase):
     def test_get_active_networks_info(self):
         self._test_dhcp_api('get_active_networks_info', version='1.1')
 
+    def test_get_active_networks_info_paged(self):
+        ctxt = context.get_admin_context()
+        proxy = dhcp_agent.DhcpPluginApi('foo', ctxt, None)
+        proxy.host = 'foo'
+        with contextlib.nested(
+            mock.patch.object(proxy.client, 'call'),
+            mock.patch.object(proxy.client, 'prepare'),
+        ) as (
+            rpc_mock, prepare_mock
+        ):
+            prepare_mock.return_value = proxy.client
+            rpc_mock.side_effect = [[{'id': 'a'}, {'id': 'b'}], [{'id': 'c'}]]
+            networks = proxy.get_active_networks_info(page_size=2)
+            self.assertEqual(['a', 'b', 'c'], [n.id for n in networks])
+            prepare_mock.assert_called_once_with(version='1.2')
+            rpc_mock.assert_has_calls([
+                mock.call(ctxt, 'get_active_networks_info', host='foo',
+                          limit=2, marker=None),
+                mock.call(ctxt, 'get_active_networks_info', host='foo',
+                          limit=2, marker='b')])
+
+    def test_get_active_networks_info_paging_unsupported(self):
+        ctxt = context.get_admin_context()
+        proxy = dhcp_agent.DhcpPluginApi('foo', ctxt, None)
+        proxy.host = 'foo'
+        with contextlib.nested(
+            mock.patch.object(proxy.client, 'call'),
+            mock.patch.object(proxy.client, 'prepare'),
+        ) as (
+            rpc_mock, prepare_mock
+        ):
+            prepare_mock.return_value = proxy.client
+            rpc_mock.side_effect = [
+                oslo_messaging.RemoteError('UnsupportedVersion'),
+                [{'id': 'a'}], [{'id': 'b'}]]
+            networks = proxy.get_active_networks_info(page_size=2)
+            self.assertEqual(['a'], [n.id for n in networks])
+            networks = proxy.get_active_networks_info(page_size=2)
+            self.assertEqual(['b'], [n.id for n in networks])
+            prepare_mock.assert_has_calls([mock.call(version='1.2'),
+                                           mock.call(version='1.1'),
+                                           mock.call(version='1.1')])
+            rpc_mock.assert_called_with(ctxt, 'get_active_networks_info',
+                                        host='foo')
+
     def test_get_network_info(self):
         self._test_dhcp_api('get_network_info', network_id='fake_id',
                             return_value=None)
@@ -1094,6 +1275,25 @@ class TestNetworkCache(base.BaseTestCase):
         nc.put_port(fake_port2)
         self.assertEqual(len(nc.port_lookup), 2)
         self.assertIn(fake_port2, fake_net.ports)
+        self.assertEqual(2, len(fake_net.ports))
+
+    def test_put_port_router_invalidates_derived(self):
+        fake_net = dhcp.NetModel(
+            True, dict(id='12345678-1234-5678-1234567890ab',
+                       tenant_id='aaaaaaaa-aaaa-aaaa-aaaaaaaaaaaa',
+                       subnets=[fake_subnet1],
+                       ports=[fake_port1]))
+        nc = dhcp_agent.NetworkCache()
+        nc.put(fake_net)
+        fake_net.derived['key'] = 'value'
+        port = copy.deepcopy(fake_port2)
+        port.device_owner = ''
+        nc.put_port(port)
+        self.assertIn('key', fake_net.derived)
+        port = copy.deepcopy(port)
+        port.device_owner = const.DEVICE_OWNER_ROUTER_INTF
+        nc.put_port(port)
+        self.assertEqual({}, fake_net.derived)
 
     def test_put_port_existing(self):
         fake_net = dhcp.NetModel(
@@ -1126,6 +1326,29 @@ class TestNetworkCache(base.BaseTestCase):
         nc.put(fake_network)
         self.assertEqual(nc.get_port_by_id(fake_port1.id), fake_port1)
 
+    def test_get_port_by_id_after_update(self):
+        fake_net = dhcp.NetModel(
+            True, dict(id='12345678-1234-5678-1234567890ab',
+                       tenant_id='aaaaaaaa-aaaa-aaaa-aaaaaaaaaaaa',
+                       subnets=[fake_subnet1],
+                       ports=[fake_port1]))
+        nc = dhcp_agent.NetworkCache()
+        nc.put(fake_net)
+        updated_port = copy.deepcopy(fake_port1)
+        updated_port.mac_address = 'aa:bb:cc:dd:ee:00'
+        nc.put_port(updated_port)
+        self.assertIs(updated_port, nc.get_port_by_id(fake_port1.id))
+        self.assertEqual([updated_port], fake_net.ports)
+
+        nc.remove_port(updated_port)
+        self.assertIsNone(nc.get_port_by_id(fake_port1.id))
+
+    def test_get_port_by_id_removed_network(self):
+        nc = dhcp_agent.NetworkCache()
+        nc.put(fake_network)
+        nc.remove(fake_network)
+        self.assertIsNone(nc.get_port_by_id(fake_port1.id))
+
 
 class FakePort1(object):
     id = 'eeeeeeee-eeee-eeee-eeee-eeeeeeeeeeee'
@@ -1562,6 +1785,29 @@ class TestDictModel(base.BaseTestCase):
         self.assertEqual(m.a[0].b, 2)
         self.assertEqual(m.a[1].c, 3)
 
+    def test_no_instance_dict(self):
+        m = dhcp.DictModel(a=1)
+        self.assertFalse(hasattr(m, '__dict__'))
+        m.b = 2
+        self.assertEqual({'a': 1, 'b': 2}, m)
+
+    def test_shared_values(self):
+        ports = [dhcp.DictModel(network_id=''.join(['net', 'id']),
+                                name=''.join(['na', 'me']))
+                 for i in range(2)]
+        self.assertIs(ports[0].network_id, ports[1].network_id)
+        self.assertIsNot(ports[0].name, ports[1].name)
+
+    def test_shared_unicode_values(self):
+        ports = [dhcp.DictModel(jsonutils.loads('{"tenant_id": "tenant"}'))
+                 for i in range(2)]
+        self.assertEqual('tenant', ports[0].tenant_id)
+        self.assertIs(ports[0].tenant_id, ports[1].tenant_id)
+
+    def test_non_ascii_values_not_shared(self):
+        port = dhcp.DictModel(device_owner=u'\u00e9')
+        self.assertEqual(u'\u00e9', port.device_owner)
+
 
 class TestNetModel(base.BaseTestCase):
     def test_ns_name(self):
@@ -1575,3 +1821,17 @@ class TestNetModel(base.BaseTestCase):
     def test_ns_name_none_namespace(self):
         network = dhcp.NetModel(None, {'id': 'foo'})
         self.assertIsNone(network.namespace)
+
+    def test_derived_not_copied(self):
+        network = dhcp.NetModel(True, {'id': 'foo'})
+        network.derived['key'] = 'value'
+        self.assertNotIn('key', copy.deepcopy(network).derived)
+        self.assertNotIn('key', jsonutils.loads(jsonutils.dumps(network)))
+
+    def test_derived_shared_by_copy(self):
+        network = dhcp.NetModel(True, {'id': 'foo'})
+        network.derived['key'] = 'value'
+        copied = dhcp.NetModel(False, network)
+        self.assertIs(network.derived, copied.derived)
+        network.invalidate_derived()
+        self.assertEqual({}, network.derived)
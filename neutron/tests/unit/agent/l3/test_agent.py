@@ -1126,7 +1126,8 @@ class TestBasicRouterOperations(BasicRouterOperationsFramework):
 
         ri.add_floating_ip = mock.Mock(
             return_value=l3_constants.FLOATINGIP_STATUS_ACTIVE)
-        with mock.patch.object(lla.LinkLocalAllocator, '_write'):
+        with mock.patch.object(lla.LinkLocalAllocator, '_write'),\
+                mock.patch.object(lla.LinkLocalAllocator, '_append'):
             if ri.router['distributed']:
                 ri.fip_ns = agent.get_fip_ns(ex_gw_port['network_id'])
                 ri.create_dvr_fip_interfaces(ex_gw_port)
@@ -1164,8 +1165,9 @@ class TestBasicRouterOperations(BasicRouterOperationsFramework):
             agent_gateway_port[0],
             ri.get_floating_agent_gw_interface(fake_network_id))
 
+    @mock.patch.object(lla.LinkLocalAllocator, '_append')
     @mock.patch.object(lla.LinkLocalAllocator, '_write')
-    def test_create_dvr_fip_interfaces(self, lla_write):
+    def test_create_dvr_fip_interfaces(self, lla_write, lla_append):
         fake_network_id = _uuid()
         subnet_id = _uuid()
         fake_floatingips = {'floatingips': [
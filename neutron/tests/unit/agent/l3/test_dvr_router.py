@@ -57,9 +57,8 @@ class TestDvrRouterOperations(base.BaseTestCase):
         self.assertEqual([{'host': mock.sentinel.myhost}], fips)
 
     @mock.patch.object(ip_lib, 'send_garp_for_proxyarp')
-    @mock.patch.object(ip_lib, 'IPDevice')
-    @mock.patch.object(ip_lib, 'IPRule')
-    def test_floating_ip_added_dist(self, mIPRule, mIPDevice, mock_arp):
+    @mock.patch.object(ip_lib, 'IPBatch')
+    def test_floating_ip_added_dist(self, mIPBatch, mock_arp):
         router = mock.MagicMock()
         ri = self._create_router(router)
         ext_net_id = _uuid()
@@ -87,14 +86,17 @@ class TestDvrRouterOperations(base.BaseTestCase):
         ri.dist_fip_count = 0
         ip_cidr = common_utils.ip_to_cidr(fip['floating_ip_address'])
         ri.floating_ip_added_dist(fip, ip_cidr)
-        mIPRule().rule.add.assert_called_with('192.168.0.1', 16, FIP_PRI)
+        mIPBatch().add_rule.assert_called_with('192.168.0.1', 16, FIP_PRI)
+        mIPBatch().add_route.assert_called_with(
+            ip_cidr, '169.254.30.42', ri.fip_ns.get_int_device_name())
+        self.assertEqual(2, mIPBatch().execute.call_count)
         self.assertEqual(1, ri.dist_fip_count)
         # TODO(mrsmith): add more asserts
 
     @mock.patch.object(ip_lib, 'IPWrapper')
     @mock.patch.object(ip_lib, 'IPDevice')
-    @mock.patch.object(ip_lib, 'IPRule')
-    def test_floating_ip_removed_dist(self, mIPRule, mIPDevice, mIPWrapper):
+    @mock.patch.object(ip_lib, 'IPBatch')
+    def test_floating_ip_removed_dist(self, mIPBatch, mIPDevice, mIPWrapper):
         router = mock.MagicMock()
         ri = self._create_router(router)
 
@@ -120,9 +122,10 @@ class TestDvrRouterOperations(base.BaseTestCase):
         s = lla.LinkLocalAddressPair('169.254.30.42/31')
         ri.rtr_fip_subnet = s
         ri.floating_ip_removed_dist(fip_cidr)
-        mIPRule().rule.delete.assert_called_with(
+        mIPBatch().delete_rule.assert_called_with(
             str(netaddr.IPNetwork(fip_cidr).ip), 16, FIP_PRI)
-        mIPDevice().route.delete_route.assert_called_with(fip_cidr, str(s.ip))
+        mIPBatch().delete_route.assert_called_with(
+            fip_cidr, str(s.ip), ri.fip_ns.get_int_device_name())
         self.assertFalse(ri.fip_ns.unsubscribe.called)
 
         ri.dist_fip_count = 1
@@ -139,6 +142,55 @@ class TestDvrRouterOperations(base.BaseTestCase):
             str(fip_to_rtr.ip), table=16)
         fip_ns.unsubscribe.assert_called_once_with(ri.router_id)
 
+    @mock.patch.object(ip_lib, 'IPBatch')
+    def test_batched_ip_commands_run_once_per_namespace(self, mIPBatch):
+        ri = self._create_router(mock.MagicMock())
+        batches = {}
+
+        def _batch(namespace):
+            batches[namespace] = mock.Mock()
+            return batches[namespace]
+
+        mIPBatch.side_effect = _batch
+        with ri._batched_ip_commands():
+            with ri._batched_ip_commands():
+                ri._get_ip_batch('ns1').add_rule('10.0.0.1', 16, FIP_PRI)
+            ri._get_ip_batch('ns1').add_rule('10.0.0.2', 16, FIP_PRI + 1)
+            ri._get_ip_batch('ns2').add_route('1.2.3.4/32', '169.254.30.42',
+                                              'fpr-1')
+            self.assertFalse(batches['ns1'].execute.called)
+
+        self.assertEqual(2, batches['ns1'].add_rule.call_count)
+        batches['ns1'].execute.assert_called_once_with()
+        batches['ns2'].execute.assert_called_once_with()
+        self.assertIsNone(ri._ip_batches)
+
+    @mock.patch.object(ip_lib, 'IPBatch')
+    def test_batched_ip_commands_not_run_on_error(self, mIPBatch):
+        ri = self._create_router(mock.MagicMock())
+
+        def _fail():
+            with ri._batched_ip_commands():
+                ri._get_ip_batch('ns1').add_rule('10.0.0.1', 16, FIP_PRI)
+                raise RuntimeError()
+
+        self.assertRaises(RuntimeError, _fail)
+        self.assertFalse(mIPBatch().execute.called)
+        self.assertIsNone(ri._ip_batches)
+
+    @mock.patch.object(router_info.RouterInfo,
+                       'process_floating_ip_addresses')
+    def test_process_floating_ip_addresses_batched(self, super_process):
+        ri = self._create_router(mock.MagicMock())
+        ri._flush_ip_batches = mock.Mock()
+        super_process.side_effect = (
+            lambda interface_name: self.assertEqual({}, ri._ip_batches))
+
+        ri.process_floating_ip_addresses(mock.sentinel.interface_name)
+
+        super_process.assert_called_once_with(mock.sentinel.interface_name)
+        ri._flush_ip_batches.assert_called_once_with()
+
     def _test_add_floating_ip(self, ri, fip, is_failure):
         ri._add_fip_addr_to_device = mock.Mock(return_value=is_failure)
         ri.floating_ip_added_dist = mock.Mock()
@@ -0,0 +1,156 @@
+# Copyright (c) 2015 Openstack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import socket
+import struct
+
+import mock
+
+from neutron.agent.l3 import ha
+from neutron.agent.linux import ip_monitor
+from neutron.tests import base
+
+
+def _rtattr(attr_type, value):
+    length = ha.RTATTR.size + len(value)
+    padding = b'\0' * (ha._nl_align(length) - length)
+    return ha.RTATTR.pack(length, attr_type) + value + padding
+
+
+def _address_message(msg_type, interface, ip_address, prefixlen):
+    payload = (struct.pack('=BBBBL', socket.AF_INET, prefixlen, 0, 0, 3) +
+               _rtattr(ha.IFA_ADDRESS, socket.inet_aton(ip_address)) +
+               _rtattr(ha.IFA_LOCAL, socket.inet_aton(ip_address)) +
+               _rtattr(ha.IFA_LABEL, interface.encode('ascii') + b'\0'))
+    return ha.NLMSGHDR.pack(ha.NLMSGHDR.size + len(payload), msg_type, 0, 0,
+                            0) + payload
+
+
+def _event(added, cidr='169.254.0.1/24'):
+    return ip_monitor.IPMonitorEvent('line', added, 'ha-1234', cidr)
+
+
+class TestParseAddressEvents(base.BaseTestCase):
+    def test_parse_added_and_deleted(self):
+        data = (_address_message(ha.RTM_NEWADDR, 'ha-1234', '169.254.0.1',
+                                 24) +
+                _address_message(ha.RTM_DELADDR, 'qr-5678', '10.0.0.1', 24))
+        events = ha.parse_address_events(data)
+        self.assertEqual([(True, 'ha-1234', '169.254.0.1/24'),
+                          (False, 'qr-5678', '10.0.0.1/24')],
+                         [(event.added, event.interface, event.cidr)
+                          for event in events])
+
+    def test_parse_ignores_other_messages(self):
+        data = (ha.NLMSGHDR.pack(ha.NLMSGHDR.size, 3, 0, 0, 0) +
+                _address_message(ha.RTM_NEWADDR, 'ha-1234', '169.254.0.1',
+                                 24))
+        self.assertEqual(['ha-1234 inet 169.254.0.1/24'],
+                         [str(event) for event in
+                          ha.parse_address_events(data)])
+
+    def test_parse_truncated_message(self):
+        self.assertEqual([], ha.parse_address_events(b'\0' * 8))
+
+
+class TestHaStateChangeMonitor(base.BaseTestCase):
+    def setUp(self):
+        super(TestHaStateChangeMonitor, self).setUp()
+        self.enter_namespace = mock.patch(
+            'neutron.agent.linux.ip_lib.enter_namespace').start()
+        self.socket = mock.patch.object(ha.green_socket, 'socket').start()
+        self.select = mock.patch.object(ha.green_select, 'select').start()
+        self.spawn = mock.patch('eventlet.spawn').start()
+        self.state_monitor = ha.HaStateChangeMonitor()
+        self.callback = mock.Mock()
+
+    def _watch(self, router_id='r1'):
+        self.state_monitor.watch(router_id, 'qrouter-%s' % router_id,
+                                 'ha-1234', '169.254.0.1/24', self.callback)
+
+    def test_watch_opens_socket_in_router_namespace(self):
+        self._watch()
+        self.enter_namespace.assert_called_once_with('qrouter-r1')
+        self.socket.assert_called_once_with(
+            socket.AF_NETLINK, socket.SOCK_RAW, ha.NETLINK_ROUTE)
+        self.socket.return_value.bind.assert_called_once_with(
+            (0, ha.RTMGRP_IPV4_IFADDR))
+        self.assertTrue(self.state_monitor.is_watched('r1'))
+
+    def test_watch_namespace_error(self):
+        self.enter_namespace.side_effect = OSError(1, 'EPERM')
+        self.assertRaises(OSError, self._watch)
+        self.assertFalse(self.state_monitor.is_watched('r1'))
+
+    def test_watch_bind_error_closes_socket(self):
+        self.socket.return_value.bind.side_effect = socket.error()
+        self.assertRaises(socket.error, self._watch)
+        self.socket.return_value.close.assert_called_once_with()
+
+    def test_single_dispatcher_for_all_routers(self):
+        self._watch('r1')
+        self._watch('r2')
+        self.spawn.assert_called_once_with(self.state_monitor._dispatch)
+
+    def test_unwatch_closes_socket_on_dispatch(self):
+        self._watch()
+        self.state_monitor.unwatch('r1')
+        self.assertFalse(self.state_monitor.is_watched('r1'))
+        self.assertFalse(self.socket.return_value.close.called)
+        with mock.patch('eventlet.sleep'):
+            self.state_monitor.dispatch_events()
+        self.socket.return_value.close.assert_called_once_with()
+        self.assertFalse(self.select.called)
+
+    def test_unwatch_unknown_router(self):
+        self.state_monitor.unwatch('r1')
+        self.assertFalse(self.socket.return_value.close.called)
+
+    def test_dispatch_events(self):
+        self._watch()
+        sock = self.socket.return_value
+        self.select.return_value = ([sock], [], [])
+        sock.recv.return_value = _address_message(
+            ha.RTM_NEWADDR, 'ha-1234', '169.254.0.1', 24)
+        self.state_monitor.dispatch_events()
+        self.select.assert_called_once_with([sock], [], [],
+                                            ha.DISPATCH_INTERVAL)
+        self.callback.assert_called_once_with('master')
+
+    def test_dispatch_events_read_error(self):
+        self._watch()
+        sock = self.socket.return_value
+        self.select.return_value = ([sock], [], [])
+        sock.recv.side_effect = socket.error()
+        self.state_monitor.dispatch_events()
+        self.assertFalse(self.callback.called)
+
+    def test_handle_event_master(self):
+        self._watch()
+        self.state_monitor.handle_event('r1', _event(True))
+        self.callback.assert_called_once_with('master')
+
+    def test_handle_event_backup(self):
+        self._watch()
+        self.state_monitor.handle_event('r1', _event(False))
+        self.callback.assert_called_once_with('backup')
+
+    def test_handle_event_ignores_other_cidrs(self):
+        self._watch()
+        self.state_monitor.handle_event('r1', _event(True, '10.0.0.1/24'))
+        self.assertFalse(self.callback.called)
+
+    def test_handle_event_ignores_unwatched_router(self):
+        self.state_monitor.handle_event('r1', _event(True))
+        self.assertFalse(self.callback.called)
@@ -46,3 +46,72 @@ class TestBasicRouterOperations(base.BaseTestCase):
         addresses = ['15.1.2.2/24', '15.1.2.3/32']
         ri._get_cidrs_from_keepalived = mock.MagicMock(return_value=addresses)
         self.assertEqual(set(addresses), ri.get_router_cidrs(device))
+
+    def test_spawn_state_change_monitor_with_consolidated_monitor(self):
+        state_change_monitor = mock.Mock()
+        ri = self._create_router(state_change_monitor=state_change_monitor)
+        ri.ha_port = {'id': _uuid()}
+        ri.driver = mock.Mock(DEV_NAME_LEN=14)
+        ri._get_primary_vip = mock.Mock(return_value='169.254.0.1/24')
+        process_monitor = mock.Mock()
+
+        ri.spawn_state_change_monitor(process_monitor)
+
+        state_change_monitor.watch.assert_called_once_with(
+            self.router_id, ri.ns_name, ri.get_ha_device_name(),
+            '169.254.0.1/24', ri._handle_state_change)
+        self.assertFalse(process_monitor.register.called)
+
+    def test_spawn_state_change_monitor_falls_back_to_process(self):
+        state_change_monitor = mock.Mock()
+        state_change_monitor.watch.side_effect = OSError(1, 'EPERM')
+        ri = self._create_router(state_change_monitor=state_change_monitor)
+        ri.ha_port = {'id': _uuid()}
+        ri.driver = mock.Mock(DEV_NAME_LEN=14)
+        ri._get_primary_vip = mock.Mock(return_value='169.254.0.1/24')
+        process_monitor = mock.Mock()
+
+        with mock.patch.object(
+                ri, '_get_state_change_monitor_process_manager') as get_pm:
+            ri.spawn_state_change_monitor(process_monitor)
+
+        get_pm.return_value.enable.assert_called_once_with()
+        process_monitor.register.assert_called_once_with(
+            self.router_id, ha_router.IP_MONITOR_PROCESS_SERVICE,
+            get_pm.return_value)
+
+    def test_destroy_state_change_monitor_with_consolidated_monitor(self):
+        state_change_monitor = mock.Mock()
+        state_change_monitor.is_watched.return_value = True
+        ri = self._create_router(state_change_monitor=state_change_monitor)
+        process_monitor = mock.Mock()
+
+        ri.destroy_state_change_monitor(process_monitor)
+
+        state_change_monitor.unwatch.assert_called_once_with(self.router_id)
+        self.assertFalse(process_monitor.unregister.called)
+
+    def test_destroy_state_change_monitor_of_unwatched_router(self):
+        state_change_monitor = mock.Mock()
+        state_change_monitor.is_watched.return_value = False
+        ri = self._create_router(state_change_monitor=state_change_monitor)
+        process_monitor = mock.Mock()
+
+        with mock.patch.object(
+                ri, '_get_state_change_monitor_process_manager') as get_pm:
+            ri.destroy_state_change_monitor(process_monitor)
+
+        self.assertFalse(state_change_monitor.unwatch.called)
+        process_monitor.unregister.assert_called_once_with(
+            self.router_id, ha_router.IP_MONITOR_PROCESS_SERVICE)
+        get_pm.return_value.disable.assert_called_once_with()
+
+    def test_handle_state_change_writes_state_and_notifies(self):
+        callback = mock.Mock()
+        ri = self._create_router()
+        ri.state_change_callback = callback
+        with mock.patch.object(ha_router.HaRouter, 'ha_state',
+                               new_callable=mock.PropertyMock) as ha_state:
+            ri._handle_state_change('master')
+            ha_state.assert_called_once_with('master')
+        callback.assert_called_once_with(self.router_id, 'master')
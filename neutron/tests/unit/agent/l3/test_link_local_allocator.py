@@ -12,6 +12,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
+
 import mock
 import netaddr
 
@@ -37,28 +39,44 @@ class TestLinkLocalAddrAllocator(base.BaseTestCase):
         self.assertTrue('da873ca2' in a.remembered)
         self.assertEqual({}, a.allocations)
 
+    def test__init__readfile_journal(self):
+        with contextlib.nested(
+            mock.patch.object(lla.LinkLocalAllocator, '_read'),
+            mock.patch.object(lla.LinkLocalAllocator, '_write')
+        ) as (read, write):
+            read.return_value = ["da873ca2,169.254.31.28/31\n",
+                                 "deadbeef,169.254.31.30/31\n",
+                                 "da873ca2,\n"]
+            a = lla.LinkLocalAllocator('/file', self.subnet.cidr)
+
+        self.assertEqual(['deadbeef'], list(a.remembered))
+        self.assertIn(netaddr.IPNetwork('169.254.31.28/31'), a.pool)
+        self.assertNotIn(netaddr.IPNetwork('169.254.31.30/31'), a.pool)
+        # The journal is compacted
+        write.assert_called_once_with(['deadbeef,169.254.31.30/31\n'])
+
     def test_allocate(self):
         a = lla.LinkLocalAllocator('/file', self.subnet.cidr)
-        with mock.patch.object(lla.LinkLocalAllocator, '_write') as write:
+        with mock.patch.object(lla.LinkLocalAllocator, '_append') as append:
             subnet = a.allocate('deadbeef')
 
         self.assertTrue('deadbeef' in a.allocations)
         self.assertTrue(subnet not in a.pool)
         self._check_allocations(a.allocations)
-        write.assert_called_once_with(['deadbeef,%s\n' % subnet.cidr])
+        append.assert_called_once_with(['deadbeef,%s\n' % subnet.cidr])
 
     def test_allocate_from_file(self):
         with mock.patch.object(lla.LinkLocalAllocator, '_read') as read:
             read.return_value = ["deadbeef,169.254.31.88/31\n"]
             a = lla.LinkLocalAllocator('/file', self.subnet.cidr)
 
-        with mock.patch.object(lla.LinkLocalAllocator, '_write') as write:
+        with mock.patch.object(lla.LinkLocalAllocator, '_append') as append:
             subnet = a.allocate('deadbeef')
 
         self.assertEqual(netaddr.IPNetwork('169.254.31.88/31'), subnet)
         self.assertTrue(subnet not in a.pool)
         self._check_allocations(a.allocations)
-        self.assertFalse(write.called)
+        self.assertFalse(append.called)
 
     def test_allocate_exhausted_pool(self):
         subnet = netaddr.IPNetwork('169.254.31.0/31')
@@ -66,7 +84,7 @@ class TestLinkLocalAddrAllocator(base.BaseTestCase):
             read.return_value = ["deadbeef,169.254.31.0/31\n"]
             a = lla.LinkLocalAllocator('/file', subnet.cidr)
 
-        with mock.patch.object(lla.LinkLocalAllocator, '_write') as write:
+        with mock.patch.object(lla.LinkLocalAllocator, '_append') as append:
             allocation = a.allocate('abcdef12')
 
         self.assertEqual(subnet, allocation)
@@ -74,21 +92,41 @@ class TestLinkLocalAddrAllocator(base.BaseTestCase):
         self.assertTrue('abcdef12' in a.allocations)
         self.assertTrue(allocation not in a.pool)
         self._check_allocations(a.allocations)
-        write.assert_called_once_with(['abcdef12,%s\n' % allocation.cidr])
+        append.assert_called_once_with(['abcdef12,%s\n' % allocation.cidr])
 
         self.assertRaises(RuntimeError, a.allocate, 'deadbeef')
 
     def test_release(self):
-        with mock.patch.object(lla.LinkLocalAllocator, '_write') as write:
+        with mock.patch.object(lla.LinkLocalAllocator, '_append') as append:
             a = lla.LinkLocalAllocator('/file', self.subnet.cidr)
             subnet = a.allocate('deadbeef')
-            write.reset_mock()
+            append.reset_mock()
             a.release('deadbeef')
 
         self.assertTrue('deadbeef' not in a.allocations)
         self.assertTrue(subnet in a.pool)
         self.assertEqual({}, a.allocations)
-        write.assert_called_once_with([])
+        append.assert_called_once_with(['deadbeef,\n'])
+
+    def test_journal_compaction(self):
+        with mock.patch.object(lla.LinkLocalAllocator, '_read') as read:
+            read.return_value = []
+            a = lla.LinkLocalAllocator('/file', self.subnet.cidr)
+        with contextlib.nested(
+            mock.patch.object(lla.LinkLocalAllocator, '_append'),
+            mock.patch.object(lla.LinkLocalAllocator, '_write')
+        ) as (append, write):
+            for i in range(lla.JOURNAL_COMPACT_THRESHOLD // 2):
+                a.allocate('router%d' % i)
+                a.release('router%d' % i)
+            self.assertFalse(write.called)
+            self.assertEqual(lla.JOURNAL_COMPACT_THRESHOLD, append.call_count)
+            subnet = a.allocate('deadbeef')
+            a.allocate('cafebabe')
+            a.release('cafebabe')
+
+        self.assertEqual(lla.JOURNAL_COMPACT_THRESHOLD + 2, append.call_count)
+        write.assert_called_once_with(['deadbeef,%s\n' % subnet.cidr])
 
     def _check_allocations(self, allocations):
         for key, subnet in allocations.items():
@@ -627,6 +627,7 @@ class TestBase(base.BaseTestCase):
 
         self.external_process = mock.patch(
             'neutron.agent.linux.external_process.ProcessManager').start()
+        mock.patch.object(dhcp.Dnsmasq, '_files_states', {}).start()
 
 
 class TestDhcpBase(TestBase):
@@ -1296,6 +1297,59 @@ class TestDnsmasq(TestBase):
                 mock.call(exp_opt_name, exp_opt_data),
             ])
 
+    def test_reload_allocations_unchanged(self):
+        dm = self._get_dnsmasq(FakeDualNetwork())
+        dm._release_unused_leases = mock.Mock()
+        dm.reload_allocations()
+        dm.reload_allocations()
+        self.assertEqual(3, self.safe.call_count)
+        self.external_process().enable.assert_called_once_with(
+            reload_cfg=True)
+
+    def test_reload_allocations_delayed(self):
+        network = FakeDualNetwork()
+        dm = self._get_dnsmasq(network)
+        dm._release_unused_leases = mock.Mock()
+        with mock.patch('time.time', return_value=100):
+            with mock.patch('eventlet.spawn_after') as spawn_after:
+                dm.reload_allocations()
+                network.ports = network.ports[1:]
+                dm.reload_allocations()
+                network.ports = network.ports[1:]
+                dm.reload_allocations()
+        self.external_process().enable.assert_called_once_with(
+            reload_cfg=True)
+        spawn_after.assert_called_once_with(
+            1, dm._delayed_reload, self.external_process(), mock.ANY)
+
+        state = dm._get_files_state()
+        dm._delayed_reload(*spawn_after.call_args[0][2:])
+        self.assertIsNone(state.delayed_reload)
+        self.assertEqual(2, self.external_process().enable.call_count)
+
+    def test_disable_cancels_delayed_reload(self):
+        dm = self._get_dnsmasq(FakeDualNetwork())
+        state = dm._get_files_state()
+        delayed_reload = state.delayed_reload = mock.Mock()
+        dm.disable()
+        delayed_reload.cancel.assert_called_once_with()
+        self.assertNotIn(dm.network.id, dm._files_states)
+
+    def test_release_unused_leases_from_last_hosts_file(self):
+        dnsmasq = self._get_dnsmasq(FakeDualNetwork())
+        dnsmasq._output_hosts_file()
+        dnsmasq._read_hosts_file_leases = mock.Mock()
+        dnsmasq._release_lease = mock.Mock()
+        removed_port = dnsmasq.network.ports[0]
+        dnsmasq.network.ports = dnsmasq.network.ports[1:]
+
+        dnsmasq._release_unused_leases()
+
+        self.assertFalse(dnsmasq._read_hosts_file_leases.called)
+        dnsmasq._release_lease.assert_has_calls(
+            [mock.call(removed_port.mac_address, ip.ip_address)
+             for ip in removed_port.fixed_ips], any_order=True)
+
     def test_release_unused_leases(self):
         dnsmasq = self._get_dnsmasq(FakeDualNetwork())
 
@@ -1377,6 +1431,23 @@ class TestDnsmasq(TestBase):
         self.rmtree.assert_called_once_with(os.path.join(path, net.id),
                                             ignore_errors=True)
 
+    def test_adopt_running_process(self):
+        self.external_process().active = True
+        process_monitor = mock.Mock()
+        dm = self._get_dnsmasq(FakeV4Network(), process_monitor)
+        self.assertTrue(dm.adopt())
+        process_monitor.register.assert_called_once_with(
+            uuid=dm.network.id, service_name='dnsmasq',
+            monitored_process=self.external_process())
+        self.assertFalse(self.external_process().enable.called)
+
+    def test_adopt_no_running_process(self):
+        self.external_process().active = False
+        process_monitor = mock.Mock()
+        dm = self._get_dnsmasq(FakeV4Network(), process_monitor)
+        self.assertFalse(dm.adopt())
+        self.assertFalse(process_monitor.register.called)
+
     def test_existing_dhcp_networks(self):
         path = '/opt/data/neutron/dhcp'
         self.conf.dhcp_confs = path
@@ -1445,6 +1516,51 @@ class TestDnsmasq(TestBase):
         self.safe.assert_has_calls([mock.call(exp_host_name, exp_host_data),
                                     mock.call(exp_opt_name, exp_opt_data)])
 
+    def _get_router_network(self):
+        subnet = {'id': 'subnet1', 'ip_version': 4, 'cidr': '10.0.0.0/24',
+                  'gateway_ip': '10.0.0.1', 'enable_dhcp': True,
+                  'dns_nameservers': [], 'host_routes': []}
+        return dhcp.NetModel(True, {'id': 'net1', 'subnets': [subnet],
+                                    'ports': []})
+
+    def _get_router_port(self):
+        return dhcp.DictModel(
+            {'id': 'port1', 'device_owner': constants.DEVICE_OWNER_ROUTER_INTF,
+             'fixed_ips': [{'subnet_id': 'subnet1',
+                            'ip_address': '10.0.0.1'}]})
+
+    def test_get_isolated_subnets_memoized(self):
+        network = self._get_router_network()
+        self.assertTrue(
+            dhcp.Dnsmasq.get_isolated_subnets(network)['subnet1'])
+        network.ports.append(self._get_router_port())
+        self.assertTrue(
+            dhcp.Dnsmasq.get_isolated_subnets(network)['subnet1'])
+        network.invalidate_derived()
+        self.assertFalse(
+            dhcp.Dnsmasq.get_isolated_subnets(network)['subnet1'])
+
+    def test_generate_opts_per_subnet_memoized(self):
+        self.conf.set_override('enable_isolated_metadata', False)
+        dm = self._get_dnsmasq(self._get_router_network())
+        with mock.patch.object(dm, '_build_opts_per_subnet',
+                               wraps=dm._build_opts_per_subnet) as build:
+            options, subnet_index_map = dm._generate_opts_per_subnet()
+            options.append('extra')
+            self.assertEqual((['tag:tag0,option:router,10.0.0.1'],
+                              {'subnet1': 0}),
+                             dm._generate_opts_per_subnet())
+            self.assertEqual(1, build.call_count)
+
+    def test_spawn_process_invalidates_derived(self):
+        network = self._get_router_network()
+        network.derived['isolated_subnets'] = {}
+        dm = self._get_dnsmasq(network)
+        with mock.patch.object(dm, '_spawn_or_reload_process') as spawn:
+            dm.spawn_process()
+            spawn.assert_called_once_with(reload_with_HUP=False)
+        self.assertEqual({}, network.derived)
+
     def test_should_enable_metadata_namespaces_disabled_returns_false(self):
         self.conf.set_override('use_namespaces', False)
         self.assertFalse(dhcp.Dnsmasq.should_enable_metadata(self.conf,
@@ -1467,3 +1583,208 @@ class TestDnsmasq(TestBase):
         self.conf.set_override('enable_metadata_network', True)
         self.assertTrue(dhcp.Dnsmasq.should_enable_metadata(
             self.conf, FakeV4MetadataNetwork()))
+
+
+class TestSharedDnsmasq(TestBase):
+
+    def setUp(self):
+        super(TestSharedDnsmasq, self).setUp()
+        self.conf.set_override('enable_isolated_metadata', False)
+        mock.patch('neutron.agent.linux.dhcp.SharedDeviceManager').start()
+        mock.patch.object(dhcp.SharedDnsmasq, '_state',
+                          dhcp.SharedDnsmasqState()).start()
+        self.spawn_after = mock.patch('eventlet.spawn_after').start()
+        self.process_monitor = mock.Mock()
+
+    def _get_network(self, network_id, cidr):
+        subnet = {'id': network_id + '-subnet', 'ip_version': 4,
+                  'cidr': cidr, 'gateway_ip': None, 'enable_dhcp': True,
+                  'dns_nameservers': [], 'host_routes': []}
+        return dhcp.NetModel(True, {'id': network_id, 'subnets': [subnet],
+                                    'ports': [], 'mtu': 0})
+
+    def _get_dnsmasq(self, network):
+        return dhcp.SharedDnsmasq(self.conf, network,
+                                  process_monitor=self.process_monitor)
+
+    def _run_update(self):
+        self.assertTrue(self.spawn_after.called)
+        self.spawn_after.call_args[0][1]()
+        self.spawn_after.reset_mock()
+
+    def test_network_in_shared_namespace(self):
+        dm = self._get_dnsmasq(self._get_network('net1', '10.0.0.0/24'))
+        self.assertEqual('qdhcp-shared', dm.network.namespace)
+        self.assertEqual('/dhcp/dnsmasq-shared/opts/net1',
+                         dm.get_conf_file_name('opts'))
+        self.assertEqual('/dhcp/net1/interface',
+                         dm.get_conf_file_name('interface'))
+
+    def test_cmdline_serves_all_networks(self):
+        for network_id, cidr in (('net1', '10.0.0.0/24'),
+                                 ('net2', '10.0.1.0/24')):
+            self._get_dnsmasq(self._get_network(network_id, cidr)).enable()
+        self.assertEqual(1, self.spawn_after.call_count)
+        self._run_update()
+
+        pm_kwargs = self.external_process.call_args[1]
+        self.assertEqual('dnsmasq-shared', pm_kwargs['uuid'])
+        self.assertEqual('qdhcp-shared', pm_kwargs['namespace'])
+        cmd = pm_kwargs['default_cmd_callback']('/dhcp/dnsmasq-shared/pid')
+        self.assertIn('--bind-dynamic', cmd)
+        self.assertIn('--dhcp-hostsfile=/dhcp/dnsmasq-shared/host', cmd)
+        self.assertEqual(
+            ['--dhcp-range=set:tag0-net1,10.0.0.0,static,86400s',
+             '--dhcp-range=set:tag0-net2,10.0.1.0,static,86400s'],
+            [arg for arg in cmd if arg.startswith('--dhcp-range')])
+        self.assertIn('--dhcp-lease-max=512', cmd)
+        self.process_monitor.register.assert_called_once_with(
+            uuid='dnsmasq-shared', service_name='dnsmasq',
+            monitored_process=self.external_process())
+
+    def test_update_restarts_when_ranges_change(self):
+        self.external_process().active = True
+        self.external_process.reset_mock()
+        dm1 = self._get_dnsmasq(self._get_network('net1', '10.0.0.0/24'))
+        dm1.enable()
+        self._run_update()
+        self.external_process().enable.assert_called_once_with()
+        self.external_process().disable.assert_called_once_with()
+
+        self._get_dnsmasq(self._get_network('net2', '10.0.1.0/24')).enable()
+        self._run_update()
+        self.assertEqual(2, self.external_process().disable.call_count)
+
+    def test_update_reloads_when_ranges_unchanged(self):
+        self.external_process().active = True
+        self.external_process.reset_mock()
+        network = self._get_network('net1', '10.0.0.0/24')
+        self._get_dnsmasq(network).enable()
+        self._run_update()
+        # Spawning dnsmasq records the ranges it was started with
+        self.external_process.call_args[1]['default_cmd_callback']('pid')
+        self.external_process().reset_mock()
+
+        network.ports = [dhcp.DictModel(
+            {'id': 'port1', 'mac_address': '00:00:80:aa:bb:cc',
+             'device_owner': '',
+             'fixed_ips': [{'subnet_id': 'net1-subnet',
+                            'ip_address': '10.0.0.2'}]})]
+        dm = self._get_dnsmasq(network)
+        dm._release_unused_leases = mock.Mock()
+        dm.reload_allocations()
+        self._run_update()
+        self.external_process().enable.assert_called_once_with(
+            reload_cfg=True)
+        self.assertFalse(self.external_process().disable.called)
+
+    def test_update_reloads_when_ranges_removed(self):
+        self.external_process().active = True
+        self.external_process.reset_mock()
+        dm1 = self._get_dnsmasq(self._get_network('net1', '10.0.0.0/24'))
+        dm1.enable()
+        self._get_dnsmasq(self._get_network('net2', '10.0.1.0/24')).enable()
+        self._run_update()
+        self.external_process.call_args[1]['default_cmd_callback']('pid')
+        self.external_process().reset_mock()
+
+        dm1.disable()
+        self._run_update()
+        self.external_process().enable.assert_called_once_with(
+            reload_cfg=True)
+        self.assertFalse(self.external_process().disable.called)
+
+    def test_overlapping_network_served_by_own_dnsmasq(self):
+        self.external_process().active = False
+        self._get_dnsmasq(self._get_network('net1', '10.0.0.0/24')).enable()
+        self._run_update()
+        self.external_process.reset_mock()
+
+        dm2 = self._get_dnsmasq(self._get_network('net2', '10.0.0.128/25'))
+        dm2.enable()
+        self.assertFalse(self.spawn_after.called)
+        self.assertEqual(['net1'], list(dhcp.SharedDnsmasq._state.networks))
+        self.assertEqual(set(['net2']), dhcp.SharedDnsmasq._state.dedicated)
+        pm_kwargs = self.external_process.call_args[1]
+        self.assertEqual('net2', pm_kwargs['uuid'])
+        self.assertEqual('qdhcp-net2', pm_kwargs['namespace'])
+        self.external_process().enable.assert_called_once_with(
+            reload_cfg=False)
+
+        dm2.disable()
+        self.assertFalse(dhcp.SharedDnsmasq._state.dedicated)
+        self.process_monitor.unregister.assert_called_with('net2', 'dnsmasq')
+        self.assertFalse(self.spawn_after.called)
+
+    def test_shared_network_moved_to_own_dnsmasq(self):
+        self.external_process().active = False
+        self._get_dnsmasq(self._get_network('net1', '10.0.0.0/24')).enable()
+        self._get_dnsmasq(self._get_network('net2', '10.0.1.0/24')).enable()
+        self._run_update()
+
+        network = self._get_network('net2', '10.0.0.0/16')
+        self._get_dnsmasq(network).reload_allocations()
+        self.assertEqual(['net1'], list(dhcp.SharedDnsmasq._state.networks))
+        self.assertEqual(set(['net2']), dhcp.SharedDnsmasq._state.dedicated)
+        self.assertEqual('net2', self.external_process.call_args[1]['uuid'])
+        # The shared dnsmasq is updated for the network it no longer serves
+        self._run_update()
+
+    def test_networks_of_other_ip_version_do_not_overlap(self):
+        self._get_dnsmasq(self._get_network('net1', '0.0.0.0/8')).enable()
+        self._get_dnsmasq(self._get_network('net2', '::/96')).enable()
+        self.assertEqual(set(['net1', 'net2']),
+                         set(dhcp.SharedDnsmasq._state.networks))
+
+    def test_disable_last_network_stops_dnsmasq(self):
+        dm = self._get_dnsmasq(self._get_network('net1', '10.0.0.0/24'))
+        dm.enable()
+        self._run_update()
+        self.assertTrue(dm.active)
+        dm.disable()
+        self.assertFalse(dm.active)
+        self._run_update()
+        self.process_monitor.unregister.assert_called_with('dnsmasq-shared',
+                                                           'dnsmasq')
+        self.assertEqual(1, self.external_process().enable.call_count)
+        self.assertEqual(2, self.external_process().disable.call_count)
+
+    def test_adopt_registers_network(self):
+        self.external_process().active = True
+        network = self._get_network('net1', '10.0.0.0/24')
+        dm = self._get_dnsmasq(network)
+        self.assertTrue(dm.adopt())
+        self.assertTrue(dm.active)
+        self.process_monitor.register.assert_called_once_with(
+            uuid='dnsmasq-shared', service_name='dnsmasq',
+            monitored_process=self.external_process())
+
+        # The adopted dnsmasq is only sent a HUP on the next update
+        self._get_dnsmasq(network).reload_allocations()
+        self._run_update()
+        self.external_process().enable.assert_called_once_with(
+            reload_cfg=True)
+        self.assertFalse(self.external_process().disable.called)
+
+    def test_adopt_own_dnsmasq(self):
+        self.external_process().active = True
+        dm = self._get_dnsmasq(self._get_network('net1', '10.0.0.0/24'))
+        with mock.patch('os.path.exists', return_value=True):
+            self.assertTrue(dm.adopt())
+        self.assertFalse(dhcp.SharedDnsmasq._state.networks)
+        self.assertEqual(set(['net1']), dhcp.SharedDnsmasq._state.dedicated)
+        self.process_monitor.register.assert_called_once_with(
+            uuid='net1', service_name='dnsmasq',
+            monitored_process=self.external_process())
+
+    def test_adopt_not_running(self):
+        self.external_process().active = False
+        dm = self._get_dnsmasq(self._get_network('net1', '10.0.0.0/24'))
+        self.assertFalse(dm.adopt())
+        self.assertFalse(dhcp.SharedDnsmasq._state.networks)
+        self.assertFalse(self.process_monitor.register.called)
+
+    def test_check_version_isolated_metadata(self):
+        cfg.CONF.register_opts(dhcp_config.DHCP_AGENT_OPTS)
+        cfg.CONF.set_override('enable_isolated_metadata', True)
+        self.assertRaises(SystemExit, dhcp.SharedDnsmasq.check_version)
@@ -12,6 +12,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import eventlet
 import mock
 import os.path
 
@@ -23,6 +24,7 @@ from neutron.tests import base
 TEST_UUID = 'test-uuid'
 TEST_SERVICE = 'testsvc'
 TEST_PID = 1234
+TEST_SERVICE_ID = ep.ServiceId(TEST_UUID, None)
 
 
 class BaseTestProcessMonitor(base.BaseTestCase):
@@ -39,10 +41,11 @@ class BaseTestProcessMonitor(base.BaseTestCase):
         # create a default process monitor
         self.create_child_process_monitor('respawn')
 
-    def create_child_process_monitor(self, action):
+    def create_child_process_monitor(self, action, on_exit=False):
         conf = mock.Mock()
         conf.AGENT.check_child_processes_action = action
         conf.AGENT.check_child_processes = True
+        conf.AGENT.check_child_processes_on_exit = on_exit
         self.pmonitor = ep.ProcessMonitor(
             config=conf,
             resource_type='test')
@@ -96,6 +99,101 @@ class TestProcessMonitor(BaseTestProcessMonitor):
         self.pmonitor.unregister(TEST_UUID, None)
         self.assertEqual(len(self.pmonitor._monitored_processes), 0)
 
+    def test_respawn_backoff(self):
+        pm = self.get_monitored_process(TEST_UUID)
+        pm.active = False
+        with mock.patch('time.time', return_value=100):
+            self.pmonitor._check_child_processes()
+            self.assertEqual(1, pm.enable.call_count)
+            self.pmonitor._check_child_processes()
+            self.assertEqual(1, pm.enable.call_count)
+        with mock.patch('time.time', return_value=101):
+            self.pmonitor._check_child_processes()
+            self.assertEqual(2, pm.enable.call_count)
+            self.assertEqual(
+                3, self.pmonitor._check_child_process(TEST_SERVICE_ID))
+        with mock.patch('time.time', return_value=100 + ep.MAX_RESPAWN_DELAY
+                        + 2):
+            self.pmonitor._check_child_processes()
+            self.assertEqual(3, pm.enable.call_count)
+            self.assertEqual((1, 100 + ep.MAX_RESPAWN_DELAY + 2),
+                             self.pmonitor._respawns[TEST_SERVICE_ID])
+
+
+class TestProcessMonitorOnExit(BaseTestProcessMonitor):
+
+    def setUp(self):
+        super(TestProcessMonitorOnExit, self).setUp()
+        self.pidfd_open = mock.patch.object(ep, 'pidfd_open',
+                                            return_value=42).start()
+        self.trampoline = mock.patch('eventlet.hubs.trampoline').start()
+        self.close = mock.patch('os.close').start()
+        self.create_child_process_monitor('respawn', on_exit=True)
+
+    def test_pidfds_not_supported(self):
+        self.pidfd_open.side_effect = OSError()
+        self.create_child_process_monitor('respawn', on_exit=True)
+        self.get_monitored_process(TEST_UUID)
+        self.assertFalse(self.pmonitor._watchers)
+
+    def test_register_spawns_watcher(self):
+        self.get_monitored_process(TEST_UUID)
+        self.eventlent_spawn.assert_called_with(
+            self.pmonitor._watch_process, TEST_SERVICE_ID)
+        self.assertIn(TEST_SERVICE_ID, self.pmonitor._watchers)
+
+    def test_unregister_kills_watcher(self):
+        self.get_monitored_process(TEST_UUID)
+        watcher = self.pmonitor._watchers[TEST_SERVICE_ID]
+        self.pmonitor.unregister(TEST_UUID, None)
+        watcher.kill.assert_called_once_with()
+        self.assertFalse(self.pmonitor._watchers)
+
+    def test_watched_processes_not_polled(self):
+        pm = self.get_monitored_process(TEST_UUID)
+        pm.active = False
+        self.pmonitor._check_child_processes()
+        self.assertFalse(pm.enable.called)
+
+    def test_watch_process_not_running(self):
+        # Daemons write their pid file after they are registered
+        pm = self.get_monitored_process(TEST_UUID)
+        pm.active = False
+        self.pmonitor._watchers[TEST_SERVICE_ID] = eventlet.getcurrent()
+        self.pidfd_open.reset_mock()
+        self.pmonitor._watch_process(TEST_SERVICE_ID)
+        self.assertFalse(self.pidfd_open.called)
+        self.assertFalse(pm.enable.called)
+        self.assertFalse(self.pmonitor._watchers)
+
+        # The periodic check watches it again once it is running
+        self.eventlent_spawn.reset_mock()
+        pm.active = True
+        self.pmonitor._check_child_processes()
+        self.assertFalse(pm.enable.called)
+        self.eventlent_spawn.assert_called_once_with(
+            self.pmonitor._watch_process, TEST_SERVICE_ID)
+
+    def test_watch_process_respawns_on_exit(self):
+        pm = self.get_monitored_process(TEST_UUID)
+        pm.pid = TEST_PID
+
+        def exit_process(fd, read):
+            pm.active = False
+
+        def respawn():
+            pm.active = True
+            # Stop watching once the process was respawned
+            self.pmonitor._monitored_processes.clear()
+
+        self.trampoline.side_effect = exit_process
+        pm.enable.side_effect = respawn
+        self.pmonitor._watch_process(TEST_SERVICE_ID)
+        self.pidfd_open.assert_called_with(TEST_PID)
+        self.trampoline.assert_called_once_with(42, read=True)
+        self.close.assert_called_with(42)
+        pm.enable.assert_called_once_with()
+
 
 class TestProcessManager(base.BaseTestCase):
     def setUp(self):
@@ -568,6 +568,13 @@ class TestIpRuleCommand(TestIPCmdBase):
     def test_add_rule_v6_exists(self):
         self._test_add_rule_exists('2001:db8::1', 3, 201, RULE_V6_SAMPLE)
 
+    def test_list_rules(self):
+        self.parent._as_root.return_value = RULE_V4_SAMPLE
+        rules = self.rule_cmd.list_rules(4)
+        self._assert_sudo([4], (['show']))
+        self.assertIn(('101', '192.168.45.100', '2'), rules)
+        self.assertIn(('32766', 'all', 'main'), rules)
+
     def test_delete_rule_v4(self):
         self._test_delete_rule('192.168.45.100', 2, 100)
 
@@ -575,6 +582,73 @@ class TestIpRuleCommand(TestIPCmdBase):
         self._test_delete_rule('2001:db8::1', 3, 200)
 
 
+class TestIPBatch(base.BaseTestCase):
+    def setUp(self):
+        super(TestIPBatch, self).setUp()
+        self.execute = mock.patch.object(ip_lib.utils, 'execute').start()
+        self.list_rules = mock.patch.object(ip_lib.IpRuleCommand,
+                                            'list_rules').start()
+        self.list_rules.return_value = set()
+        self.batch = ip_lib.IPBatch(namespace='ns')
+
+    def _assert_batch(self, ip_version, lines):
+        self.execute.assert_any_call(
+            ['ip', 'netns', 'exec', 'ns', 'ip', '-%s' % ip_version,
+             '-batch', '-'],
+            process_input='\n'.join(lines) + '\n',
+            run_as_root=True, log_fail_as_error=True)
+
+    def test_execute_single_process(self):
+        self.batch.add_rule('192.168.45.100', 16, 100)
+        self.batch.delete_rule('192.168.45.101', 16, 101)
+        self.batch.add_route('1.2.3.4/32', '169.254.30.42', 'fpr-1')
+        self.batch.delete_route('1.2.3.5/32', '169.254.30.42', 'fpr-1',
+                                table=16)
+        self.assertEqual(4, len(self.batch))
+
+        self.batch.execute()
+
+        self.assertEqual(1, self.execute.call_count)
+        self._assert_batch(4, [
+            'rule add from 192.168.45.100 table 16 priority 100',
+            'rule del table 16 priority 101',
+            'route replace 1.2.3.4/32 via 169.254.30.42 dev fpr-1',
+            'route del 1.2.3.5/32 via 169.254.30.42 dev fpr-1 table 16'])
+        self.assertEqual(0, len(self.batch))
+
+    def test_execute_per_ip_version(self):
+        self.batch.add_rule('192.168.45.100', 16, 100)
+        self.batch.add_rule('2001:db8::1', 16, 200)
+
+        self.batch.execute()
+
+        self.assertEqual(2, self.execute.call_count)
+        self._assert_batch(4, [
+            'rule add from 192.168.45.100 table 16 priority 100'])
+        self._assert_batch(6, [
+            'rule add from 2001:db8::1 table 16 priority 200'])
+
+    def test_execute_skips_existing_rules(self):
+        self.list_rules.return_value = set([('100', '192.168.45.100', '16')])
+        self.batch.add_rule('192.168.45.100', 16, 100)
+        self.batch.add_rule('192.168.45.101', 16, 101)
+        self.batch.add_rule('192.168.45.101', 16, 101)
+
+        self.batch.execute()
+
+        self.list_rules.assert_called_once_with(4)
+        self._assert_batch(4, [
+            'rule add from 192.168.45.101 table 16 priority 101'])
+
+    def test_execute_nothing_to_do(self):
+        self.list_rules.return_value = set([('100', '192.168.45.100', '16')])
+        self.batch.add_rule('192.168.45.100', 16, 100)
+
+        self.batch.execute()
+
+        self.assertFalse(self.execute.called)
+
+
 class TestIpLinkCommand(TestIPCmdBase):
     def setUp(self):
         super(TestIpLinkCommand, self).setUp()
@@ -299,6 +299,29 @@ class TestUnixDomainHttpConnection(base.BaseTestCase):
                 self.assertEqual(conn.timeout, 3)
 
 
+class TestHttpConnectionPool(base.BaseTestCase):
+    def test_item_created_with_certificate(self):
+        pool = utils.HttpConnectionPool(2, ca_certs='ca')
+        pool.add_certificate('key', 'cert', 'host:80')
+        with mock.patch('httplib2.Http') as mock_http:
+            with pool.item() as h:
+                self.assertEqual(mock_http.return_value, h)
+            mock_http.assert_has_calls([
+                mock.call(ca_certs='ca'),
+                mock.call().add_certificate('key', 'cert', 'host:80')])
+
+    def test_item_reused(self):
+        pool = utils.HttpConnectionPool(2)
+        with mock.patch('httplib2.Http', side_effect=[mock.Mock(),
+                                                      mock.Mock()]):
+            with pool.item() as first:
+                pass
+            with pool.item() as second:
+                self.assertIs(first, second)
+                with pool.item() as third:
+                    self.assertIsNot(first, third)
+
+
 class TestUnixDomainHttpProtocol(base.BaseTestCase):
     def test_init_empty_client(self):
         u = utils.UnixDomainHttpProtocol(mock.Mock(), '', mock.Mock())
@@ -44,13 +44,20 @@ class FakeConf(object):
     nova_metadata_insecure = True
     nova_client_cert = 'nova_cert'
     nova_client_priv_key = 'nova_priv_key'
+    nova_metadata_pool_size = 100
     cache_url = ''
+    cache_invalidate_on_port_delete = False
 
 
 class FakeConfCache(FakeConf):
     cache_url = 'memory://?default_ttl=5'
 
 
+class FakeConfLRUCache(FakeConf):
+    cache_url = 'lru://?default_ttl=5&max_size=100'
+    cache_invalidate_on_port_delete = True
+
+
 class TestMetadataProxyHandlerBase(base.BaseTestCase):
     fake_conf = FakeConf
 
@@ -456,6 +463,19 @@ class TestMetadataProxyHandlerCache(TestMetadataProxyHandlerBase):
 
                 return retval
 
+    def test_proxy_request_reuses_connection(self):
+        req = mock.Mock(path_info='/the_path', query_string='',
+                        headers={'X-Forwarded-For': '8.8.8.8'},
+                        method='GET', body='')
+        resp = mock.MagicMock(status=200)
+        req.response = resp
+        with mock.patch('httplib2.Http') as mock_http:
+            mock_http.return_value.request.return_value = (resp, 'content')
+            self.handler._proxy_request('the_id', 'tenant_id', req)
+            self.handler._proxy_request('the_id', 'tenant_id', req)
+            self.assertEqual(1, mock_http.call_count)
+            self.assertEqual(2, mock_http.return_value.request.call_count)
+
     def test_proxy_request_post(self):
         response = self._proxy_request_test_helper(method='POST')
         self.assertEqual(response.content_type, "text/plain")
@@ -511,6 +531,53 @@ class TestMetadataProxyHandlerNoCache(TestMetadataProxyHandlerCache):
             2, self.qclient.return_value.list_ports.call_count)
 
 
+class TestMetadataProxyHandlerLRUCache(TestMetadataProxyHandlerCache):
+    fake_conf = FakeConfLRUCache
+
+    def setUp(self):
+        super(TestMetadataProxyHandlerLRUCache, self).setUp()
+        self.create_consumers = mock.patch.object(
+            agent.agent_rpc, 'create_consumers').start()
+
+    def test_port_delete_invalidates_cached_ports(self):
+        self._get_ports_for_remote_address_cache_hit_helper()
+        self.assertEqual(
+            1, self.qclient.return_value.list_ports.call_count)
+
+        self.handler.port_delete(mock.sentinel.context, port_id='other')
+        self.handler._get_ports_for_remote_address('remote_address',
+                                                   ('net1', 'net2'))
+        self.assertEqual(
+            1, self.qclient.return_value.list_ports.call_count)
+
+        self.qclient.return_value.list_ports.return_value = {
+            'ports': [{'id': 'port1', 'network_id': 'net1'}]}
+        self.handler._get_ports_for_remote_address('other_address',
+                                                   ('net1', 'net2'))
+        self.handler.port_delete(mock.sentinel.context, port_id='port1')
+        self.handler._get_ports_for_remote_address('other_address',
+                                                   ('net1', 'net2'))
+        self.assertEqual(
+            3, self.qclient.return_value.list_ports.call_count)
+
+    def test_consume_port_deletes_once_per_process(self):
+        with mock.patch('os.getpid', return_value=1):
+            self.handler._consume_port_deletes()
+            self.handler._consume_port_deletes()
+        self.create_consumers.assert_called_once_with(
+            [self.handler], agent.topics.AGENT,
+            [[agent.topics.PORT, agent.topics.DELETE]])
+
+        with mock.patch('os.getpid', return_value=2):
+            self.handler._consume_port_deletes()
+        self.assertEqual(2, self.create_consumers.call_count)
+
+    def test_consume_port_deletes_disabled(self):
+        self.handler.conf = FakeConf
+        self.handler._consume_port_deletes()
+        self.assertFalse(self.create_consumers.called)
+
+
 class TestUnixDomainMetadataProxy(base.BaseTestCase):
     def setUp(self):
         super(TestUnixDomainMetadataProxy, self).setUp()
@@ -607,3 +674,14 @@ class TestUnixDomainMetadataProxy(base.BaseTestCase):
                 state_api_inst = state_api.return_value
                 state_api_inst.report_state.assert_called_once_with(
                     proxy.context, proxy.agent_state, use_call=True)
+
+    def test_report_state_cache_stats(self):
+        with mock.patch('neutron.agent.rpc.PluginReportStateAPI'):
+            with mock.patch('os.makedirs'):
+                proxy = agent.UnixDomainMetadataProxy(mock.Mock())
+                proxy.handler = mock.Mock()
+                proxy.handler._cache.get_stats.return_value = {'hits': 1}
+                proxy._report_state()
+                self.assertEqual(
+                    {'hits': 1},
+                    proxy.agent_state['configurations']['cache'])
@@ -14,6 +14,7 @@
 #    under the License.
 
 import contextlib
+import os
 
 import mock
 
@@ -25,6 +26,7 @@ from neutron.agent.l3 import config as l3_config
 from neutron.agent.l3 import ha as l3_ha_agent
 from neutron.agent.metadata import config
 from neutron.agent.metadata import driver as metadata_driver
+from neutron.agent.metadata import namespace_proxy
 from neutron.openstack.common import uuidutils
 from neutron.tests import base
 
@@ -155,3 +157,70 @@ class TestMetadataDriverProcess(base.BaseTestCase):
 
     def test_spawn_metadata_proxy(self):
         self._test_spawn_metadata_proxy(str(self.EUID), str(self.EGID))
+
+
+class TestMetadataDriverMultiplexed(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestMetadataDriverMultiplexed, self).setUp()
+        cfg.CONF.register_opts(config.SHARED_OPTS)
+        cfg.CONF.register_opts(config.DRIVER_OPTS)
+        cfg.CONF.set_override('metadata_proxy_multiplexed', True)
+        self.monitor = mock.Mock(resource_type='router')
+        self.pm = mock.patch.object(
+            metadata_driver.external_process, 'ProcessManager').start()
+        self.driver = metadata_driver.MetadataDriver
+        self.namespaces_file = os.path.join(
+            cfg.CONF.state_path, 'metadata-proxy',
+            'metadata-proxy-router.namespaces')
+
+    def _read_namespaces(self):
+        return namespace_proxy.read_namespaces_file(self.namespaces_file)
+
+    def test_spawn(self):
+        self.driver.spawn_monitored_metadata_proxy(
+            self.monitor, 'qrouter-r1', 9697, cfg.CONF, router_id='r1')
+        self.driver.spawn_monitored_metadata_proxy(
+            self.monitor, 'qrouter-r2', 9697, cfg.CONF, router_id='r2')
+        self.assertEqual({'qrouter-r1': (9697, None, 'r1'),
+                          'qrouter-r2': (9697, None, 'r2')},
+                         self._read_namespaces())
+        self.pm.assert_called_with(conf=cfg.CONF,
+                                   uuid='metadata-proxy-router',
+                                   default_cmd_callback=mock.ANY,
+                                   run_as_root=True)
+        self.pm.return_value.enable.assert_called_with(reload_cfg=True)
+        self.monitor.register.assert_called_with(
+            'metadata-proxy-router', metadata_driver.METADATA_SERVICE_NAME,
+            self.pm.return_value)
+
+    def test_spawn_callback(self):
+        self.driver.spawn_monitored_metadata_proxy(
+            self.monitor, 'qdhcp-n1', 80, cfg.CONF, network_id='n1')
+        callback = self.pm.call_args[1]['default_cmd_callback']
+        cmd = callback('pidfile')
+        self.assertEqual(['neutron-ns-metadata-proxy',
+                          '--pid_file=pidfile',
+                          '--metadata_proxy_socket=%s' %
+                          cfg.CONF.metadata_proxy_socket,
+                          '--namespaces_file=%s' % self.namespaces_file,
+                          '--state_path=%s' % cfg.CONF.state_path],
+                         cmd[:5])
+
+    def test_destroy(self):
+        self.driver.spawn_monitored_metadata_proxy(
+            self.monitor, 'qrouter-r1', 9697, cfg.CONF, router_id='r1')
+        self.driver.spawn_monitored_metadata_proxy(
+            self.monitor, 'qrouter-r2', 9697, cfg.CONF, router_id='r2')
+        self.driver.destroy_monitored_metadata_proxy(
+            self.monitor, 'r1', 'qrouter-r1', cfg.CONF)
+        self.assertEqual({'qrouter-r2': (9697, None, 'r2')},
+                         self._read_namespaces())
+        self.assertFalse(self.pm.return_value.disable.called)
+
+        self.driver.destroy_monitored_metadata_proxy(
+            self.monitor, 'r2', 'qrouter-r2', cfg.CONF)
+        self.assertEqual({}, self._read_namespaces())
+        self.monitor.unregister.assert_called_once_with(
+            'metadata-proxy-router', metadata_driver.METADATA_SERVICE_NAME)
+        self.pm.return_value.disable.assert_called_once_with()
@@ -0,0 +1,85 @@
+# Copyright 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import multiprocessing
+
+import mock
+
+from neutron.agent.metadata import lru_cache
+from neutron.openstack.common.cache._backends import memory
+from neutron.openstack.common.cache import cache
+from neutron.tests import base
+
+
+class TestLRUMemoryBackend(base.BaseTestCase):
+    def setUp(self):
+        super(TestLRUMemoryBackend, self).setUp()
+        self.cache = cache.get_cache('lru://?default_ttl=5&max_size=2')
+
+    def test_get_cache(self):
+        self.assertIsInstance(self.cache, lru_cache.LRUMemoryBackend)
+
+    def test_default_max_size(self):
+        self.assertEqual(lru_cache.DEFAULT_MAX_SIZE,
+                         cache.get_cache('lru://')._max_size)
+
+    def test_hits_and_misses(self):
+        self.cache.set('a', 1, None)
+        self.assertEqual(1, self.cache.get('a'))
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual({'hits': 1, 'misses': 1, 'evictions': 0},
+                         self.cache.get_stats())
+
+    def test_stats_shared_with_forked_processes(self):
+        self.cache.set('a', 1, None)
+        worker = multiprocessing.Process(target=self.cache.get, args=('a',))
+        worker.start()
+        worker.join()
+        self.cache.get('b')
+        self.assertEqual({'hits': 1, 'misses': 1, 'evictions': 0},
+                         self.cache.get_stats())
+
+    def test_least_recently_used_evicted(self):
+        self.cache.set('a', 1, None)
+        self.cache.set('b', 2, None)
+        self.cache.get('a')
+        self.cache.set('c', 3, None)
+        self.assertNotIn('b', self.cache)
+        self.assertEqual(1, self.cache.get('a'))
+        self.assertEqual(3, self.cache.get('c'))
+        self.assertEqual(1, self.cache.get_stats()['evictions'])
+
+    def test_set_existing_key_does_not_evict(self):
+        self.cache.set('a', 1, None)
+        self.cache.set('b', 2, None)
+        self.cache.set('a', 3, None)
+        self.assertEqual(3, self.cache.get('a'))
+        self.assertEqual(2, self.cache.get('b'))
+        self.assertEqual(0, self.cache.get_stats()['evictions'])
+
+    def test_ttl(self):
+        with mock.patch.object(memory.timeutils, 'utcnow_ts') as now:
+            now.return_value = 100
+            self.cache.set('a', 1, None)
+            now.return_value = 104
+            self.assertEqual(1, self.cache.get('a'))
+            now.return_value = 105
+            self.assertIsNone(self.cache.get('a'))
+
+    def test_invalidate(self):
+        self.cache.set('a', [1, 2], None)
+        self.cache.set('b', [3], None)
+        self.cache.invalidate(lambda value: 2 in value)
+        self.assertNotIn('a', self.cache)
+        self.assertEqual([3], self.cache.get('b'))
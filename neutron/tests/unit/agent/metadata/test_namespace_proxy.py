@@ -12,6 +12,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import os
+
 import mock
 import testtools
 import webob
@@ -100,6 +102,18 @@ class TestNetworkMetadataProxyHandler(base.BaseTestCase):
             self.assertEqual(retval.headers['Content-Type'], 'text/plain')
             self.assertEqual(retval.body, 'content')
 
+    def test_proxy_request_reuses_connection(self):
+        self.handler.router_id = 'router_id'
+
+        resp = mock.MagicMock(status=200)
+        with mock.patch('httplib2.Http') as mock_http:
+            mock_http.return_value.request.return_value = (resp, 'content')
+            for i in range(2):
+                self.handler._proxy_request('192.168.1.1', 'GET',
+                                            '/latest/meta-data', '', '')
+            self.assertEqual(1, mock_http.call_count)
+            self.assertEqual(2, mock_http.return_value.request.call_count)
+
     def test_proxy_request_network_200(self):
         self.handler.network_id = 'network_id'
 
@@ -282,6 +296,7 @@ class TestProxyDaemon(base.BaseTestCase):
                         cfg.CONF.network_id = None
                         cfg.CONF.metadata_port = 9697
                         cfg.CONF.pid_file = 'pidfile'
+                        cfg.CONF.namespaces_file = None
                         cfg.CONF.daemonize = True
                         utils_cfg.CONF.log_opt_values.return_value = None
                         ns_proxy.main()
@@ -306,6 +321,7 @@ class TestProxyDaemon(base.BaseTestCase):
                         cfg.CONF.network_id = None
                         cfg.CONF.metadata_port = 9697
                         cfg.CONF.pid_file = 'pidfile'
+                        cfg.CONF.namespaces_file = None
                         cfg.CONF.daemonize = False
                         utils_cfg.CONF.log_opt_values.return_value = None
                         ns_proxy.main()
@@ -320,3 +336,87 @@ class TestProxyDaemon(base.BaseTestCase):
                                       watch_log=mock.ANY),
                             mock.call().run()]
                         )
+
+    def test_main_multiplexed(self):
+        with mock.patch.object(ns_proxy, 'MultiplexedProxyDaemon') as daemon:
+            with mock.patch.object(ns_proxy, 'config'):
+                with mock.patch.object(ns_proxy, 'cfg') as cfg:
+                    with mock.patch.object(utils, 'cfg'):
+                        cfg.CONF.pid_file = 'pidfile'
+                        cfg.CONF.namespaces_file = 'nsfile'
+                        cfg.CONF.daemonize = True
+                        ns_proxy.main()
+
+                        daemon.assert_has_calls([
+                            mock.call('pidfile', 'nsfile',
+                                      watch_log=mock.ANY),
+                            mock.call().start()]
+                        )
+
+
+class TestNamespacesFile(base.BaseTestCase):
+    def test_write_read(self):
+        path = os.path.join(self.get_default_temp_dir().path,
+                            'namespaces')
+        namespaces = {'qrouter-r': (9697, None, 'r'),
+                      'qdhcp-n': (80, 'n', None)}
+        ns_proxy.write_namespaces_file(path, namespaces)
+        with open(path) as f:
+            self.assertEqual('qdhcp-n,80,n,\nqrouter-r,9697,,r\n', f.read())
+        self.assertEqual(namespaces, ns_proxy.read_namespaces_file(path))
+
+    def test_read_missing_file(self):
+        self.assertEqual({}, ns_proxy.read_namespaces_file('/does/not/exist'))
+
+
+class TestMultiplexedProxyDaemon(base.BaseTestCase):
+    def setUp(self):
+        super(TestMultiplexedProxyDaemon, self).setUp()
+        mock.patch('neutron.agent.linux.daemon.Pidfile').start()
+        self.listen = mock.patch.object(ns_proxy,
+                                        'listen_in_namespace').start()
+        self.spawn = mock.patch('eventlet.spawn').start()
+        self.read = mock.patch.object(ns_proxy,
+                                      'read_namespaces_file').start()
+        self.daemon = ns_proxy.MultiplexedProxyDaemon('pidfile', 'nsfile')
+
+    def test_update_servers_add(self):
+        self.read.return_value = {'qrouter-r': (9697, None, 'r'),
+                                  'qdhcp-n': (80, 'n', None)}
+        self.daemon.update_servers()
+        self.listen.assert_has_calls([mock.call('qrouter-r', 9697),
+                                      mock.call('qdhcp-n', 80)],
+                                     any_order=True)
+        self.assertEqual(2, self.spawn.call_count)
+        handlers = dict((c[0][2].router_id or c[0][2].network_id, c[0][2])
+                        for c in self.spawn.call_args_list)
+        self.assertEqual(set(['r', 'n']), set(handlers))
+        # The connections to the metadata agent are shared
+        self.assertIs(handlers['r']._http_pool, handlers['n']._http_pool)
+
+    def test_update_servers_remove_and_change(self):
+        self.read.return_value = {'qrouter-r': (9697, None, 'r'),
+                                  'qrouter-s': (9697, None, 's')}
+        self.daemon.update_servers()
+        self.listen.reset_mock()
+        self.read.return_value = {'qrouter-r': (9698, None, 'r')}
+        self.daemon.update_servers()
+        self.listen.assert_called_once_with('qrouter-r', 9698)
+        self.assertEqual(2, self.spawn.return_value.kill.call_count)
+        self.assertEqual(['qrouter-r'], list(self.daemon._servers))
+
+    def test_update_servers_unchanged(self):
+        self.read.return_value = {'qrouter-r': (9697, None, 'r')}
+        self.daemon.update_servers()
+        self.daemon.update_servers()
+        self.assertEqual(1, self.listen.call_count)
+        self.assertFalse(self.spawn.return_value.kill.called)
+
+    def test_update_servers_missing_namespace(self):
+        self.read.return_value = {'qrouter-r': (9697, None, 'r')}
+        self.listen.side_effect = IOError
+        self.daemon.update_servers()
+        self.assertEqual({}, self.daemon._servers)
+        self.listen.side_effect = None
+        self.daemon.update_servers()
+        self.assertEqual(['qrouter-r'], list(self.daemon._servers))
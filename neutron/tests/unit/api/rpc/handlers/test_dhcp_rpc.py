@@ -65,10 +65,54 @@ class TestDhcpRpcCallback(base.BaseTestCase):
         self.plugin.get_subnets.return_value = [subnet]
         networks = self.callbacks.get_active_networks_info(mock.Mock(),
                                                            host='host')
-        expected = [{'id': 'a', 'subnets': [], 'ports': [port]},
-                    {'id': 'b', 'subnets': [subnet], 'ports': []}]
+        expected = [{'id': 'a', 'subnets': [], 'ports': [port],
+                     'revision': mock.ANY},
+                    {'id': 'b', 'subnets': [subnet], 'ports': [],
+                     'revision': mock.ANY}]
         self.assertEqual(expected, networks)
 
+    def test_get_active_networks_info_paged(self):
+        self.plugin.get_networks.return_value = [
+            {'id': 'c'}, {'id': 'a'}, {'id': 'b'}]
+        self.plugin.get_ports.return_value = []
+        self.plugin.get_subnets.return_value = []
+        networks = self.callbacks.get_active_networks_info(
+            mock.Mock(), host='host', limit=1, marker='a')
+        self.assertEqual(['b'], [n['id'] for n in networks])
+        filters = self.plugin.get_ports.call_args[1]['filters']
+        self.assertEqual(['b'], filters['network_id'])
+
+    def test_get_active_networks_info_paged_scheduled(self):
+        self.plugin.supported_extension_aliases = [
+            constants.DHCP_AGENT_SCHEDULER_EXT_ALIAS]
+        self.plugin.list_active_networks_on_active_dhcp_agent.return_value = [
+            {'id': 'b'}]
+        self.plugin.get_ports.return_value = []
+        self.plugin.get_subnets.return_value = []
+        context = mock.Mock()
+        networks = self.callbacks.get_active_networks_info(
+            context, host='host', limit=1, marker='a')
+        self.assertEqual(['b'], [n['id'] for n in networks])
+        (self.plugin.list_active_networks_on_active_dhcp_agent.
+            assert_called_once_with(context, 'host', limit=1, marker='a'))
+        self.assertFalse(self.plugin.auto_schedule_networks.called)
+
+    def test_get_active_networks_info_revision(self):
+        self.plugin.get_ports.return_value = []
+        self.plugin.get_subnets.return_value = []
+        self.plugin.get_networks.return_value = [{'id': 'a'}]
+        first = self.callbacks.get_active_networks_info(
+            mock.Mock(), host='host')[0]['revision']
+        self.plugin.get_networks.return_value = [{'id': 'a'}]
+        second = self.callbacks.get_active_networks_info(
+            mock.Mock(), host='host')[0]['revision']
+        self.plugin.get_networks.return_value = [{'id': 'a'}]
+        self.plugin.get_ports.return_value = [{'network_id': 'a'}]
+        third = self.callbacks.get_active_networks_info(
+            mock.Mock(), host='host')[0]['revision']
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, third)
+
     def _test__port_action_with_failures(self, exc=None, action=None):
         port = {
             'network_id': 'foo_network_id',
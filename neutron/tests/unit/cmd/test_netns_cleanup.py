@@ -13,6 +13,9 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
+
+import eventlet
 import mock
 
 from neutron.cmd import netns_cleanup as util
@@ -197,6 +200,8 @@ class TestNetnsCleanup(base.BaseTestCase):
             with mock.patch('time.sleep') as time_sleep:
                 conf = mock.Mock()
                 conf.force = False
+                conf.concurrency = 1
+                conf.dry_run = False
                 methods_to_mock = dict(
                     eligible_for_deletion=mock.DEFAULT,
                     destroy_namespace=mock.DEFAULT,
@@ -229,6 +234,8 @@ class TestNetnsCleanup(base.BaseTestCase):
             with mock.patch('time.sleep') as time_sleep:
                 conf = mock.Mock()
                 conf.force = False
+                conf.concurrency = 1
+                conf.dry_run = False
                 methods_to_mock = dict(
                     eligible_for_deletion=mock.DEFAULT,
                     destroy_namespace=mock.DEFAULT,
@@ -250,3 +257,50 @@ class TestNetnsCleanup(base.BaseTestCase):
                         self.assertFalse(mocks['destroy_namespace'].called)
 
                         self.assertFalse(time_sleep.called)
+
+    def test_main_concurrency(self):
+        namespaces = ['ns%d' % i for i in range(6)]
+        conf = mock.Mock(force=False, concurrency=3, dry_run=False)
+        running = []
+        max_running = []
+
+        def destroy_namespace(conf, namespace, force):
+            running.append(namespace)
+            max_running.append(len(running))
+            eventlet.sleep(0)
+            running.remove(namespace)
+
+        with contextlib.nested(
+            mock.patch('neutron.agent.linux.ip_lib.IPWrapper'),
+            mock.patch('time.sleep'),
+            mock.patch.object(util, 'eligible_for_deletion',
+                              return_value=True),
+            mock.patch.object(util, 'destroy_namespace',
+                              side_effect=destroy_namespace),
+        ) as (ip_wrap, time_sleep, eligible, destroy):
+            ip_wrap.get_namespaces.return_value = namespaces
+            util.cleanup_network_namespaces(conf)
+            self.assertEqual(6, destroy.call_count)
+            self.assertEqual(3, max(max_running))
+
+    def test_main_dry_run(self):
+        namespaces = ['ns1', 'ns2']
+        conf = mock.Mock(force=True, concurrency=2, dry_run=True)
+        with contextlib.nested(
+            mock.patch('neutron.agent.linux.ip_lib.IPWrapper'),
+            mock.patch('time.sleep'),
+            mock.patch.object(util, 'eligible_for_deletion',
+                              side_effect=[True, False]),
+            mock.patch.object(util, 'destroy_namespace'),
+            mock.patch.object(util, 'LOG'),
+        ) as (ip_wrap, time_sleep, eligible, destroy, log):
+            ip_wrap.get_namespaces.return_value = namespaces
+            device = mock.Mock()
+            device.name = 'tap0'
+            ip_wrap.return_value.get_devices.return_value = [device]
+            util.cleanup_network_namespaces(conf)
+            ip_wrap.assert_called_once_with(namespace='ns1')
+            self.assertFalse(destroy.called)
+            self.assertFalse(time_sleep.called)
+            self.assertEqual({'namespace': 'ns1', 'devices': 'tap0'},
+                             log.info.call_args_list[0][0][1])
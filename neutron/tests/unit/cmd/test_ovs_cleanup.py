@@ -15,6 +15,8 @@
 
 import contextlib
 import itertools
+
+import eventlet
 import mock
 
 from neutron.agent.common import ovs_lib
@@ -31,6 +33,7 @@ class TestOVSCleanup(base.BaseTestCase):
         ports = ['p1', 'p2', 'p3']
         conf = mock.Mock()
         conf.ovs_all_ports = False
+        conf.concurrency = 4
         conf.ovs_integration_bridge = 'br-int'
         conf.external_network_bridge = 'br-ex'
         with contextlib.nested(
@@ -49,7 +52,7 @@ class TestOVSCleanup(base.BaseTestCase):
                 ovs.assert_has_calls([mock.call().delete_ports(
                     all_ports=False)])
                 collect.assert_called_once_with(set(bridges))
-                delete.assert_called_once_with(ports)
+                delete.assert_called_once_with(ports, 4)
 
     def test_collect_neutron_ports(self):
         port1 = ovs_lib.VifPort('tap1234', 1, uuidutils.generate_uuid(),
@@ -81,3 +84,23 @@ class TestOVSCleanup(base.BaseTestCase):
                  mock.call().link.delete(),
                  mock.call('tap09ab'),
                  mock.call().link.delete()])
+
+    def test_delete_neutron_ports_concurrency(self):
+        ports = ['tap%d' % i for i in range(6)]
+        deleting = []
+        max_deleting = []
+
+        def delete_link():
+            deleting.append(True)
+            max_deleting.append(len(deleting))
+            eventlet.sleep(0)
+            deleting.pop()
+
+        with contextlib.nested(
+            mock.patch.object(ip_lib, 'device_exists', return_value=True),
+            mock.patch.object(ip_lib, 'IPDevice')
+        ) as (device_exists, ip_dev):
+            ip_dev.return_value.link.delete.side_effect = delete_link
+            util.delete_neutron_ports(ports, concurrency=3)
+            self.assertEqual(6, ip_dev.return_value.link.delete.call_count)
+            self.assertEqual(3, max(max_deleting))
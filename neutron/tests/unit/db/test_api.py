@@ -0,0 +1,110 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+from oslo_db import exception as db_exc
+
+from neutron.api.v2 import attributes
+from neutron import context
+from neutron.db import api as db_api
+from neutron.tests.unit import testlib_api
+
+
+class FakePlugin(object):
+
+    def __init__(self, side_effect):
+        self.calls = []
+        self.side_effect = list(side_effect)
+
+    @db_api.retry_db_errors
+    def create_thing(self, context, thing):
+        self.calls.append(dict(thing))
+        thing['mutated'] = True
+        if self.side_effect:
+            raise self.side_effect.pop(0)
+        return thing
+
+
+class TestRetryDbErrors(testlib_api.SqlTestCase):
+
+    def setUp(self):
+        super(TestRetryDbErrors, self).setUp()
+        self.ctx = context.get_admin_context()
+        self.sleep = mock.patch('time.sleep').start()
+        db_api.retry_stats.clear()
+        self.name = '%s.create_thing' % __name__
+
+    def test_retries_deadlock(self):
+        plugin = FakePlugin([db_exc.DBDeadlock(), db_exc.DBDeadlock()])
+        thing = {'name': attributes.ATTR_NOT_SPECIFIED}
+
+        result = plugin.create_thing(self.ctx, thing)
+
+        self.assertEqual(3, len(plugin.calls))
+        # The retries start from the arguments of the call
+        for call in plugin.calls:
+            self.assertEqual({'name': attributes.ATTR_NOT_SPECIFIED}, call)
+            self.assertIs(attributes.ATTR_NOT_SPECIFIED, call['name'])
+        self.assertTrue(result['mutated'])
+        self.assertEqual({'calls': 1, 'retries': 2},
+                         db_api.retry_stats[self.name])
+
+    def test_retry_intervals_are_bounded_and_increase(self):
+        plugin = FakePlugin([db_exc.DBDeadlock()] * 7)
+        with mock.patch.multiple(db_api, RETRY_INTERVAL=0.1,
+                                 MAX_RETRY_INTERVAL=1):
+            with mock.patch('random.uniform',
+                            side_effect=lambda a, b: b) as uniform:
+                plugin.create_thing(self.ctx, {})
+
+        self.assertEqual([mock.call(0, interval)
+                          for interval in (0.1, 0.2, 0.4, 0.8, 1, 1, 1)],
+                         uniform.call_args_list)
+        self.assertEqual(7, self.sleep.call_count)
+
+    def test_reraises_after_max_retries(self):
+        plugin = FakePlugin([db_exc.DBDeadlock()] * (db_api.MAX_RETRIES + 1))
+
+        self.assertRaises(db_exc.DBDeadlock,
+                          plugin.create_thing, self.ctx, {})
+        self.assertEqual(db_api.MAX_RETRIES + 1, len(plugin.calls))
+        self.assertEqual({'calls': 1, 'retries': db_api.MAX_RETRIES,
+                          'failures': 1}, db_api.retry_stats[self.name])
+
+    def test_reraises_inner_exception_of_retry_request(self):
+        plugin = FakePlugin([db_exc.RetryRequest(ValueError())] *
+                            (db_api.MAX_RETRIES + 1))
+
+        self.assertRaises(ValueError, plugin.create_thing, self.ctx, {})
+
+    def test_does_not_retry_other_errors(self):
+        plugin = FakePlugin([db_exc.DBDuplicateEntry()])
+
+        self.assertRaises(db_exc.DBDuplicateEntry,
+                          plugin.create_thing, self.ctx, {})
+        self.assertEqual(1, len(plugin.calls))
+
+    def test_does_not_retry_within_transaction(self):
+        plugin = FakePlugin([db_exc.DBDeadlock()])
+
+        with self.ctx.session.begin():
+            self.assertRaises(db_exc.DBDeadlock,
+                              plugin.create_thing, self.ctx, {})
+        self.assertEqual(1, len(plugin.calls))
+        self.assertFalse(self.sleep.called)
+        self.assertNotIn(self.name, db_api.retry_stats)
+
+    def test_context_as_keyword_argument(self):
+        plugin = FakePlugin([db_exc.DBDeadlock()])
+
+        plugin.create_thing(context=self.ctx, thing={})
+        self.assertEqual(2, len(plugin.calls))
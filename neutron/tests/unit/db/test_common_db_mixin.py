@@ -0,0 +1,70 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from neutron.common import exceptions as n_exc
+from neutron import context
+from neutron.db import common_db_mixin
+from neutron.db import models_v2
+from neutron.db import sqlalchemyutils
+from neutron.tests.unit import testlib_api
+
+
+class TestCommonDbMixin(testlib_api.SqlTestCase):
+
+    def setUp(self):
+        super(TestCommonDbMixin, self).setUp()
+        self.mixin = common_db_mixin.CommonDbMixin()
+        self.ctx = context.get_admin_context()
+        with self.ctx.session.begin():
+            self.ctx.session.add(models_v2.Network(
+                id='n1', name='net1', tenant_id='t1',
+                admin_state_up=True, status='ACTIVE', shared=False))
+
+    def _get_marker_values(self, ctx, sorts):
+        marker = self.mixin._get_marker_obj(ctx, 'network', 10, 'n1')
+        return self.mixin._get_marker_values(ctx, models_v2.Network,
+                                             marker, sorts)
+
+    def test_get_marker_obj_without_limit(self):
+        self.assertIsNone(self.mixin._get_marker_obj(self.ctx, 'network',
+                                                     None, 'n1'))
+
+    def test_get_marker_values(self):
+        self.mixin._get_network = mock.Mock()
+        self.assertEqual({'name': 'net1', 'id': 'n1'},
+                         self._get_marker_values(
+                             self.ctx, [('name', True), ('id', True)]))
+        self.assertFalse(self.mixin._get_network.called)
+
+    def test_get_marker_values_not_visible(self):
+        # The marker is loaded to raise the not found error of the resource
+        self.mixin._get_network = mock.Mock(
+            side_effect=n_exc.NetworkNotFound(net_id='n1'))
+        ctx = context.Context('user', 't2')
+        self.assertRaises(n_exc.NetworkNotFound, self._get_marker_values,
+                          ctx, [('id', True)])
+
+    def test_get_marker_values_relationship_sort_key(self):
+        self.mixin._get_network = mock.Mock()
+        self._get_marker_values(self.ctx, [('subnets', True), ('id', True)])
+        self.mixin._get_network.assert_called_once_with(self.ctx, 'n1')
+
+    def test_get_marker_values_object(self):
+        marker = mock.Mock()
+        self.assertEqual(marker, self.mixin._get_marker_values(
+            self.ctx, models_v2.Network, marker, [('id', True)]))
+
+    def test_get_marker_obj(self):
+        marker = self.mixin._get_marker_obj(self.ctx, 'network', 10, 'n1')
+        self.assertIsInstance(marker, sqlalchemyutils.Marker)
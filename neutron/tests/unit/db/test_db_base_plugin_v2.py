@@ -22,6 +22,7 @@ import netaddr
 from oslo_config import cfg
 from oslo_db import exception as db_exc
 from oslo_utils import importutils
+from sqlalchemy import event
 from sqlalchemy import orm
 from testtools import matchers
 import webob.exc
@@ -37,8 +38,11 @@ from neutron.common import ipv6_utils
 from neutron.common import test_lib
 from neutron.common import utils
 from neutron import context
+from neutron.db import api as db_api
 from neutron.db import db_base_plugin_v2
+from neutron.db import mac_blocks_db
 from neutron.db import models_v2
+from neutron.ipam import bitmap
 from neutron import manager
 from neutron.tests import base
 from neutron.tests.unit.api import test_extensions
@@ -950,6 +954,25 @@ class TestPortsV2(NeutronDbPluginV2TestCase):
             for p in self.deserialize(self.fmt, res)['ports']:
                 self._delete('ports', p['id'])
 
+    def test_create_ports_bulk_native_generated_mac_taken(self):
+        if self._skip_native_bulk:
+            self.skipTest("Plugin does not support native bulk port create")
+        with self.port() as port:
+            mac = port['port']['mac_address']
+            net_id = port['port']['network_id']
+            # Another request took a generated MAC address after the check
+            with mock.patch.object(db_base_plugin_v2.NeutronDbPluginV2,
+                                   '_generate_macs',
+                                   return_value=[mac, 'fa:16:3e:00:00:99']):
+                res = self._create_port_bulk(self.fmt, 2, net_id, 'test',
+                                             True)
+            self._validate_behavior_on_bulk_success(res, 'ports')
+            macs = [p['mac_address']
+                    for p in self.deserialize(self.fmt, res)['ports']]
+            self.assertNotIn(mac, macs)
+            self.assertIn('fa:16:3e:00:00:99', macs)
+            self.assertEqual(2, len(set(macs)))
+
     def test_create_ports_bulk_emulated(self):
         real_has_attr = hasattr
 
@@ -2213,6 +2236,182 @@ fixed_ips=ip_address%%3D%s&fixed_ips=ip_address%%3D%s&fixed_ips=subnet_id%%3D%s
         self._test_delete_ports_ignores_port_not_found(plugin)
 
 
+class TestPortListQueries(NeutronDbPluginV2TestCase):
+    """Tests of the queries listing ports, run with the base plugin only."""
+
+    def _count_queries(self, func, *args):
+        statements = []
+
+        def _after_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        engine = db_api.get_engine()
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+        try:
+            func(*args)
+        finally:
+            event.remove(engine, 'after_cursor_execute',
+                         _after_cursor_execute)
+        return len(statements)
+
+    def test_list_ports_query_count(self):
+        # The relationships of the ports are loaded by one query each
+        plugin = manager.NeutronManager.get_plugin()
+        ctx = context.get_admin_context()
+        with self.subnet() as subnet:
+            network_id = subnet['subnet']['network_id']
+            self._create_port(self.fmt, network_id)
+            query_count = self._count_queries(plugin.get_ports, ctx)
+            for i in range(5):
+                self._create_port(self.fmt, network_id)
+            self.assertEqual(query_count,
+                             self._count_queries(plugin.get_ports, ctx))
+
+    def test_list_ports_column_fields(self):
+        plugin = manager.NeutronManager.get_plugin()
+        with contextlib.nested(self.port(), self.port()) as ports:
+            with mock.patch.object(plugin, '_make_port_dict') as make_dict:
+                res = self._list('ports',
+                                 query_params='fields=id&fields=device_id')
+            self.assertFalse(make_dict.called)
+            self.assertEqual(sorted(port['port']['id'] for port in ports),
+                             sorted(port['id'] for port in res['ports']))
+            for port in res['ports']:
+                self.assertEqual(set(['id', 'device_id']), set(port))
+
+    def test_list_ports_relationship_fields(self):
+        plugin = manager.NeutronManager.get_plugin()
+        with self.port() as port:
+            with mock.patch.object(plugin, '_make_port_dict',
+                                   wraps=plugin._make_port_dict) as make_dict:
+                res = self._list('ports',
+                                 query_params='fields=id&fields=fixed_ips')
+            self.assertTrue(make_dict.called)
+            self.assertEqual(port['port']['fixed_ips'],
+                             res['ports'][0]['fixed_ips'])
+
+
+class TestRandomIpAllocation(NeutronDbPluginV2TestCase):
+    """Tests of the random IP allocation, reserving the addresses."""
+
+    def setUp(self):
+        super(TestRandomIpAllocation, self).setUp()
+        cfg.CONF.set_override('ip_allocation', 'random')
+
+    def _get_allocations(self, subnet_id):
+        session = db_api.get_session()
+        return dict((allocation['ip_address'], allocation['port_id'])
+                    for allocation in session.query(
+                        models_v2.IPAllocation).filter_by(
+                            subnet_id=subnet_id))
+
+    def _reserve_ip(self, subnet, ip_address):
+        ctx = context.get_admin_context()
+        with ctx.session.begin():
+            return db_base_plugin_v2.NeutronDbPluginV2._reserve_ip(
+                ctx, subnet['network_id'], subnet['id'], ip_address)
+
+    def test_create_port_claims_reserved_ip(self):
+        with self.subnet(cidr='10.0.0.0/29') as subnet:
+            with self.port(subnet=subnet) as port:
+                fixed_ip = port['port']['fixed_ips'][0]
+                self.assertIn(netaddr.IPAddress(fixed_ip['ip_address']),
+                              netaddr.IPRange('10.0.0.2', '10.0.0.6'))
+                self.assertEqual(
+                    {fixed_ip['ip_address']: port['port']['id']},
+                    self._get_allocations(subnet['subnet']['id']))
+                ctx = context.get_admin_context()
+                self.assertFalse(ctx.session.query(
+                    models_v2.IPAvailabilityRange).count())
+
+    def test_create_port_skips_concurrent_reservation(self):
+        with self.subnet(cidr='10.0.0.0/29') as subnet:
+            # Another request reserved an address which is tried first
+            self.assertTrue(self._reserve_ip(subnet['subnet'], '10.0.0.2'))
+            self.assertFalse(self._reserve_ip(subnet['subnet'], '10.0.0.2'))
+            with mock.patch.object(db_base_plugin_v2.NeutronDbPluginV2,
+                                   '_get_random_ip',
+                                   side_effect=['10.0.0.2', '10.0.0.3']):
+                with self.port(subnet=subnet) as port:
+                    self.assertEqual('10.0.0.3',
+                                     port['port']['fixed_ips'][0][
+                                         'ip_address'])
+                    self.assertEqual(
+                        {'10.0.0.2': None, '10.0.0.3': port['port']['id']},
+                        self._get_allocations(subnet['subnet']['id']))
+
+    def test_create_port_exhausted_pool(self):
+        with self.subnet(cidr='10.0.0.0/29') as subnet:
+            for ip in range(2, 7):
+                self._reserve_ip(subnet['subnet'], '10.0.0.%d' % ip)
+            res = self._create_port(self.fmt, subnet['subnet']['network_id'])
+            self.assertEqual(webob.exc.HTTPConflict.code, res.status_int)
+
+    def test_delete_port_releases_ip(self):
+        with self.subnet(cidr='10.0.0.0/29') as subnet:
+            fixed_ips = [{'subnet_id': subnet['subnet']['id'],
+                          'ip_address': '10.0.0.4'}]
+            network_id = subnet['subnet']['network_id']
+            port = self.deserialize(self.fmt, self._create_port(
+                self.fmt, network_id, fixed_ips=fixed_ips))
+            self._delete('ports', port['port']['id'])
+            self.assertEqual({}, self._get_allocations(
+                subnet['subnet']['id']))
+            res = self._create_port(self.fmt, network_id,
+                                    fixed_ips=fixed_ips)
+            self.assertEqual(webob.exc.HTTPCreated.code, res.status_int)
+
+
+class TestBitmapIpAllocation(NeutronDbPluginV2TestCase):
+    """Tests of the bitmap IP allocation against the database."""
+
+    def setUp(self):
+        super(TestBitmapIpAllocation, self).setUp()
+        cfg.CONF.set_override('ip_allocation', 'bitmap')
+        mock.patch.dict(bitmap.BitmapPool._subnet_bitmaps, clear=True).start()
+
+    def _create_fixed_ip_port(self, subnet, ip_address):
+        fixed_ips = [{'subnet_id': subnet['subnet']['id'],
+                      'ip_address': ip_address}]
+        return self._create_port(self.fmt, subnet['subnet']['network_id'],
+                                 fixed_ips=fixed_ips)
+
+    def test_recreate_port_with_fixed_ip(self):
+        with self.subnet(cidr='10.0.0.0/24') as subnet:
+            res = self._create_fixed_ip_port(subnet, '10.0.0.10')
+            port = self.deserialize(self.fmt, res)
+            self._delete('ports', port['port']['id'])
+            res = self._create_fixed_ip_port(subnet, '10.0.0.10')
+            self.assertEqual(webob.exc.HTTPCreated.code, res.status_int)
+
+    def test_create_port_with_used_fixed_ip(self):
+        with self.subnet(cidr='10.0.0.0/24') as subnet:
+            res = self._create_fixed_ip_port(subnet, '10.0.0.10')
+            self.assertEqual(webob.exc.HTTPCreated.code, res.status_int)
+            res = self._create_fixed_ip_port(subnet, '10.0.0.10')
+            self.assertEqual(webob.exc.HTTPConflict.code, res.status_int)
+
+    def test_create_port_after_rollback(self):
+        with self.subnet(cidr='10.0.0.0/24') as subnet:
+            with mock.patch.object(db_base_plugin_v2.NeutronDbPluginV2,
+                                   '_store_ip_allocation',
+                                   side_effect=db_exc.DBError()):
+                res = self._create_fixed_ip_port(subnet, '10.0.0.10')
+                self.assertEqual(webob.exc.HTTPInternalServerError.code,
+                                 res.status_int)
+            res = self._create_fixed_ip_port(subnet, '10.0.0.10')
+            self.assertEqual(webob.exc.HTTPCreated.code, res.status_int)
+
+    def test_delete_subnet_removes_bitmaps(self):
+        with self.subnet(cidr='10.0.0.0/24') as subnet:
+            subnet_id = subnet['subnet']['id']
+            with self.port(subnet=subnet) as port:
+                self.assertIn(subnet_id, bitmap.BitmapPool._subnet_bitmaps)
+                self._delete('ports', port['port']['id'])
+            self._delete('subnets', subnet_id)
+            self.assertNotIn(subnet_id, bitmap.BitmapPool._subnet_bitmaps)
+
+
 class TestNetworksV2(NeutronDbPluginV2TestCase):
     # NOTE(cerberus): successful network update and delete are
     #                 effectively tested above
@@ -5295,6 +5494,106 @@ class TestNeutronDbPluginV2(base.BaseTestCase):
         self.assertEqual(2, generate.call_count)
         rebuild.assert_called_once_with('c', 's')
 
+    def test_generate_ip_random(self):
+        cfg.CONF.set_override('ip_allocation', 'random')
+        with contextlib.nested(
+            mock.patch.object(db_base_plugin_v2.NeutronDbPluginV2,
+                              '_try_generate_ip'),
+            mock.patch.object(db_base_plugin_v2.NeutronDbPluginV2,
+                              '_generate_random_ip')
+        ) as (generate, generate_random):
+            db_base_plugin_v2.NeutronDbPluginV2._generate_ip('c', 's')
+
+        generate_random.assert_called_once_with('c', 's')
+        self.assertFalse(generate.called)
+
+    def test_generate_ip_bitmap(self):
+        cfg.CONF.set_override('ip_allocation', 'bitmap')
+        context = mock.Mock()
+        subnets = [{'id': 's1', 'network_id': 'n', 'cidr': '10.0.0.0/24'},
+                   {'id': 's2', 'network_id': 'n', 'cidr': '10.0.1.0/24'}]
+        ipam_subnet = mock.Mock()
+        ipam_subnet.allocate.side_effect = [
+            n_exc.IpAddressGenerationFailure(net_id='n'),
+            netaddr.IPAddress('10.0.1.2')]
+        with contextlib.nested(
+            mock.patch.object(bitmap.BitmapPool, 'get_subnet',
+                              return_value=ipam_subnet),
+            mock.patch.object(db_base_plugin_v2.NeutronDbPluginV2,
+                              '_drop_availability_ranges')
+        ) as (get_subnet, drop_ranges):
+            result = db_base_plugin_v2.NeutronDbPluginV2._generate_ip(
+                context, subnets)
+
+        self.assertEqual({'ip_address': '10.0.1.2', 'subnet_id': 's2'},
+                         result)
+        get_subnet.assert_has_calls([mock.call('s1'), mock.call('s2')])
+        drop_ranges.assert_has_calls([mock.call(context, 's1'),
+                                      mock.call(context, 's2')])
+
+    def test_generate_mac_blocks(self):
+        cfg.CONF.set_override('mac_allocation', 'blocks')
+        with mock.patch.object(mac_blocks_db, 'generate_mac',
+                               return_value='fa:16:3e:00:00:01'):
+            self.assertEqual(
+                'fa:16:3e:00:00:01',
+                db_base_plugin_v2.NeutronDbPluginV2._generate_mac())
+
+    def _generate_macs(self, generated, in_use, count, used=()):
+        context = mock.Mock()
+        query = context.session.query.return_value
+        query.filter.side_effect = in_use
+        with mock.patch.object(db_base_plugin_v2.NeutronDbPluginV2,
+                               '_generate_mac', side_effect=generated):
+            return db_base_plugin_v2.NeutronDbPluginV2._generate_macs(
+                context, 'n', count, used), query
+
+    def test_generate_macs(self):
+        macs, query = self._generate_macs(
+            ['m1', 'm2', 'm1', 'm3', 'm4'], [[('m2',)], []], 3)
+        self.assertEqual(['m1', 'm3', 'm4'], sorted(macs))
+        self.assertEqual(2, query.filter.call_count)
+
+    def test_generate_macs_skips_used(self):
+        macs, query = self._generate_macs(['m1', 'm2'], [[]], 1,
+                                          used=['m1'])
+        self.assertEqual(['m2'], macs)
+        self.assertEqual(1, query.filter.call_count)
+
+    def test_generate_macs_failure(self):
+        cfg.CONF.set_override('mac_generation_retries', 2)
+        self.assertRaises(n_exc.MacAddressGenerationFailure,
+                          self._generate_macs, ['m1', 'm1'],
+                          [[('m1',)], [('m1',)]], 1)
+
+    def test_generate_macs_for_ports(self):
+        ports = [{'port': {'network_id': 'n1',
+                           'mac_address': attributes.ATTR_NOT_SPECIFIED}},
+                 {'port': {'network_id': 'n1', 'mac_address': 'm0'}},
+                 {'port': {'network_id': 'n1',
+                           'mac_address': attributes.ATTR_NOT_SPECIFIED}},
+                 {'port': {'network_id': 'n2',
+                           'mac_address': attributes.ATTR_NOT_SPECIFIED}}]
+        with mock.patch.object(db_base_plugin_v2.NeutronDbPluginV2,
+                               '_generate_macs',
+                               side_effect=lambda c, n, count, used: [
+                                   '%s-%s' % (n, i) for i in range(count)]
+                               ) as generate:
+            db_base_plugin_v2.NeutronDbPluginV2._generate_macs_for_ports(
+                'c', ports)
+
+        self.assertEqual(['n1-0', None, 'n1-1', 'n2-0'],
+                         [p['port'].get(db_base_plugin_v2.GENERATED_MAC)
+                          for p in ports])
+        # The generated MAC addresses are not requested ones
+        self.assertEqual([attributes.ATTR_NOT_SPECIFIED, 'm0',
+                          attributes.ATTR_NOT_SPECIFIED,
+                          attributes.ATTR_NOT_SPECIFIED],
+                         [p['port']['mac_address'] for p in ports])
+        generate.assert_has_calls([mock.call('c', 'n1', 2, set(['m0'])),
+                                   mock.call('c', 'n2', 1, set())],
+                                  any_order=True)
+
     def _validate_rebuild_availability_ranges(self, pools, allocations,
                                               expected):
         ip_qry = mock.Mock()
@@ -0,0 +1,91 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+from oslo_config import cfg
+from sqlalchemy import orm
+
+from neutron.db import api as db_api
+from neutron.db import mac_blocks_db
+from neutron.tests.unit import testlib_api
+
+
+class TestMacAddressAllocator(testlib_api.SqlTestCase):
+
+    def _get_next_offset(self, base_mac):
+        return db_api.get_session().query(
+            mac_blocks_db.MacAddressRange.next_offset).filter_by(
+                base_mac=base_mac).scalar()
+
+    def test_get_mac(self):
+        allocator = mac_blocks_db.MacAddressAllocator('fa:16:3e:00:00:00', 2)
+        self.assertEqual(['fa:16:3e:00:00:00', 'fa:16:3e:00:00:01',
+                          'fa:16:3e:00:00:02'],
+                         [allocator.get_mac() for i in range(3)])
+        self.assertEqual(4, self._get_next_offset('fa:16:3e:00:00:00'))
+
+    def test_get_mac_4_octets(self):
+        allocator = mac_blocks_db.MacAddressAllocator('fa:16:3e:4f:00:00',
+                                                      256)
+        self.assertEqual(1 << 16, allocator.size)
+        self.assertEqual('fa:16:3e:4f:00:00', allocator.get_mac())
+
+    def test_allocators_reserve_distinct_blocks(self):
+        allocators = [mac_blocks_db.MacAddressAllocator('fa:16:3e:00:00:00',
+                                                        4) for i in range(2)]
+        macs = [allocator.get_mac() for i in range(6)
+                for allocator in allocators]
+        self.assertEqual(len(macs), len(set(macs)))
+        self.assertEqual(16, self._get_next_offset('fa:16:3e:00:00:00'))
+
+    def test_reserve_block_retries_on_concurrent_reservation(self):
+        first = mac_blocks_db.MacAddressAllocator('fa:16:3e:00:00:00', 4)
+        second = mac_blocks_db.MacAddressAllocator('fa:16:3e:00:00:00', 4)
+        first._reserve_block()
+        orig_scalar = orm.Query.scalar
+        offsets = []
+
+        def scalar(query):
+            offset = orig_scalar(query)
+            if not offsets:
+                offsets.append(offset)
+                # Another process reserves a block once the offset is read
+                first._reserve_block()
+            return offset
+
+        with mock.patch.object(orm.Query, 'scalar', autospec=True,
+                               side_effect=scalar):
+            self.assertEqual((8, 12), second._reserve_block())
+        self.assertEqual([4], offsets)
+
+    def test_reserve_block_wraps_around(self):
+        allocator = mac_blocks_db.MacAddressAllocator('fa:16:3e:4f:00:00',
+                                                      (1 << 16) - 2)
+        self.assertEqual((0, (1 << 16) - 2), allocator._reserve_block())
+        self.assertEqual(((1 << 16) - 2, 1 << 16), allocator._reserve_block())
+        self.assertEqual(0, self._get_next_offset('fa:16:3e:4f:00:00'))
+        self.assertEqual((0, (1 << 16) - 2), allocator._reserve_block())
+
+    def test_get_mac_after_fork(self):
+        allocator = mac_blocks_db.MacAddressAllocator('fa:16:3e:00:00:00', 4)
+        allocator.get_mac()
+        # The allocator was created by the parent of the process
+        allocator._pid = -1
+        self.assertEqual('fa:16:3e:00:00:04', allocator.get_mac())
+
+    def test_generate_mac(self):
+        cfg.CONF.set_override('mac_block_size', 8)
+        mac_blocks_db._allocators.clear()
+        self.addCleanup(mac_blocks_db._allocators.clear)
+        self.assertEqual('fa:16:3e:00:00:00', mac_blocks_db.generate_mac())
+        self.assertEqual('fa:16:3e:00:00:01', mac_blocks_db.generate_mac())
+        self.assertEqual(8, self._get_next_offset('fa:16:3e:00:00:00'))
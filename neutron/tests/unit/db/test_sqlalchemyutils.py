@@ -0,0 +1,79 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+from sqlalchemy.dialects import mysql
+from sqlalchemy import orm
+
+from neutron import context
+from neutron.db import models_v2
+from neutron.db import sqlalchemyutils
+from neutron.tests.unit import testlib_api
+
+
+class TestPaginateQuery(testlib_api.SqlTestCase):
+
+    def setUp(self):
+        super(TestPaginateQuery, self).setUp()
+        self.ctx = context.get_admin_context()
+        with self.ctx.session.begin():
+            for i in range(10):
+                self.ctx.session.add(models_v2.Network(
+                    id='id%d' % i, name='net%d' % (i % 3), tenant_id='t',
+                    admin_state_up=True, status='ACTIVE', shared=False))
+
+    def _list_pages(self, sorts, limit=3):
+        pages = []
+        marker = None
+        while True:
+            query = self.ctx.session.query(models_v2.Network)
+            query = sqlalchemyutils.paginate_query(
+                query, models_v2.Network, limit, sorts, marker)
+            page = [(network.name, network.id) for network in query]
+            if not page:
+                return pages
+            pages.append(page)
+            marker = dict(zip(('name', 'id'), page[-1]))
+
+    def _test_paginate_query(self, sorts):
+        networks = sorted(('net%d' % (i % 3), 'id%d' % i) for i in range(10))
+        if not sorts[0][1]:
+            networks.sort(key=lambda network: network[0], reverse=True)
+        pages = self._list_pages(sorts)
+        self.assertEqual(4, len(pages))
+        self.assertEqual(networks, sum(pages, []))
+
+    def test_paginate_query(self):
+        self._test_paginate_query([('name', True), ('id', True)])
+
+    def test_paginate_query_mixed_directions(self):
+        self._test_paginate_query([('name', False), ('id', True)])
+
+    def _compile_marker_criteria(self, sorts):
+        session = mock.Mock()
+        session.get_bind.return_value.dialect.name = 'mysql'
+        query = orm.Query(models_v2.Network,
+                          session=session).enable_eagerloads(False)
+        query = sqlalchemyutils.paginate_query(
+            query, models_v2.Network, 3, sorts, {'name': 'n', 'id': 'i'})
+        return str(query.statement.compile(dialect=mysql.dialect()))
+
+    def test_marker_row_values(self):
+        statement = self._compile_marker_criteria([('name', True),
+                                                   ('id', True)])
+        self.assertIn('(networks.name, networks.id) > (%s, %s)', statement)
+
+    def test_marker_mixed_directions(self):
+        statement = self._compile_marker_criteria([('name', False),
+                                                   ('id', True)])
+        self.assertNotIn('(networks.name, networks.id)', statement)
+        self.assertIn('networks.name <= %s', statement)
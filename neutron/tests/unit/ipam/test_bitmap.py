@@ -0,0 +1,217 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+import netaddr
+from oslo_db import exception as db_exc
+import testtools
+
+from neutron.common import exceptions as n_exc
+from neutron.db import models_v2
+import neutron.ipam as ipam
+from neutron.ipam import bitmap
+from neutron.ipam import subnet_alloc
+from neutron.tests import base
+
+
+class TestAddressBitmap(base.BaseTestCase):
+
+    def test_add_discard(self):
+        addresses = bitmap.AddressBitmap(10, 20)
+        addresses.add(12)
+        self.assertIn(12, addresses)
+        self.assertNotIn(13, addresses)
+        self.assertNotIn(30, addresses)
+        addresses.discard(12)
+        self.assertNotIn(12, addresses)
+
+    def test_find_free_from_cursor(self):
+        addresses = bitmap.AddressBitmap(10, 13)
+        found = []
+        for i in range(4):
+            found.append(addresses.find_free())
+            addresses.add(found[-1])
+        self.assertEqual([10, 11, 12, 13], found)
+        self.assertIsNone(addresses.find_free())
+
+    def test_find_free_wraps_around(self):
+        addresses = bitmap.AddressBitmap(10, 13)
+        for value in (10, 11, 12, 13):
+            addresses.add(value)
+            addresses.find_free()
+        addresses.discard(11)
+        self.assertEqual(11, addresses.find_free())
+
+    def test_find_free_skips_full_chunks(self):
+        chunk_bits = bitmap.AddressBitmap.CHUNK_BITS
+        addresses = bitmap.AddressBitmap(0, 3 * chunk_bits - 1)
+        for value in range(chunk_bits + 9):
+            addresses.add(value)
+        self.assertEqual(chunk_bits + 9, addresses.find_free())
+
+    def test_find_free_last_chunk(self):
+        chunk_bits = bitmap.AddressBitmap.CHUNK_BITS
+        addresses = bitmap.AddressBitmap(0, chunk_bits + 2)
+        for value in range(chunk_bits + 2):
+            addresses.add(value)
+        self.assertEqual(chunk_bits + 2, addresses.find_free())
+        addresses.add(chunk_bits + 2)
+        self.assertIsNone(addresses.find_free())
+
+    def test_large_range(self):
+        network = netaddr.IPNetwork('2001:db8::/64')
+        addresses = bitmap.AddressBitmap(network.first, network.last)
+        addresses.add(network.first)
+        self.assertEqual(network.first + 1, addresses.find_free())
+
+
+class TestBitmapSubnet(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestBitmapSubnet, self).setUp()
+        self.subnet = {'id': 's', 'network_id': 'n', 'tenant_id': 't',
+                       'cidr': '10.0.0.0/24', 'ip_version': 4,
+                       'gateway_ip': '10.0.0.1'}
+        self.pools = [{'first_ip': '10.0.0.2', 'last_ip': '10.0.0.5'}]
+        self.allocations = []
+        self.deleted = mock.Mock()
+        self.session = mock.MagicMock()
+        self.session.query.side_effect = self._query
+        mock.patch.dict(bitmap.BitmapPool._subnet_bitmaps, clear=True).start()
+        self.ipam_subnet = bitmap.BitmapSubnet(self.session, self.subnet)
+
+    def _query(self, model):
+        query = mock.Mock()
+        if model == models_v2.IPAllocationPool:
+            query.filter_by.return_value = self.pools
+        elif model == models_v2.IPAllocation:
+            query.filter_by.side_effect = (
+                lambda **kwargs: (self.deleted if 'ip_address' in kwargs
+                                  else self.allocations))
+        return query
+
+    def _added_ips(self):
+        return [args[0]['ip_address']
+                for args, kwargs in self.session.add.call_args_list]
+
+    def test_allocate_any(self):
+        self.allocations.append({'ip_address': '10.0.0.2'})
+        address = self.ipam_subnet.allocate(ipam.AnyAddressRequest())
+        self.assertEqual(netaddr.IPAddress('10.0.0.3'), address)
+        address = self.ipam_subnet.allocate(ipam.AnyAddressRequest())
+        self.assertEqual(netaddr.IPAddress('10.0.0.4'), address)
+        self.assertEqual(['10.0.0.3', '10.0.0.4'], self._added_ips())
+
+    def test_allocate_any_retries_conflicts(self):
+        self.session.begin_nested.return_value.__exit__.side_effect = [
+            db_exc.DBDuplicateEntry(), None]
+        address = self.ipam_subnet.allocate(ipam.AnyAddressRequest())
+        self.assertEqual(netaddr.IPAddress('10.0.0.3'), address)
+        self.assertEqual(['10.0.0.2', '10.0.0.3'], self._added_ips())
+
+    def test_allocate_any_rebuilds_full_bitmap(self):
+        for i in range(2, 6):
+            self.ipam_subnet.allocate(ipam.AnyAddressRequest())
+        # Another process freed an address
+        self.allocations.extend({'ip_address': '10.0.0.%d' % i}
+                                for i in (2, 3, 5))
+        address = self.ipam_subnet.allocate(ipam.AnyAddressRequest())
+        self.assertEqual(netaddr.IPAddress('10.0.0.4'), address)
+
+    def test_allocate_any_exhausted(self):
+        self.allocations.extend({'ip_address': '10.0.0.%d' % i}
+                                for i in range(2, 6))
+        with testtools.ExpectedException(n_exc.IpAddressGenerationFailure):
+            self.ipam_subnet.allocate(ipam.AnyAddressRequest())
+        self.assertFalse(self.session.add.called)
+
+    def test_allocate_specific(self):
+        address = netaddr.IPAddress('10.0.0.3')
+        self.assertEqual(address, self.ipam_subnet.allocate(
+            ipam.SpecificAddressRequest(address)))
+        self.session.begin_nested.return_value.__exit__.side_effect = [
+            db_exc.DBDuplicateEntry(), None, None]
+        with testtools.ExpectedException(n_exc.IpAddressInUse):
+            self.ipam_subnet.allocate(ipam.SpecificAddressRequest(address))
+        # The allocated address is not generated
+        self.assertEqual(netaddr.IPAddress('10.0.0.2'),
+                         self.ipam_subnet.allocate(ipam.AnyAddressRequest()))
+        self.assertEqual(netaddr.IPAddress('10.0.0.4'),
+                         self.ipam_subnet.allocate(ipam.AnyAddressRequest()))
+
+    def test_allocate_specific_stale_bitmap(self):
+        address = netaddr.IPAddress('10.0.0.3')
+        self.ipam_subnet.allocate(ipam.SpecificAddressRequest(address))
+        # The port of the address was deleted without freeing its bit
+        self.assertEqual(address, self.ipam_subnet.allocate(
+            ipam.SpecificAddressRequest(address)))
+        self.assertEqual(['10.0.0.3', '10.0.0.3'], self._added_ips())
+
+    def test_allocate_specific_outside_subnet(self):
+        with testtools.ExpectedException(n_exc.InvalidIpForSubnet):
+            self.ipam_subnet.allocate(
+                ipam.SpecificAddressRequest('10.0.1.3'))
+
+    def test_deallocate(self):
+        for i in range(2, 6):
+            self.ipam_subnet.allocate(ipam.AnyAddressRequest())
+        self.ipam_subnet.deallocate('10.0.0.4')
+        self.deleted.delete.assert_called_once_with()
+        self.assertEqual(netaddr.IPAddress('10.0.0.4'),
+                         self.ipam_subnet.allocate(ipam.AnyAddressRequest()))
+
+    def test_allocate_unsupported_request(self):
+        request = ipam.RouterGatewayAddressRequest()
+        with testtools.ExpectedException(n_exc.InvalidAddressRequest):
+            self.ipam_subnet.allocate(request)
+
+    def test_pool_change_rebuilds_bitmap(self):
+        self.ipam_subnet.allocate(ipam.AnyAddressRequest())
+        self.pools[0] = {'first_ip': '10.0.0.10', 'last_ip': '10.0.0.20'}
+        self.assertEqual(netaddr.IPAddress('10.0.0.10'),
+                         self.ipam_subnet.allocate(ipam.AnyAddressRequest()))
+
+
+class TestBitmapPool(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestBitmapPool, self).setUp()
+        self.session = mock.Mock()
+        mock.patch.dict(bitmap.BitmapPool._subnet_bitmaps, clear=True).start()
+
+    def test_allocate_subnet(self):
+        subnetpool = self.session.query.return_value.filter_by.return_value
+        request = mock.Mock()
+        with mock.patch.object(subnet_alloc, 'SubnetAllocator') as allocator:
+            result = bitmap.BitmapPool(self.session, 'sp').allocate_subnet(
+                request)
+        allocator.assert_called_once_with(subnetpool.first.return_value)
+        allocator.return_value.allocate_subnet.assert_called_once_with(
+            self.session, request)
+        self.assertEqual(allocator.return_value.allocate_subnet.return_value,
+                         result)
+
+    def test_allocate_subnet_without_subnet_pool(self):
+        with testtools.ExpectedException(n_exc.SubnetAllocationError):
+            bitmap.BitmapPool(self.session).allocate_subnet(mock.Mock())
+
+    def test_allocate_subnet_unknown_subnet_pool(self):
+        query = self.session.query.return_value.filter_by.return_value
+        query.first.return_value = None
+        with testtools.ExpectedException(n_exc.SubnetPoolNotFound):
+            bitmap.BitmapPool(self.session, 'sp').allocate_subnet(
+                mock.Mock())
+
+    def test_remove_subnet(self):
+        bitmap.BitmapPool._subnet_bitmaps['s'] = mock.Mock()
+        bitmap.BitmapPool(self.session).remove_subnet('s')
+        self.assertNotIn('s', bitmap.BitmapPool._subnet_bitmaps)
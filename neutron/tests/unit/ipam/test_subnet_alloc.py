@@ -13,6 +13,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import mock
 import netaddr
 from oslo_config import cfg
 
@@ -20,6 +21,7 @@ from neutron.api.v2 import attributes
 from neutron.common import constants
 from neutron.common import exceptions as n_exc
 from neutron import context
+from neutron.db import models_v2
 import neutron.ipam as ipam
 from neutron.ipam import subnet_alloc
 from neutron import manager
@@ -153,6 +155,24 @@ class TestSubnetAllocation(testlib_api.SqlTestCase):
         value = sa._allocations_used_by_tenant(self.ctx.session, 32)
         self.assertEqual(value, 0)
 
+    def test__allocation_value_for_tenant(self):
+        sp = self._create_subnet_pool(self.plugin, self.ctx, 'test-sp',
+                                      ['10.1.0.0/16'], 21, 4)
+        with self.ctx.session.begin(subtransactions=True):
+            network = models_v2.Network(id='net', tenant_id=self._tenant_id)
+            self.ctx.session.add(network)
+            for tenant_id, cidr in ((self._tenant_id, '10.1.0.0/24'),
+                                    (self._tenant_id, '10.1.1.0/25'),
+                                    ('other-tenant', '10.1.2.0/24')):
+                self.ctx.session.add(models_v2.Subnet(
+                    tenant_id=tenant_id, network_id='net', ip_version=4,
+                    cidr=cidr, subnetpool_id=sp['id']))
+        sa = subnet_alloc.SubnetAllocator(sp)
+        with mock.patch.object(sa, '_get_free_prefixes') as free_prefixes:
+            value = sa._allocations_used_by_tenant(self.ctx.session, 32)
+        self.assertEqual(384, value)
+        self.assertFalse(free_prefixes.called)
+
     def test_subnetpool_default_quota_exceeded(self):
         sp = self._create_subnet_pool(self.plugin, self.ctx, 'test-sp',
                                       ['fe80::/48'],
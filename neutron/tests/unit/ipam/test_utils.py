@@ -0,0 +1,134 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import netaddr
+
+from neutron.ipam import utils
+from neutron.tests import base
+
+
+class TestIpamUtils(base.BaseTestCase):
+
+    def test_ip_to_int(self):
+        for ip_address in ('0.0.0.0', '192.168.1.3', '255.255.255.255',
+                           '::', '2001::ffff:ffff:ffff:fffe',
+                           '::ffff:10.0.0.1'):
+            self.assertEqual(int(netaddr.IPAddress(ip_address)),
+                             utils.ip_to_int(ip_address))
+
+    def test_get_free_ranges(self):
+        allocated = [1, 3, 4, 7, 11, 12, 20]
+        self.assertEqual([(2, 2), (5, 6), (8, 10)],
+                         list(utils.get_free_ranges(2, 10, allocated)))
+
+    def test_get_free_ranges_bounds_allocated(self):
+        self.assertEqual([(6, 9)],
+                         list(utils.get_free_ranges(5, 10, [5, 10])))
+
+    def test_get_free_ranges_all_allocated(self):
+        self.assertEqual([], list(utils.get_free_ranges(5, 7, [5, 6, 7])))
+
+    def test_get_free_ranges_none_allocated(self):
+        self.assertEqual([(5, 7)], list(utils.get_free_ranges(5, 7, [])))
+
+    def test_get_free_ranges_ipv6(self):
+        first = int(netaddr.IPAddress('2001::100'))
+        last = int(netaddr.IPAddress('2001::ffff:ffff:ffff:fffe'))
+        allocated = [first + 0x11]
+        self.assertEqual([(first, first + 0x10), (first + 0x12, last)],
+                         list(utils.get_free_ranges(first, last, allocated)))
+
+    def test_find_overlapping_ranges(self):
+        self.assertEqual((0, 1),
+                         utils.find_overlapping_ranges([(10, 20), (8, 10)]))
+
+    def test_find_overlapping_ranges_contained(self):
+        self.assertEqual((1, 2), utils.find_overlapping_ranges(
+            [(200, 300), (5, 10), (1, 100)]))
+
+    def test_find_overlapping_ranges_none(self):
+        self.assertIsNone(utils.find_overlapping_ranges(
+            [(20, 30), (1, 10), (11, 19)]))
+
+    def test_prefix_to_range(self):
+        for cidr in ('10.0.0.0/24', '10.0.0.5/32', '2001:db8::/64'):
+            network = netaddr.IPNetwork(cidr)
+            self.assertEqual((network.first, network.last),
+                             utils.prefix_to_range(cidr))
+
+    def test_range_to_prefixes(self):
+        first = int(netaddr.IPAddress('10.0.0.1'))
+        last = int(netaddr.IPAddress('10.0.0.254'))
+        prefixes = ['%s/%d' % (netaddr.IPAddress(prefix), prefixlen)
+                    for prefix, prefixlen in utils.range_to_prefixes(
+                        first, last, 32)]
+        self.assertEqual([str(cidr) for cidr in
+                          netaddr.IPRange(first, last).cidrs()], prefixes)
+
+    def test_range_to_prefixes_whole_space(self):
+        self.assertEqual([(0, 0)],
+                         list(utils.range_to_prefixes(0, 2 ** 32 - 1, 32)))
+
+    def test_subtract_ranges(self):
+        self.assertEqual([(2, 3), (6, 6), (10, 12)],
+                         list(utils.subtract_ranges(
+                             2, 12, [(0, 1), (4, 5), (7, 9), (14, 20)])))
+
+
+class TestFreePrefixes(base.BaseTestCase):
+
+    def _free_prefixes(self, *cidrs):
+        free_prefixes = utils.FreePrefixes(32)
+        for cidr in cidrs:
+            free_prefixes.add_range(*utils.prefix_to_range(cidr))
+        return free_prefixes
+
+    def _allocate(self, free_prefixes, prefixlen):
+        first = free_prefixes.allocate(prefixlen)
+        if first is not None:
+            return '%s/%d' % (netaddr.IPAddress(first), prefixlen)
+
+    def test_allocate(self):
+        free_prefixes = self._free_prefixes('10.0.0.0/24')
+        self.assertEqual('10.0.0.0/26', self._allocate(free_prefixes, 26))
+        self.assertEqual('10.0.0.64/26', self._allocate(free_prefixes, 26))
+        self.assertEqual('10.0.0.128/25', self._allocate(free_prefixes, 25))
+        self.assertIsNone(self._allocate(free_prefixes, 32))
+
+    def test_allocate_smallest_fitting_prefix(self):
+        free_prefixes = self._free_prefixes('10.0.0.0/24', '10.0.1.0/28')
+        self.assertEqual('10.0.1.0/29', self._allocate(free_prefixes, 29))
+        self.assertEqual('10.0.0.0/25', self._allocate(free_prefixes, 25))
+
+    def test_add_range_merges_buddies(self):
+        free_prefixes = self._free_prefixes('10.0.0.0/25', '10.0.0.128/25')
+        self.assertEqual('10.0.0.0/24', self._allocate(free_prefixes, 24))
+
+    def test_release(self):
+        free_prefixes = self._free_prefixes('10.0.0.0/24')
+        for i in range(4):
+            self._allocate(free_prefixes, 26)
+        for cidr in ('10.0.0.64/26', '10.0.0.0/26'):
+            free_prefixes.release(utils.prefix_to_range(cidr)[0], 26)
+        self.assertEqual('10.0.0.0/25', self._allocate(free_prefixes, 25))
+        self.assertIsNone(self._allocate(free_prefixes, 32))
+
+    def test_allocate_specific(self):
+        free_prefixes = self._free_prefixes('10.0.0.0/24')
+        first, last = utils.prefix_to_range('10.0.0.64/26')
+        self.assertTrue(free_prefixes.allocate_specific(first, 26))
+        self.assertFalse(free_prefixes.allocate_specific(first, 27))
+        self.assertFalse(free_prefixes.allocate_specific(
+            utils.prefix_to_range('10.0.0.0/24')[0], 24))
+        self.assertEqual('10.0.0.0/26', self._allocate(free_prefixes, 26))
+        self.assertEqual('10.0.0.128/25', self._allocate(free_prefixes, 25))
+        self.assertIsNone(self._allocate(free_prefixes, 26))
@@ -24,6 +24,7 @@ import webob
 import fixtures
 from oslo_db import exception as db_exc
 
+from neutron.api.rpc.agentnotifiers import dhcp_rpc_agent_api
 from neutron.callbacks import registry
 from neutron.common import constants
 from neutron.common import exceptions as exc
@@ -33,7 +34,9 @@ from neutron.db import api as db_api
 from neutron.db import db_base_plugin_v2 as base_plugin
 from neutron.db import l3_db
 from neutron.db import models_v2
+from neutron.extensions import allowedaddresspairs as addr_pair
 from neutron.extensions import external_net
+from neutron.extensions import extra_dhcp_opt as edo_ext
 from neutron.extensions import multiprovidernet as mpnet
 from neutron.extensions import portbindings
 from neutron.extensions import providernet as pnet
@@ -512,6 +515,40 @@ class TestMl2PortsV2(test_plugin.TestPortsV2, Ml2PluginV2TestCase):
                 self.assertFalse(m_upd.called)
                 p_upd.assert_called_once_with(ctx)
 
+    def test_create_ports_bulk_fetches_network_once(self):
+        # Only the networks fetched by the plugin are counted: the request
+        # is made as admin, as the API checks the network of each port of
+        # tenant requests, and the DHCP notifications also fetch them
+        plugin = manager.NeutronManager.get_plugin()
+        calls = []
+        with contextlib.nested(
+            self.network(),
+            mock.patch.object(plugin.mechanism_manager,
+                              'create_port_precommit',
+                              side_effect=lambda c: calls.append(
+                                  ('precommit', c.current['id']))),
+            mock.patch.object(plugin.mechanism_manager,
+                              'create_port_postcommit',
+                              side_effect=lambda c: calls.append(
+                                  ('postcommit', c.current['id']))),
+            mock.patch.object(dhcp_rpc_agent_api.DhcpAgentNotifyAPI,
+                              'notify'),
+            mock.patch.object(plugin, 'get_network',
+                              side_effect=plugin.get_network)
+        ) as (net, precommit, postcommit, notify, get_network):
+            res = self._create_port_bulk(self.fmt, 3, net['network']['id'],
+                                         'test', True, context=self.context)
+            ports = self.deserialize(self.fmt, res)['ports']
+
+            # The drivers are called for each port, in the usual order
+            port_ids = [port['id'] for port in ports]
+            self.assertEqual([('precommit', port_id) for port_id in port_ids] +
+                             [('postcommit', port_id)
+                              for port_id in port_ids], calls)
+            self.assertEqual(1, get_network.call_count)
+            self.assertEqual(3, len(set(port['mac_address']
+                                        for port in ports)))
+
     def test_delete_port_no_notify_in_disassociate_floatingips(self):
         ctx = context.get_admin_context()
         plugin = manager.NeutronManager.get_plugin()
@@ -669,6 +706,51 @@ class TestMl2DvrPortsV2(TestMl2PortsV2):
         plugin.delete_csnat_router_interface_ports(self.context, router)
 
 
+class TestMl2BitmapIpAllocation(test_plugin.TestBitmapIpAllocation,
+                                Ml2PluginV2TestCase):
+    pass
+
+
+class TestMl2PortListQueries(test_plugin.TestPortListQueries,
+                             Ml2PluginV2TestCase):
+
+    def _create_extended_port(self, network_id, index):
+        address_pairs = [{'ip_address': '10.1.%d.%d' % (index, i)}
+                         for i in range(2)]
+        dhcp_opts = [{'opt_name': 'tftp-server',
+                      'opt_value': '123.123.123.%d' % index},
+                     {'opt_name': 'server-ip-address',
+                      'opt_value': '123.123.123.%d' % index}]
+        res = self._create_port(
+            self.fmt, network_id,
+            arg_list=(addr_pair.ADDRESS_PAIRS, edo_ext.EXTRADHCPOPTS),
+            allowed_address_pairs=address_pairs, extra_dhcp_opts=dhcp_opts)
+        port = self.deserialize(self.fmt, res)['port']
+        self.assertEqual(1, len(port['security_groups']))
+        self.assertEqual(2, len(port[addr_pair.ADDRESS_PAIRS]))
+        self.assertEqual(2, len(port[edo_ext.EXTRADHCPOPTS]))
+
+    def test_list_extended_ports_query_count(self):
+        # The security groups, address pairs and DHCP options of the ports
+        # are loaded by one query each
+        plugin = manager.NeutronManager.get_plugin()
+        ctx = context.get_admin_context()
+        with self.subnet() as subnet:
+            network_id = subnet['subnet']['network_id']
+            self._create_extended_port(network_id, 0)
+            query_count = self._count_queries(plugin.get_ports, ctx)
+            for i in range(1, 6):
+                self._create_extended_port(network_id, i)
+            self.assertEqual(query_count,
+                             self._count_queries(plugin.get_ports, ctx))
+            ports = plugin.get_ports(ctx)
+            self.assertEqual(6, len(ports))
+            for port in ports:
+                self.assertEqual(1, len(port['security_groups']))
+                self.assertEqual(2, len(port[addr_pair.ADDRESS_PAIRS]))
+                self.assertEqual(2, len(port[edo_ext.EXTRADHCPOPTS]))
+
+
 class TestMl2PortBinding(Ml2PluginV2TestCase,
                          test_bindings.PortBindingsTestCase):
     # Test case does not set binding:host_id, so ml2 does not attempt
@@ -1156,6 +1238,24 @@ class TestFaultyMechansimDriver(Ml2PluginV2FaultyDriverTestCase):
             nets = self._list('networks', query_params=query_params)
             self.assertFalse(nets['networks'])
 
+    def test_create_ports_bulk_faulty(self):
+
+        with mock.patch.object(mech_test.TestMechanismDriver,
+                               'create_port_postcommit',
+                               side_effect=ml2_exc.MechanismDriverError):
+
+            with self.network() as network:
+                net_id = network['network']['id']
+                res = self._create_port_bulk(self.fmt, 2, net_id, 'test',
+                                             True)
+                self.assertEqual(500, res.status_int)
+                error = self.deserialize(self.fmt, res)
+                self.assertEqual('MechanismDriverError',
+                                 error['NeutronError']['type'])
+                query_params = "network_id=%s" % net_id
+                ports = self._list('ports', query_params=query_params)
+                self.assertFalse(ports['ports'])
+
     def test_delete_network_faulty(self):
 
         with mock.patch.object(mech_test.TestMechanismDriver,
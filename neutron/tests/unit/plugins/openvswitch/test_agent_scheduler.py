@@ -726,6 +726,26 @@ class OvsAgentSchedulerTestCase(OvsAgentSchedulerTestCaseBase):
             else:
                 self.assertEqual(0, len(nets))
 
+    def test_list_active_networks_on_active_dhcp_agent_paged(self):
+        self._register_agent_states()
+        with contextlib.nested(self.network(), self.network(),
+                               self.network(admin_state_up=False)) as nets:
+            for net in nets:
+                self._add_network_to_dhcp_agent(
+                    self._get_agent_id(constants.AGENT_TYPE_DHCP, DHCP_HOSTA),
+                    net['network']['id'])
+            net_ids = sorted(net['network']['id'] for net in nets[:2])
+            plugin = manager.NeutronManager.get_plugin()
+            first = plugin.list_active_networks_on_active_dhcp_agent(
+                self.adminContext, DHCP_HOSTA, limit=1)
+            self.assertEqual(net_ids[:1], [net['id'] for net in first])
+            second = plugin.list_active_networks_on_active_dhcp_agent(
+                self.adminContext, DHCP_HOSTA, limit=1, marker=net_ids[0])
+            self.assertEqual(net_ids[1:], [net['id'] for net in second])
+            last = plugin.list_active_networks_on_active_dhcp_agent(
+                self.adminContext, DHCP_HOSTA, limit=1, marker=net_ids[1])
+            self.assertEqual([], last)
+
     def test_dhcp_agent_keep_services_off(self):
         self._test_get_active_networks_from_admin_state_down_agent(False)
 